@@ -6,7 +6,9 @@ from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from database import get_db, get_async_db
 from models import User
 
 # Configuration
@@ -43,27 +45,43 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def _decode_token(token: str):
+    """(user_id, tenant_id) of a valid token, 401 otherwise."""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
         tenant_id: int = payload.get("tenant_id")
         if user_id is None or tenant_id is None:
-            raise credentials_exception
-    except PyJWTError:
-        raise credentials_exception
-        
-    user = db.query(User).filter(User.id == user_id).first()
+            raise _credentials_exception()
+        # asyncpg does not coerce "42" to an integer parameter
+        return int(user_id), tenant_id
+    except (PyJWTError, ValueError):
+        raise _credentials_exception()
+
+def _check_user(user: Optional[User], tenant_id: int) -> User:
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
     
     # Extra safety: Ensure the token's tenant matches the user's actual tenant in DB
     if user.tenant_id != tenant_id:
-        raise credentials_exception
+        raise _credentials_exception()
         
     return user
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    user_id, tenant_id = _decode_token(token)
+    user = db.query(User).filter(User.id == user_id).first()
+    return _check_user(user, tenant_id)
+
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    """Same checks as get_current_user, for `async def` routes (no threadpool slot held)."""
+    user_id, tenant_id = _decode_token(token)
+    user = (await db.execute(select(User).where(User.id == user_id))).scalar_one_or_none()
+    return _check_user(user, tenant_id)
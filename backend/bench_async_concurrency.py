@@ -0,0 +1,138 @@
+"""
+Benchmark: sustained concurrency per worker, sync `def` route vs `async def` route.
+
+Both routes run the same read (a simulated DB round trip of --latency-ms, then
+50 candidats) against DATABASE_URL (defaults to a local SQLite file):
+  - sync: blocking driver, runs in Starlette's threadpool (40 threads by default)
+  - async: asyncpg / aiosqlite on the event loop, no thread held while waiting
+Requests are sent in-process (httpx ASGI transport) with --concurrency in flight;
+both engines get a pool as large as the concurrency so only the execution model differs.
+The client shares the worker's CPU: absolute req/s are pessimistic, compare the two rows.
+
+Usage: python bench_async_concurrency.py [--requests 1000] [--concurrency 200] [--latency-ms 50]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench_async.db")
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import create_engine, event, select, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from database import DATABASE_URL, ASYNC_DATABASE_URL, Base
+from models import Candidat
+
+def latency_query(url: str):
+    # PostgreSQL sleeps server-side; SQLite gets a sleep() function registered per connection
+    if url.startswith("postgresql"):
+        return text("SELECT pg_sleep(:seconds)")
+    return text("SELECT bench_sleep(:seconds)")
+
+def register_sleep(engine):
+    if engine.dialect.name == "sqlite":
+        @event.listens_for(engine, "connect")
+        def _connect(dbapi_connection, connection_record):
+            dbapi_connection.create_function("bench_sleep", 1, time.sleep)
+
+def build_app(pool_size: int, latency: float) -> FastAPI:
+    sync_engine = create_engine(DATABASE_URL, pool_size=pool_size, max_overflow=0)
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, pool_size=pool_size, max_overflow=0)
+    register_sleep(sync_engine)
+    register_sleep(async_engine.sync_engine)
+    Base.metadata.create_all(bind=sync_engine)
+    SyncSession = sessionmaker(bind=sync_engine)
+    AsyncSession = async_sessionmaker(async_engine, expire_on_commit=False)
+    query = latency_query(DATABASE_URL)
+    candidats = select(Candidat).limit(50)
+
+    app = FastAPI()
+    app.state.in_flight = 0
+    app.state.peak = 0
+
+    def enter():
+        app.state.in_flight += 1
+        app.state.peak = max(app.state.peak, app.state.in_flight)
+
+    def get_sync_db():
+        db = SyncSession()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def get_async_db():
+        async with AsyncSession() as db:
+            yield db
+
+    @app.get("/sync")
+    def sync_route(db=Depends(get_sync_db)):
+        enter()
+        try:
+            db.execute(query, {"seconds": latency})
+            return len(db.execute(candidats).scalars().all())
+        finally:
+            app.state.in_flight -= 1
+
+    @app.get("/async")
+    async def async_route(db=Depends(get_async_db)):
+        enter()
+        try:
+            await db.execute(query, {"seconds": latency})
+            return len((await db.execute(candidats)).scalars().all())
+        finally:
+            app.state.in_flight -= 1
+
+    app.state.engines = (sync_engine, async_engine)
+    return app
+
+async def run(app: FastAPI, path: str, requests: int, concurrency: int):
+    app.state.in_flight = app.state.peak = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    durations = []
+
+    async def one(client):
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.get(path)
+            response.raise_for_status()
+            durations.append(time.perf_counter() - started)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await one(client) # Warm up the pool / threadpool
+        durations.clear()
+        started = time.perf_counter()
+        await asyncio.gather(*(one(client) for _ in range(requests)))
+        elapsed = time.perf_counter() - started
+
+    durations.sort()
+    return {
+        "elapsed": elapsed,
+        "rps": requests / elapsed,
+        "p50": statistics.median(durations) * 1000,
+        "p95": durations[int(len(durations) * 0.95) - 1] * 1000,
+        "peak": app.state.peak,
+    }
+
+async def main_async(args):
+    app = build_app(args.concurrency, args.latency_ms / 1000)
+    print(f"{args.requests} requests, {args.concurrency} in flight, {args.latency_ms} ms per DB round trip ({DATABASE_URL})")
+    print(f"{'route':<8}{'elapsed s':>11}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'peak in-flight':>16}")
+    for path in ("/sync", "/async"):
+        r = await run(app, path, args.requests, args.concurrency)
+        print(f"{path:<8}{r['elapsed']:>11.2f}{r['rps']:>10.1f}{r['p50']:>10.1f}{r['p95']:>10.1f}{r['peak']:>16}")
+    sync_engine, async_engine = app.state.engines
+    sync_engine.dispose()
+    await async_engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--latency-ms", type=int, default=50)
+    asyncio.run(main_async(parser.parse_args()))
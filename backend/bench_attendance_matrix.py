@@ -0,0 +1,128 @@
+"""
+Benchmark: class-wide attendance aggregates, SQL path vs AttendanceMatrix bitsets.
+
+Seeds one session (N contracts x D days) in DATABASE_URL (defaults to a local
+SQLite file), then times:
+  - the current SQL path (BillingService / BPF style queries, per contract)
+  - one grouped SQL query for the whole class
+  - AttendanceMatrix build (cold) and summary (warm, cached)
+
+Usage: python bench_attendance_matrix.py [--contracts 30] [--days 400]
+"""
+import argparse
+import os
+import random
+import time
+from datetime import date, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench_attendance.db")
+
+from sqlalchemy import func, case, insert
+from database import SessionLocal, engine, Base
+from models import (Tenant, Candidat, Entreprise, Session as TrainingSession, SessionDay,
+                    ContratDossier, ContratVersion, Attendance, AttendanceStatus)
+from services.attendance_matrix import AttendanceMatrix
+
+STATUSES = [AttendanceStatus.PRESENT] * 8 + [AttendanceStatus.ABSENT_JUSTIFIE, AttendanceStatus.ABSENT_INJUSTIFIE]
+
+def seed(db, contracts: int, days: int):
+    tenant = Tenant(name="Bench CFA", slug=f"bench-{int(time.time())}")
+    db.add(tenant)
+    db.flush()
+    start = date(2024, 9, 2)
+    session = TrainingSession(tenant_id=tenant.id, nom="Bench", date_debut=start, date_fin=start + timedelta(days=2 * days))
+    entreprise = Entreprise(tenant_id=tenant.id, raison_sociale="Bench SAS")
+    db.add_all([session, entreprise])
+    db.flush()
+
+    db.execute(insert(SessionDay), [
+        {"session_id": session.id, "date": start + timedelta(days=i), "is_morning": True, "is_afternoon": i % 5 != 4}
+        for i in range(days)
+    ])
+    day_ids = [d for (d,) in db.query(SessionDay.id).filter(SessionDay.session_id == session.id).order_by(SessionDay.date)]
+
+    version_ids = []
+    for i in range(contracts):
+        candidat = Candidat(tenant_id=tenant.id, first_name="Bench", last_name=f"Apprenti {i}")
+        db.add(candidat)
+        db.flush()
+        dossier = ContratDossier(tenant_id=tenant.id, candidat_id=candidat.id, entreprise_id=entreprise.id)
+        db.add(dossier)
+        db.flush()
+        version = ContratVersion(tenant_id=tenant.id, contrat_dossier_id=dossier.id, session_id=session.id,
+                                 version_number=1, salaire=1000, cout_npec=7000, heures_formation=700,
+                                 date_debut=start, date_fin=start + timedelta(days=2 * days), is_active=True)
+        db.add(version)
+        db.flush()
+        version_ids.append(version.id)
+
+    rng = random.Random(42)
+    db.execute(insert(Attendance), [
+        {"tenant_id": tenant.id, "session_day_id": day_id, "contrat_version_id": version_id, "status": rng.choice(STATUSES)}
+        for version_id in version_ids for day_id in day_ids
+    ])
+    db.commit()
+    return session.id, version_ids
+
+def sql_per_contract(db, session_id, version_ids):
+    hours = case((SessionDay.is_morning & SessionDay.is_afternoon, 7.0), else_=3.5)
+    results = {}
+    for version_id in version_ids:
+        realized = db.query(func.sum(hours)).select_from(Attendance)\
+            .join(SessionDay, Attendance.session_day_id == SessionDay.id)\
+            .filter(Attendance.contrat_version_id == version_id, Attendance.status == AttendanceStatus.PRESENT).scalar()
+        scheduled = db.query(SessionDay).filter(SessionDay.session_id == session_id).count()
+        unjustified = db.query(Attendance).join(SessionDay).filter(
+            Attendance.contrat_version_id == version_id,
+            Attendance.status == AttendanceStatus.ABSENT_INJUSTIFIE).count()
+        results[version_id] = (realized, scheduled - unjustified)
+    return results
+
+def sql_grouped(db, session_id):
+    hours = case((SessionDay.is_morning & SessionDay.is_afternoon, 7.0), else_=3.5)
+    return db.query(
+        Attendance.contrat_version_id,
+        func.sum(case((Attendance.status == AttendanceStatus.PRESENT, hours), else_=0)),
+        func.sum(case((Attendance.status == AttendanceStatus.ABSENT_INJUSTIFIE, 1), else_=0))
+    ).join(SessionDay, Attendance.session_day_id == SessionDay.id)\
+     .filter(SessionDay.session_id == session_id)\
+     .group_by(Attendance.contrat_version_id).all()
+
+def timed(label, fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<45} {best * 1000:10.2f} ms")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contracts", type=int, default=30)
+    parser.add_argument("--days", type=int, default=400)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        session_id, version_ids = seed(db, args.contracts, args.days)
+        print(f"Session {session_id}: {args.contracts} contracts x {args.days} days "
+              f"({args.contracts * args.days} attendance rows)\n")
+
+        sql = timed("SQL, 3 queries per contract", lambda: sql_per_contract(db, session_id, version_ids), repeat=1)
+        timed("SQL, one grouped query for the class", lambda: sql_grouped(db, session_id))
+        matrix = timed("AttendanceMatrix.build (cold cache)", lambda: AttendanceMatrix.build(db, session_id))
+        timed("AttendanceMatrix.summary (warm cache)", matrix.summary)
+
+        # Sanity check: both paths agree
+        for version_id in version_ids:
+            realized, billable = sql[version_id]
+            assert float(realized or 0) == matrix.realized_hours(version_id)
+            assert billable == matrix.billable_days(version_id)
+        print("\nResults match between SQL and bitset paths.")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark: serialization time of a 1,000-row page, before / after explicit response models + ORJSON.
+
+Same steps as FastAPI once the route has returned its ORM objects:
+  - before: no response model -> jsonable_encoder walks every loaded attribute of the
+            ORM objects (cv_raw_text included), then JSONResponse (json.dumps)
+  - after:  response model -> Pydantic validates from attributes and dumps JSON-ready
+            values, then ORJSONResponse (orjson.dumps), the API default since then
+  - pydantic fast path (reference): response model + FastAPI's own JSONResponse,
+            Pydantic writes the bytes itself
+Rows live in an in-memory SQLite database, loaded once: only serialization is timed.
+
+Usage: python bench_serialization.py [--rows 1000] [--repeat 20]
+"""
+import argparse
+import os
+import statistics
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import List
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker, joinedload, selectinload
+from starlette.responses import JSONResponse
+
+from database import Base
+from models import Tenant, Candidat, CandidatStatus, Entreprise, ContratDossier, ContratVersion
+from schemas import CandidatResponse, ContratListItem
+from services.json_response import ORJSONResponse
+
+def seed(db, rows: int):
+    db.add(Tenant(id=1, name="Bench", slug="bench"))
+    db.add_all([
+        Candidat(tenant_id=1, first_name=f"Prenom{i}", last_name=f"Nom{i}", email=f"c{i}@bench.fr",
+                 statut=CandidatStatus.PLACE, cv_filename=f"cv_{i}.pdf", cv_raw_text="Expérience " * 200,
+                 created_at=datetime(2025, 1, 1) + timedelta(hours=i))
+        for i in range(rows)
+    ])
+    db.add_all([Entreprise(tenant_id=1, raison_sociale=f"Entreprise {i}", siret=f"{i:014d}") for i in range(rows)])
+    db.flush()
+    db.add_all([ContratDossier(tenant_id=1, candidat_id=i + 1, entreprise_id=i + 1) for i in range(rows)])
+    db.flush()
+    db.add_all([
+        ContratVersion(tenant_id=1, contrat_dossier_id=i + 1, version_number=1, salaire=Decimal("1234.56"),
+                       cout_npec=Decimal("8000.00"), heures_formation=600, intitule_poste="Apprenti",
+                       date_debut=date(2025, 9, 1), date_fin=date(2027, 8, 31), is_active=True)
+        for i in range(rows)
+    ])
+    db.commit()
+
+def contrat_page(dossiers):
+    # Same dicts as GET /contrats/
+    return [
+        {"id": d.id, "candidat": d.candidat, "entreprise": d.entreprise,
+         "active_version": next((v for v in d.versions if v.is_active), None)}
+        for d in dossiers
+    ]
+
+def timed(fn, repeat: int):
+    fn() # Warm up (Pydantic / encoder caches)
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), len(body)
+
+def main(args):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    seed(db, args.rows)
+
+    candidats = db.execute(select(Candidat).limit(args.rows)).scalars().all()
+    dossiers = db.execute(select(ContratDossier).options(
+        joinedload(ContratDossier.candidat), joinedload(ContratDossier.entreprise), selectinload(ContratDossier.versions)
+    ).limit(args.rows)).scalars().unique().all()
+
+    pages = {
+        "GET /candidats/": (candidats, TypeAdapter(List[CandidatResponse])),
+        "GET /contrats/": (contrat_page(dossiers), TypeAdapter(List[ContratListItem])),
+    }
+    print(f"{args.rows} rows per page, median of {args.repeat} runs")
+    print(f"{'page':<18}{'variant':<26}{'ms':>8}{'bytes':>10}")
+    for name, (content, adapter) in pages.items():
+        variants = {
+            "before (jsonable_encoder)": lambda: JSONResponse(jsonable_encoder(content)).body,
+            "after (model + orjson)": lambda: ORJSONResponse(
+                adapter.dump_python(adapter.validate_python(content, from_attributes=True), mode="json")
+            ).body,
+            "pydantic fast path": lambda: adapter.dump_json(adapter.validate_python(content, from_attributes=True)),
+        }
+        for variant, fn in variants.items():
+            ms, size = timed(fn, args.repeat)
+            print(f"{name:<18}{variant:<26}{ms:>8.1f}{size:>10}")
+    db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    main(parser.parse_args())
@@ -1,18 +1,364 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, exc, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from fastapi import HTTPException, Request
+from collections import deque
+from typing import Any, Dict, List, Optional
+import asyncio
+import itertools
+import jwt
 import os
+import threading
+import time
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL)
+# Async driver for the I/O-bound read endpoints (asyncpg, aiosqlite for tests / local runs)
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def async_url(url: str) -> str:
+    scheme, sep, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_url(DATABASE_URL)
+
+# --- Connection pool sizing ---
+# Every API worker has two engines (sync + async): by default they split the server's
+# connection budget (DB_MAX_CONNECTIONS, keep headroom below Postgres max_connections=100
+# for psql / migrations / manage.py) evenly, 2/3 persistent and 1/3 overflow.
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "90"))
+_PER_ENGINE = max(DB_MAX_CONNECTIONS // (WEB_CONCURRENCY * 2), 2)
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", str(max(_PER_ENGINE * 2 // 3, 1))))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", str(max(_PER_ENGINE - DB_POOL_SIZE, 0))))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+DB_POOL_WARMUP = int(os.getenv("DB_POOL_WARMUP", str(DB_POOL_SIZE)))
+
+class PoolStats:
+    """Checkout wait times of one pool (time to get a usable connection, incl. connect / pre-ping)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._recent = deque(maxlen=1000)
+
+    def record(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+                self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            self._recent.append(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            recent = sorted(self._recent)
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_avg_ms": round(self.wait_total / self.checkouts * 1000, 2) if self.checkouts else None,
+                "wait_p95_ms": round(recent[max(int(len(recent) * 0.95) - 1, 0)] * 1000, 2) if recent else None,
+                "wait_max_ms": round(self.wait_max * 1000, 2),
+            }
+
+# By pool logging name: survives engine.dispose() (the pool is recreated with the same name)
+POOL_STATS: Dict[str, PoolStats] = {}
+
+class _InstrumentedPool:
+    def connect(self):
+        stats = POOL_STATS.setdefault(self.logging_name, PoolStats())
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            stats.record(time.perf_counter() - started, timed_out=True)
+            raise
+        stats.record(time.perf_counter() - started)
+        return connection
+
+class InstrumentedQueuePool(_InstrumentedPool, QueuePool):
+    pass
+
+class InstrumentedAsyncPool(_InstrumentedPool, AsyncAdaptedQueuePool):
+    pass
+
+def pool_options(url: str, pool_class, name: str) -> Dict[str, Any]:
+    if make_url(url).get_backend_name() == "sqlite" and make_url(url).database in (None, "", ":memory:"):
+        return {} # In-memory SQLite: one connection per thread, not a queue pool
+    return {
+        "poolclass": pool_class,
+        "pool_logging_name": name,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+engine = create_engine(DATABASE_URL, **pool_options(DATABASE_URL, InstrumentedQueuePool, "sync"))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **pool_options(ASYNC_DATABASE_URL, InstrumentedAsyncPool, "async"))
+# expire_on_commit=False: objects stay readable after commit (no implicit async lazy load)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
+# --- Read replicas ---
+# GET handlers that only read (listings, analytics, exports) use get_read_db /
+# get_async_read_db: round-robin over the healthy replicas, primary when there are none.
+# Read-your-writes: after a write, the tenant (this worker) and the user's browser
+# (cookie, any worker) read from the primary for READ_YOUR_WRITES_SECONDS.
+# That window does not cover the other users of the tenant: a value computed on a
+# lagging replica can predate a write, so shared caches keep it briefly (replica_of).
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_CHECK_SECONDS = int(os.getenv("REPLICA_CHECK_SECONDS", "10"))
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+READ_YOUR_WRITES_COOKIE = "cfa_primary_until"
+
+# 0 when caught up (an idle primary would otherwise look like a growing lag)
+REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+class Replica:
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.engine = create_engine(url, **pool_options(url, InstrumentedQueuePool, name))
+        self.async_engine = create_async_engine(
+            async_url(url), **pool_options(async_url(url), InstrumentedAsyncPool, f"{name}-async")
+        )
+        self.healthy = True
+        self.lag_seconds: Optional[float] = None
+        self.error: Optional[str] = None
+        for e in (self.engine, self.async_engine.sync_engine):
+            event.listen(e, "handle_error", self._on_error)
+
+    def _on_error(self, context):
+        # Lost connection: out of the rotation until the next successful health check
+        if context.is_disconnect:
+            self.healthy = False
+            self.error = str(context.original_exception)
+
+    async def check(self):
+        try:
+            async with self.async_engine.connect() as connection:
+                if connection.dialect.name == "postgresql":
+                    lag = float((await connection.execute(REPLICA_LAG_SQL)).scalar() or 0)
+                else:
+                    await connection.execute(text("SELECT 1"))
+                    lag = 0.0
+            self.lag_seconds = lag
+            self.healthy = lag <= REPLICA_MAX_LAG_SECONDS
+            self.error = None if self.healthy else f"replication lag {lag:.1f}s"
+        except Exception as e:
+            self.healthy = False
+            self.error = str(e)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "healthy": self.healthy,
+            "lag_seconds": self.lag_seconds,
+            "error": self.error,
+            "pool": pool_status(self.engine),
+        }
+
+class ReplicaRouter:
+    def __init__(self, urls: List[str]):
+        self.replicas = [Replica(f"replica-{i}", url) for i, url in enumerate(urls, 1)]
+        self._counter = itertools.count()
+        self._recent_writes: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def pick(self) -> Optional[Replica]:
+        healthy = [r for r in self.replicas if r.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._counter) % len(healthy)]
+
+    def note_write(self, tenant_id: int):
+        now = time.monotonic()
+        with self._lock:
+            self._recent_writes[tenant_id] = now + READ_YOUR_WRITES_SECONDS
+            if len(self._recent_writes) > 1000:
+                self._recent_writes = {t: until for t, until in self._recent_writes.items() if until > now}
+
+    def recent_write(self, tenant_id: int) -> bool:
+        with self._lock:
+            return self._recent_writes.get(tenant_id, 0) > time.monotonic()
+
+    async def check_all(self):
+        await asyncio.gather(*(replica.check() for replica in self.replicas))
+
+    async def run_health_checks(self):
+        while True:
+            await self.check_all()
+            await asyncio.sleep(REPLICA_CHECK_SECONDS)
+
+    def start(self):
+        if self.replicas and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run_health_checks())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for replica in self.replicas:
+            replica.engine.dispose()
+            await replica.async_engine.dispose()
+
+replica_router = ReplicaRouter(DATABASE_REPLICA_URLS)
+
+def replica_of(bind) -> Optional[Replica]:
+    """Replica a Session / AsyncSession is bound to, None for the primary or a shard."""
+    for replica in replica_router.replicas:
+        if bind is replica.engine or bind is replica.async_engine:
+            return replica
+    return None
+
+def _token_tenant(request: Request) -> Optional[int]:
+    from auth import SECRET_KEY, ALGORITHM
+    authorization = request.headers.get("Authorization", "")
+    if not authorization.startswith("Bearer "):
+        return None
+    try:
+        return jwt.decode(authorization[7:], SECRET_KEY, algorithms=[ALGORITHM]).get("tenant_id")
+    except jwt.PyJWTError:
+        return None
+
+def read_replica(request: Request) -> Optional[Replica]:
+    """Replica serving this read, None for the primary."""
+    if not replica_router.replicas:
+        return None
+    try:
+        if float(request.cookies.get(READ_YOUR_WRITES_COOKIE, 0)) > time.time():
+            return None
+    except ValueError:
+        pass
+    tenant_id = _token_tenant(request)
+    if tenant_id is not None and replica_router.recent_write(tenant_id):
+        return None
+    return replica_router.pick()
+
+def _check_moving(request: Request, moving: bool):
+    # Tenant being copied to another shard: reads are fine, writes would be lost
+    if moving and request.method not in ("GET", "HEAD", "OPTIONS"):
+        from sharding import SHARD_MAP_TTL
+        raise HTTPException(
+            status_code=503,
+            detail="Migration des données du CFA en cours, réessayez dans quelques minutes",
+            headers={"Retry-After": str(SHARD_MAP_TTL)}
+        )
+
+def request_shard(request: Request):
+    """Shard of the token's tenant (sharding.py), the default shard without token."""
+    from sharding import shard_router
+    tenant_id = _token_tenant(request)
+    if tenant_id is None:
+        return shard_router.default
+    shard, moving = shard_router.route(tenant_id)
+    _check_moving(request, moving)
+    return shard
+
+async def request_shard_async(request: Request):
+    from sharding import shard_router
+    tenant_id = _token_tenant(request)
+    if tenant_id is None:
+        return shard_router.default
+    shard, moving = await shard_router.route_async(tenant_id)
+    _check_moving(request, moving)
+    return shard
+
+def read_engine(request: Request):
+    shard = request_shard(request)
+    # Replicas follow the default database only
+    if shard.engine is not engine:
+        return shard.engine
+    replica = read_replica(request)
+    return replica.engine if replica else engine
+
+def pool_status(engine) -> Dict[str, Any]:
+    pool = engine.pool
+    status = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "idle": pool.checkedin(),
+            # overflow() is negative while the pool has not opened pool_size connections yet
+            "overflow": max(pool.overflow(), 0),
+            "max_overflow": DB_MAX_OVERFLOW,
+            "timeout_s": pool.timeout(),
+        })
+        stats = POOL_STATS.get(pool.logging_name)
+        status.update(stats.snapshot() if stats else PoolStats().snapshot())
+    return status
+
+def warm_up_pool(count: int = DB_POOL_WARMUP) -> int:
+    """Opens `count` connections at once and returns them to the pool (first requests skip the connect)."""
+    connections = []
+    try:
+        for _ in range(min(count, DB_POOL_SIZE)):
+            connections.append(engine.connect())
+    finally:
+        for connection in connections:
+            connection.close()
+    return len(connections)
+
+async def warm_up_async_pool(count: int = DB_POOL_WARMUP) -> int:
+    connections = []
+    try:
+        for _ in range(min(count, DB_POOL_SIZE)):
+            connections.append(await async_engine.connect())
+    finally:
+        for connection in connections:
+            await connection.close()
+    return len(connections)
+
+def get_db(request: Request):
+    db = SessionLocal(bind=request_shard(request).engine)
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db(request: Request):
+    shard = await request_shard_async(request)
+    async with AsyncSessionLocal(bind=shard.async_engine) as db:
+        yield db
+
+def get_read_db(request: Request):
+    db = SessionLocal(bind=read_engine(request))
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_read_db(request: Request):
+    shard = await request_shard_async(request)
+    replica = read_replica(request) if shard.async_engine is async_engine else None
+    async with AsyncSessionLocal(bind=replica.async_engine if replica else shard.async_engine) as db:
+        yield db
@@ -1,19 +1,57 @@
 from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
+from sqlalchemy import text
+import asyncio
 
-from database import get_db, engine, Base
+from database import (get_db, engine, async_engine, pool_status, warm_up_pool, warm_up_async_pool, replica_router,
+                      DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING)
 from models import User
 from auth import verify_password, create_access_token, get_current_user
 from repository import BaseRepository
-from routers import candidats, entreprises, contrats, finance, exports, pedagogie, quality, analytics
+from routers import candidats, entreprises, contrats, finance, exports, pedagogie, quality, analytics, operator, files
 from models import Civilite # Ensure Enum is registered
 from middleware.audit import AuditMiddleware
+from middleware.compression import CompressionMiddleware
+from services.scheduler import scheduler, SCHEDULER_ENABLED
+from sharding import shard_router, create_all_shards
+from services.json_response import ORJSONResponse
+from services.attendance_summary_service import AttendanceSummaryService
+from contextlib import asynccontextmanager
 
 # Initialize DB
-Base.metadata.create_all(bind=engine)
+create_all_shards()
 
-app = FastAPI(title="CFA Manager API", version="1.0.0")
+def backfill_summaries():
+    """Counter tables added after the data they summarize: backfilled once per tenant."""
+    for shard in shard_router.all():
+        with shard.session() as db:
+            AttendanceSummaryService().backfill_missing(db)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the persistent connections before taking traffic (readiness turns green after this)
+    try:
+        await asyncio.to_thread(warm_up_pool)
+        await warm_up_async_pool()
+    except Exception as e:
+        print(f"Pool warm-up failed: {e}")
+    try:
+        await asyncio.to_thread(backfill_summaries)
+    except Exception as e:
+        print(f"Summary backfill failed: {e}")
+    # Read replicas: health / lag checks in the background
+    replica_router.start()
+    # In-process job scheduler (survey dispatch...), opt-in per deployment
+    if SCHEDULER_ENABLED:
+        scheduler.start()
+    yield
+    await scheduler.stop()
+    await replica_router.stop()
+    await async_engine.dispose()
+
+app = FastAPI(title="CFA Manager API", version="1.0.0", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # Add Middleware
 from fastapi.middleware.cors import CORSMiddleware
@@ -27,8 +65,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Unread-Count", "Content-Range", "Accept-Ranges", "ETag"],
 )
 
+# Outermost: compresses the final body (CORS headers included)
+app.add_middleware(CompressionMiddleware)
+
 # Include Routers
 app.include_router(candidats.router)
 app.include_router(entreprises.router)
@@ -38,6 +80,8 @@ app.include_router(exports.router)
 app.include_router(pedagogie.router)
 app.include_router(quality.router)
 app.include_router(analytics.router)
+app.include_router(operator.router)
+app.include_router(files.router)
 
 @app.get("/")
 def read_root():
@@ -47,14 +91,60 @@ def read_root():
 def health_check():
     return {"status": "ok"}
 
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness: both pools can reach the database; pool occupancy and checkout wait times."""
+    checks = {}
+    ready = True
+    try:
+        async with async_engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+        checks["async"] = "ok"
+    except Exception as e:
+        checks["async"] = str(e)
+        ready = False
+
+    def ping_sync():
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+    try:
+        await asyncio.to_thread(ping_sync)
+        checks["sync"] = "ok"
+    except Exception as e:
+        checks["sync"] = str(e)
+        ready = False
+
+    body = {
+        "status": "ok" if ready else "unavailable",
+        "database": checks,
+        "config": {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "pool_recycle": DB_POOL_RECYCLE,
+            "pre_ping": DB_POOL_PRE_PING,
+        },
+        "pools": {"sync": pool_status(engine), "async": pool_status(async_engine.sync_engine)},
+        # Informative only: reads fall back to the primary when no replica is healthy
+        "replicas": [replica.status() for replica in replica_router.replicas],
+    }
+    return JSONResponse(body, status_code=200 if ready else 503)
+
 # --- Auth Endpoints ---
 
 @app.post("/auth/login")
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+def login(form_data: OAuth2PasswordRequestForm = Depends()):
     # 1. Find user by email
     # Note: In a real multi-tenant app, might need tenant_slug in URL or header to disambiguate email.
     # Here we assume email is unique globally for simplicity or pick the first match.
-    user = db.query(User).filter(User.email == form_data.username).first()
+    # Sharding: the tenant is unknown before login, every shard is asked (concurrently)
+    def find_user(db: Session):
+        user = db.query(User).filter(User.email == form_data.username).first()
+        # Moved tenants are deleted from their old shard after the switch
+        return user if user and shard_router.owns(db.get_bind(), user.tenant_id) else None
+
+    users = [u for u in shard_router.fan_out(find_user).values() if u]
+    user = users[0] if users else None
     
     if not user or not verify_password(form_data.password, user.password_hash):
         raise HTTPException(
@@ -0,0 +1,205 @@
+"""
+Maintenance commands for the backend.
+
+Usage (from the backend directory / container):
+    python manage.py migrate
+    python manage.py rebuild-attendance-summary [--tenant ID]
+    python manage.py refresh-rollups [--tenant ID]
+    python manage.py backfill-rollups [--tenant ID] [--start YYYY-MM-DD]
+    python manage.py rebuild-funnel [--tenant ID]
+    python manage.py rebuild-survey-aggregates [--tenant ID]
+    python manage.py run-scheduled-jobs
+    python manage.py init-shard NAME [--id-start N]
+    python manage.py move-tenant --tenant ID --to SHARD [--keep-source] [--batch N]
+    python manage.py index-advisor [--seed N | --tenant ID] [--plans]
+
+Commands without --tenant run on every shard (DATABASE_SHARDS).
+The API backfills the attendance summary of tenants that have none at startup;
+rebuild-attendance-summary is only needed to repair counters.
+"""
+import argparse
+import sys
+from datetime import date
+
+import models # Ensure all tables are registered
+from sharding import shard_router, create_all_shards
+
+def _sessions(tenant_id):
+    """Session on the tenant's shard, or on every shard."""
+    shards = [shard_router.shard_for(tenant_id)] if tenant_id is not None else shard_router.all()
+    return [shard.session() for shard in shards]
+
+def migrate(args):
+    """Same upgrade as the API startup (create_all_shards), reporting the steps applied per shard."""
+    from database import Base
+    from migrations import upgrade
+    for shard in shard_router.all():
+        Base.metadata.create_all(bind=shard.engine)
+        applied = upgrade(shard.engine)
+        print(f"Shard {shard.name}: {', '.join(applied) if applied else 'schema up to date'}")
+
+def rebuild_attendance_summary(args):
+    from services.attendance_summary_service import AttendanceSummaryService
+    for db in _sessions(args.tenant):
+        try:
+            count = AttendanceSummaryService().rebuild(db, tenant_id=args.tenant)
+            print(f"{count} attendance summary rows rebuilt")
+        finally:
+            db.close()
+
+def _tenant_ids(db, tenant_id):
+    from models import Tenant
+    if tenant_id is not None:
+        return [tenant_id]
+    # A shard keeps the tenants rows of the tenants moved away: only the ones living there
+    return [t for (t,) in db.query(Tenant.id).order_by(Tenant.id) if shard_router.owns(db.get_bind(), t)]
+
+def refresh_rollups(args):
+    from services.rollup_service import RollupService
+    for db in _sessions(args.tenant):
+        try:
+            for tenant_id in _tenant_ids(db, args.tenant):
+                count = RollupService().refresh(db, tenant_id)
+                print(f"Tenant {tenant_id}: {count} daily snapshots refreshed")
+        finally:
+            db.close()
+
+def backfill_rollups(args):
+    from services.rollup_service import RollupService
+    start = date.fromisoformat(args.start) if args.start else None
+    for db in _sessions(args.tenant):
+        try:
+            for tenant_id in _tenant_ids(db, args.tenant):
+                count = RollupService().backfill(db, tenant_id, start=start)
+                print(f"Tenant {tenant_id}: {count} daily snapshots rebuilt")
+        finally:
+            db.close()
+
+def rebuild_funnel(args):
+    from services.funnel_service import FunnelService
+    for db in _sessions(args.tenant):
+        try:
+            count = FunnelService().rebuild(db, tenant_id=args.tenant)
+            print(f"{count} funnel counter rows rebuilt")
+        finally:
+            db.close()
+
+def rebuild_survey_aggregates(args):
+    from services.survey_stats_service import SurveyStatsService
+    for db in _sessions(args.tenant):
+        try:
+            count = SurveyStatsService().rebuild(db, tenant_id=args.tenant)
+            print(f"{count} survey aggregate rows rebuilt")
+        finally:
+            db.close()
+
+def run_scheduled_jobs(args):
+    from services.scheduler import scheduler
+    ran = scheduler.run_pending()
+    print(f"Jobs run: {', '.join(ran) if ran else 'none due'}")
+
+def init_shard(args):
+    from sharding import init_shard
+    init_shard(args.name, id_start=args.id_start)
+    print(f"Shard {args.name}: schema created" + (f", ids start at {args.id_start}" if args.id_start else ""))
+
+def move_tenant(args):
+    from sharding import move_tenant
+    copied = move_tenant(args.tenant, args.to, batch_size=args.batch, keep_source=args.keep_source)
+    print(f"Tenant {args.tenant} moved to {args.to}: {sum(copied.values())} rows copied")
+
+def index_advisor(args):
+    """EXPLAIN of the app's query shapes; exits with 1 if one of them scans a whole table."""
+    from services.index_advisor import IndexAdvisorService
+    advisor = IndexAdvisorService()
+    db = (shard_router.shard_for(args.tenant) if args.tenant is not None else shard_router.default).session()
+    try:
+        missing = advisor.missing_indexes(db)
+        for statement in missing:
+            print(f"MISSING  {statement}")
+        if missing:
+            print("         (python manage.py migrate creates them)")
+
+        if args.seed is not None:
+            # Opt-in: commits synthetic tenants and runs ANALYZE, meant for a scratch database
+            print(f"Seeding the index-advisor tenants ({args.seed} candidats)...")
+            tenant_id = advisor.seed(db, candidats=args.seed)
+        elif args.tenant is not None:
+            tenant_id = args.tenant
+        else:
+            tenant_id = advisor.largest_tenant(db)
+            print(f"Explaining with the data of tenant {tenant_id} (largest on the default shard)")
+
+        flagged = 0
+        for entry in advisor.run(db, tenant_id):
+            status = "SEQ SCAN" if entry["seq_scans"] else "OK"
+            flagged += bool(entry["seq_scans"])
+            extra = f" [{', '.join(entry['seq_scans'])}]" if entry["seq_scans"] else ""
+            sort = " +sort" if entry["sorts"] else ""
+            print(f"{status:<9}{entry['query']}{extra}{sort}")
+            if args.plans or entry["seq_scans"]:
+                for line in entry["plan"]:
+                    print(f"           {line}")
+        print(f"{flagged} query shape(s) with a sequential scan, {len(missing)} declared index(es) missing")
+    finally:
+        db.close()
+    if flagged or missing:
+        sys.exit(1)
+
+def main():
+    parser = argparse.ArgumentParser(description="CFA Manager maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = subparsers.add_parser("migrate", help="Create missing tables and apply column / index upgrades")
+    migrate_parser.set_defaults(func=migrate)
+
+    rebuild = subparsers.add_parser("rebuild-attendance-summary", help="Backfill the monthly attendance counters")
+    rebuild.add_argument("--tenant", type=int, default=None, help="Only rebuild this tenant")
+    rebuild.set_defaults(func=rebuild_attendance_summary)
+
+    refresh = subparsers.add_parser("refresh-rollups", help="Recompute the dirty days of the daily analytics snapshots")
+    refresh.add_argument("--tenant", type=int, default=None, help="Only refresh this tenant")
+    refresh.set_defaults(func=refresh_rollups)
+
+    backfill = subparsers.add_parser("backfill-rollups", help="Rebuild the daily analytics snapshots history")
+    backfill.add_argument("--tenant", type=int, default=None, help="Only backfill this tenant")
+    backfill.add_argument("--start", default=None, help="First day (YYYY-MM-DD), defaults to the first activity")
+    backfill.set_defaults(func=backfill_rollups)
+
+    funnel = subparsers.add_parser("rebuild-funnel", help="Recompute the candidate funnel counters from the transition history")
+    funnel.add_argument("--tenant", type=int, default=None, help="Only rebuild this tenant")
+    funnel.set_defaults(func=rebuild_funnel)
+
+    surveys = subparsers.add_parser("rebuild-survey-aggregates", help="Recompute the survey score aggregates from the answers")
+    surveys.add_argument("--tenant", type=int, default=None, help="Only rebuild this tenant")
+    surveys.set_defaults(func=rebuild_survey_aggregates)
+
+    jobs = subparsers.add_parser("run-scheduled-jobs", help="Run the due scheduler jobs once (same locking as the API workers)")
+    jobs.set_defaults(func=run_scheduled_jobs)
+
+    shard = subparsers.add_parser("init-shard", help="Create the schema of a DATABASE_SHARDS database")
+    shard.add_argument("name", help="Shard name (key of DATABASE_SHARDS)")
+    shard.add_argument("--id-start", type=int, default=None, help="PostgreSQL: first id of every table, disjoint range per shard")
+    shard.set_defaults(func=init_shard)
+
+    move = subparsers.add_parser("move-tenant", help="Copy a tenant to another shard, switch it, delete the old rows")
+    move.add_argument("--tenant", type=int, required=True, help="Tenant to move")
+    move.add_argument("--to", required=True, help="Target shard name")
+    move.add_argument("--batch", type=int, default=5000, help="Rows per INSERT batch")
+    move.add_argument("--keep-source", action="store_true", help="Leave the rows on the old shard")
+    move.set_defaults(func=move_tenant)
+
+    advisor = subparsers.add_parser("index-advisor", help="EXPLAIN the app's query shapes and flag sequential scans")
+    advisor.add_argument("--seed", type=int, default=None,
+                         help="Scratch database only: first bulk-insert synthetic tenants with this many candidats")
+    advisor.add_argument("--tenant", type=int, default=None, help="Explain with this tenant's data (default: the largest tenant)")
+    advisor.add_argument("--plans", action="store_true", help="Print every plan, not only the flagged ones")
+    advisor.set_defaults(func=index_advisor)
+
+    args = parser.parse_args()
+    if args.func is not migrate:
+        create_all_shards()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
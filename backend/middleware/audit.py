@@ -2,9 +2,10 @@ from starlette.middleware.base import BaseHTTPMiddleware
 from fastapi import Request
 import json
 from datetime import datetime
-from sqlalchemy.orm import Session
-from database import SessionLocal
+from database import AsyncSessionLocal, replica_router, READ_YOUR_WRITES_COOKIE, READ_YOUR_WRITES_SECONDS
+import time
 from models import AuditLog
+from sharding import shard_router
 import jwt
 from jwt.exceptions import PyJWTError
 from auth import SECRET_KEY, ALGORITHM
@@ -69,25 +70,36 @@ class AuditMiddleware(BaseHTTPMiddleware):
             except PyJWTError:
                 pass # Invalid token, maybe login request or public endpoint
 
+        # Read-your-writes: this tenant / browser reads from the primary for a short while
+        if tenant_id and response.status_code < 400 and replica_router.replicas:
+            replica_router.note_write(tenant_id)
+            response.set_cookie(
+                READ_YOUR_WRITES_COOKIE, str(time.time() + READ_YOUR_WRITES_SECONDS),
+                max_age=int(READ_YOUR_WRITES_SECONDS) + 1, httponly=True, samesite="lax"
+            )
+
         # 6. Write to DB
-        # We use a separate session to ensure we don't interfere with the request's transaction
+        # We use a separate session to ensure we don't interfere with the request's transaction.
+        # Async pool: no blocking call on the event loop, and the sync pool stays for the threadpool
+        # Sharding: the entry goes to the tenant's database; none while it is being moved (writes got a 503)
         if tenant_id: # Only log if we identified a tenant context (most meaningful for us)
-            db: Session = SessionLocal()
-            try:
-                audit_entry = AuditLog(
-                    tenant_id=tenant_id,
-                    user_id=user_id, # Can be None if system/unknown but tenant known? Unlikely in this app.
-                    action=f"{request.method} {request.url.path}",
-                    endpoint=str(request.url.path),
-                    method=request.method,
-                    payload=payload_str,
-                    timestamp=datetime.utcnow()
-                )
-                db.add(audit_entry)
-                db.commit()
-            except Exception as e:
-                print(f"Audit Log Failed: {e}")
-            finally:
-                db.close()
+            shard, moving = await shard_router.route_async(tenant_id)
+            if moving:
+                return response
+            async with AsyncSessionLocal(bind=shard.async_engine) as db:
+                try:
+                    audit_entry = AuditLog(
+                        tenant_id=tenant_id,
+                        user_id=user_id, # Can be None if system/unknown but tenant known? Unlikely in this app.
+                        action=f"{request.method} {request.url.path}",
+                        endpoint=str(request.url.path),
+                        method=request.method,
+                        payload=payload_str,
+                        timestamp=datetime.utcnow()
+                    )
+                    db.add(audit_entry)
+                    await db.commit()
+                except Exception as e:
+                    print(f"Audit Log Failed: {e}")
 
         return response
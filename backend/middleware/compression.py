@@ -0,0 +1,195 @@
+"""
+Response compression (pure ASGI middleware, no BaseHTTPMiddleware buffering).
+
+- Accept-Encoding negotiation with q-values: br (if the brotli package is installed)
+  preferred over gzip at equal weight.
+- Only text-like types (JSON, CSV, HTML...): ZIP exports, PDFs, images pass through.
+- Skipped: bodies under COMPRESSION_MIN_SIZE, responses already carrying a
+  Content-Encoding, 206 / 304 / 204, and file downloads (Accept-Ranges: the
+  ranges would no longer match, and the zero-copy path would be lost).
+- Streaming responses (CSV annex...): chunks are buffered up to the threshold, then
+  compressed on the fly, flushed every COMPRESSION_STREAM_FLUSH bytes of input so
+  the client keeps receiving data without one tiny deflate block per row.
+
+Levels trade CPU for bandwidth (remote sites on slow links: raise them).
+"""
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from typing import Optional
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError: # Optional: gzip only
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6")) # 1-9
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4")) # 0-11, above 5 gets expensive for dynamic content
+COMPRESSION_STREAM_FLUSH = int(os.getenv("COMPRESSION_STREAM_FLUSH", str(64 * 1024)))
+
+COMPRESSIBLE_TYPES = (
+    "text/", "application/json", "application/javascript", "application/xml",
+    "application/problem+json", "application/x-ndjson", "image/svg+xml",
+)
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """Best supported coding of an Accept-Encoding header, None for identity."""
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding] = q
+
+    supported = ["br", "gzip"] if brotli is not None else ["gzip"]
+    candidates = [(weights.get(c, weights.get("*", 0.0)), -i, c) for i, c in enumerate(supported)]
+    q, _, coding = max(candidates)
+    return coding if q > 0 else None
+
+class _Compressor:
+    def __init__(self, coding: str, gzip_level: int, brotli_quality: int):
+        self.coding = coding
+        if coding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality, mode=brotli.MODE_TEXT)
+        else:
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, zlib.MAX_WBITS | 16) # gzip container
+
+    def compress(self, data: bytes) -> bytes:
+        return self._brotli.process(data) if self.coding == "br" else self._zlib.compress(data)
+
+    def flush(self) -> bytes:
+        return self._brotli.flush() if self.coding == "br" else self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._brotli.finish() if self.coding == "br" else self._zlib.flush(zlib.Z_FINISH)
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = COMPRESSION_MIN_SIZE,
+        gzip_level: int = GZIP_LEVEL,
+        brotli_quality: int = BROTLI_QUALITY,
+        stream_flush: int = COMPRESSION_STREAM_FLUSH
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.stream_flush = stream_flush
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        coding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        await self.app(scope, receive, _CompressingSend(self, coding, send))
+
+class _CompressingSend:
+    """Wraps `send` for one response: holds the start message until the body size is known."""
+
+    def __init__(self, middleware: CompressionMiddleware, coding: Optional[str], send: Send):
+        self.middleware = middleware
+        self.coding = coding
+        self.send = send
+        self.start: Optional[Message] = None
+        self.passthrough = False
+        self.buffer = bytearray()
+        self.compressor: Optional[_Compressor] = None
+        self.more = False # Compression started on a streamed body (headers already sent)
+        self.pending = 0 # Input bytes compressed since the last flush
+
+    def _eligible(self, message: Message) -> bool:
+        headers = Headers(raw=message["headers"])
+        status = message["status"]
+        if status < 200 or status in (204, 206, 304):
+            return False
+        if "content-encoding" in headers or "accept-ranges" in headers:
+            return False
+        return headers.get("content-type", "").lower().startswith(COMPRESSIBLE_TYPES)
+
+    async def __call__(self, message: Message):
+        if self.passthrough:
+            await self.send(message)
+            return
+
+        if message["type"] == "http.response.start":
+            if not self._eligible(message):
+                self.passthrough = True
+                await self.send(message)
+                return
+            # Caches must key the compressible representations on Accept-Encoding
+            MutableHeaders(raw=message["headers"]).add_vary_header("Accept-Encoding")
+            if self.coding is None:
+                self.passthrough = True
+                await self.send(message)
+                return
+            self.start = message
+            return
+
+        if message["type"] != "http.response.body":
+            # pathsend / zerocopy...: not a body we can rewrite
+            self.passthrough = True
+            if self.start is not None:
+                await self.send(self.start)
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            self.buffer += body
+            if len(self.buffer) < self.middleware.minimum_size:
+                if more_body:
+                    return # Keep buffering: the streamed body may still stay small
+                # Whole body under the threshold: sent as is
+                self.passthrough = True
+                await self.send(self.start)
+                await self.send({"type": "http.response.body", "body": bytes(self.buffer)})
+                return
+            await self._start_compressing(more_body)
+            body, self.buffer = bytes(self.buffer), bytearray()
+
+        await self._send_compressed(body, more_body)
+
+    async def _start_compressing(self, more_body: bool):
+        self.compressor = _Compressor(self.coding, self.middleware.gzip_level, self.middleware.brotli_quality)
+        headers = MutableHeaders(raw=self.start["headers"])
+        headers["Content-Encoding"] = self.coding
+        if "etag" in headers and not headers["etag"].startswith("W/"):
+            # Same content, different bytes: no longer a strong validator
+            headers["ETag"] = "W/" + headers["etag"]
+        del headers["Content-Length"]
+        self.more = more_body
+        if more_body:
+            await self.send(self.start)
+
+    async def _send_compressed(self, body: bytes, more_body: bool):
+        data = self.compressor.compress(body)
+        if not more_body:
+            data += self.compressor.finish()
+            if not self.more:
+                # Single message: the length is known
+                MutableHeaders(raw=self.start["headers"])["Content-Length"] = str(len(data))
+                await self.send(self.start)
+            await self.send({"type": "http.response.body", "body": data})
+            return
+
+        self.pending += len(body)
+        if self.pending >= self.middleware.stream_flush:
+            data += self.compressor.flush()
+            self.pending = 0
+        if data:
+            await self.send({"type": "http.response.body", "body": data, "more_body": True})
@@ -0,0 +1,131 @@
+"""
+Schema upgrades of existing databases.
+
+Base.metadata.create_all() only creates the missing tables: a column or an index
+added later to a table that already exists has to be applied here. Every step is
+idempotent (checks the live schema first) and runs at startup after create_all
+(sharding.create_all_shards) or by hand with `python manage.py migrate`.
+
+PostgreSQL: the steps run in one transaction behind an advisory lock, so workers
+starting together apply them once (DDL is transactional there).
+"""
+from sqlalchemy import inspect, select, func, text, Table, UniqueConstraint
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.orm import Session
+from typing import Callable, List, Tuple
+
+MIGRATIONS_LOCK_KEY = 270000
+
+def add_column(connection: Connection, table: str, column: str, ddl: str) -> bool:
+    """ALTER TABLE ... ADD COLUMN unless the table is missing (create_all builds it) or already has it."""
+    inspector = inspect(connection)
+    if not inspector.has_table(table):
+        return False
+    if column in {c["name"] for c in inspector.get_columns(table)}:
+        return False
+    connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    return True
+
+def missing_indexes(connection: Connection, table: Table) -> List[Tuple[str, str]]:
+    """
+    (name, DDL) of the indexes and unique constraints declared on `table` that the
+    database lacks. Matched on the indexed columns, not on the name: init.sql names
+    them idx_*, the ORM ix_* for index=True columns.
+    """
+    inspector = inspect(connection)
+    if not inspector.has_table(table.name):
+        return []
+    primary_key = tuple(inspector.get_pk_constraint(table.name)["constrained_columns"])
+    # SQLite: an inline UNIQUE column only shows up as its sqlite_autoindex
+    indexes = inspector.get_indexes(table.name, include_auto_indexes=True)
+    unique = {primary_key} | {tuple(c["column_names"]) for c in inspector.get_unique_constraints(table.name)}
+    unique |= {tuple(i["column_names"]) for i in indexes if i["unique"]}
+    indexed = unique | {tuple(i["column_names"]) for i in indexes}
+
+    missing = []
+    for index in sorted(table.indexes, key=lambda i: i.name):
+        columns = tuple(c.name for c in index.columns)
+        if columns not in (unique if index.unique else indexed):
+            missing.append((index.name, str(CreateIndex(index).compile(dialect=connection.dialect)).strip()))
+    for constraint in sorted(table.constraints, key=lambda c: c.name or ""):
+        if isinstance(constraint, UniqueConstraint):
+            columns = tuple(c.name for c in constraint.columns)
+            if columns not in unique:
+                # A unique index serves ON CONFLICT like the constraint create_all would have added
+                name = constraint.name or f"uq_{table.name}_{'_'.join(columns)}"
+                missing.append((name, f"CREATE UNIQUE INDEX {name} ON {table.name} ({', '.join(columns)})"))
+    return missing
+
+def create_indexes(connection: Connection, model) -> List[str]:
+    """
+    Creates the declared indexes / unique constraints of a model (or Table) that the
+    database does not have yet. A unique one that the existing rows violate is skipped (logged).
+    """
+    table = getattr(model, "__table__", model)
+    created = []
+    for name, ddl in missing_indexes(connection, table):
+        savepoint = connection.begin_nested()
+        try:
+            connection.execute(text(ddl))
+            savepoint.commit()
+            created.append(name)
+        except IntegrityError as e:
+            savepoint.rollback()
+            print(f"Migrations: {name} not created, duplicate rows in {table.name}: {e.orig}")
+    return created
+
+def _rollup_dirty_version(connection: Connection) -> bool:
+    # Bumped by every mark_dirty: refresh() clears the marker only if it did not move
+    return add_column(connection, "analytics_rollup_state", "dirty_version", "INTEGER NOT NULL DEFAULT 0")
+
+def _survey_session_and_created_at(connection: Connection) -> bool:
+    """
+    Survey answers per session and per month (SurveyStatsService). The answers stored
+    before had no date: they are dated at the migration, so they count in the current
+    month instead of being dropped by the aggregates.
+    """
+    from models import Survey
+    from services.survey_stats_service import SurveyStatsService
+
+    session_added = add_column(connection, "surveys", "session_id", "INTEGER REFERENCES sessions(id)")
+    # Nullable first: SQLite cannot ADD COLUMN ... NOT NULL with a non-constant default
+    created_added = add_column(connection, "surveys", "created_at", "TIMESTAMP")
+    if created_added:
+        connection.execute(text("UPDATE surveys SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL"))
+        if connection.dialect.name == "postgresql":
+            connection.execute(text("ALTER TABLE surveys ALTER COLUMN created_at SET NOT NULL"))
+    indexes = create_indexes(connection, Survey)
+
+    if created_added:
+        # survey_aggregates is new (create_all): count the existing answers once
+        with Session(bind=connection, join_transaction_mode="create_savepoint") as db:
+            SurveyStatsService().rebuild(db)
+    return session_added or created_added or bool(indexes)
+
+def _declared_indexes(connection: Connection) -> bool:
+    # Composite indexes / unique constraints added to tables that init.sql or an older
+    # create_all already built (candidats, contrats_versions, tickets, audit_logs...)
+    from database import Base
+    created = []
+    for table in Base.metadata.sorted_tables:
+        created += create_indexes(connection, table)
+    return bool(created)
+
+MIGRATIONS: List[Tuple[str, Callable[[Connection], bool]]] = [
+    ("analytics_rollup_state.dirty_version", _rollup_dirty_version),
+    ("surveys.session_id, surveys.created_at", _survey_session_and_created_at),
+    ("declared indexes", _declared_indexes),
+]
+
+def upgrade(engine: Engine) -> List[str]:
+    """Applies the pending steps on one database; returns the names of those that changed something."""
+    applied = []
+    with engine.begin() as connection:
+        if connection.dialect.name == "postgresql":
+            connection.execute(select(func.pg_advisory_xact_lock(MIGRATIONS_LOCK_KEY)))
+        for name, step in MIGRATIONS:
+            if step(connection):
+                applied.append(name)
+    return applied
@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, Date, DateTime, Numeric, Text, Enum
+from sqlalchemy import Column, Integer, BigInteger, String, ForeignKey, Boolean, Date, DateTime, Numeric, Text, Enum, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
+from datetime import datetime
 from database import Base
 import enum
 
@@ -27,8 +28,21 @@ class Tenant(Base):
     name = Column(String, nullable=False)
     slug = Column(String, unique=True, nullable=False)
 
+class TenantShard(Base):
+    """Annuaire des shards (base par défaut): un tenant absent de la table vit sur le shard par défaut."""
+    __tablename__ = "tenant_shards"
+
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), primary_key=True)
+    shard = Column(String(50), nullable=False)
+    moving = Column(Boolean, nullable=False, default=False) # Read-only while its rows are copied
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        UniqueConstraint("tenant_id", "email", name="unique_email_per_tenant"),
+        Index("idx_users_email", "email"), # Login: the tenant is not known yet
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True)
@@ -44,6 +58,10 @@ class Civilite(str, enum.Enum):
 
 class Candidat(Base):
     __tablename__ = "candidats"
+    __table_args__ = (
+        Index("idx_candidats_tenant_created_at", "tenant_id", "created_at"), # Time series
+        Index("idx_candidats_tenant_statut", "tenant_id", "statut"), # Status filter, funnel, dashboards
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True)
@@ -56,9 +74,29 @@ class Candidat(Base):
     statut = Column(Enum(CandidatStatus), default=CandidatStatus.NOUVEAU)
     cv_filename = Column(String, nullable=True)
     cv_raw_text = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
 
     tenant = relationship("Tenant")
 
+class CandidatStatusTransition(Base):
+    """
+    Historique append-only des changements de statut d'un candidat.
+    from_status est NULL pour la création; duration_seconds = temps passé dans from_status.
+    """
+    __tablename__ = "candidat_status_transitions"
+    __table_args__ = (
+        Index("idx_candidat_transitions_candidat_at", "candidat_id", "occurred_at"),
+        Index("idx_candidat_transitions_tenant_at", "tenant_id", "occurred_at"), # Funnel rebuild
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True)
+    candidat_id = Column(Integer, ForeignKey("candidats.id", ondelete="CASCADE"), nullable=False)
+    from_status = Column(Enum(CandidatStatus), nullable=True)
+    to_status = Column(Enum(CandidatStatus), nullable=False)
+    occurred_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    duration_seconds = Column(Integer, nullable=True)
+
 class Entreprise(Base):
     __tablename__ = "entreprises"
 
@@ -86,6 +124,10 @@ class Session(Base):
 
 class SessionDay(Base):
     __tablename__ = "session_days"
+    __table_args__ = (
+        UniqueConstraint("session_id", "date", name="unique_date_per_session"),
+        Index("idx_session_days_date", "date"), # Time series
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(Integer, ForeignKey("sessions.id"), nullable=False, index=True)
@@ -95,6 +137,21 @@ class SessionDay(Base):
     
     session = relationship("Session", back_populates="days")
 
+class ClosurePeriod(Base):
+    """Période de fermeture du CFA (vacances, ponts...), exclue du planning et de la facturation."""
+    __tablename__ = "closure_periods"
+    __table_args__ = (
+        Index("idx_closure_periods_tenant_date_debut", "tenant_id", "date_debut"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True)
+    label = Column(String, nullable=False)
+    date_debut = Column(Date, nullable=False)
+    date_fin = Column(Date, nullable=False)
+
+    tenant = relationship("Tenant")
+
 class ContratDossier(Base):
     __tablename__ = "contrats_dossier"
 
@@ -110,6 +167,14 @@ class ContratDossier(Base):
 
 class ContratVersion(Base):
     __tablename__ = "contrats_versions"
+    __table_args__ = (
+        Index("idx_contrats_versions_tenant_date_debut", "tenant_id", "date_debut"), # Time series
+        Index("idx_contrats_versions_active_date_fin", "is_active", "date_fin"), # Survey scheduler
+        UniqueConstraint("contrat_dossier_id", "version_number", name="unique_version_per_dossier"),
+        Index("idx_contrats_versions_dossier_active", "contrat_dossier_id", "is_active"), # Active version of a dossier
+        Index("idx_contrats_versions_tenant_active", "tenant_id", "is_active"), # Dashboards, forecast, conflicts
+        Index("idx_contrats_versions_session_id", "session_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True)
@@ -132,6 +197,10 @@ class ContratVersion(Base):
 
 class Attendance(Base):
     __tablename__ = "attendance"
+    __table_args__ = (
+        UniqueConstraint("contrat_version_id", "session_day_id", name="unique_attendance_per_student_day"),
+        Index("idx_attendance_tenant_status", "tenant_id", "status"), # Present-day counters (rollups, time series)
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True)
@@ -142,8 +211,34 @@ class Attendance(Base):
     tenant = relationship("Tenant")
     session_day = relationship("SessionDay")
 
+class AttendanceMonthlySummary(Base):
+    """
+    Compteurs de présence par (contrat_version, mois), maintenus dans la même
+    transaction que les écritures Attendance (voir AttendanceSummaryService).
+    """
+    __tablename__ = "attendance_monthly_summary"
+    __table_args__ = (
+        UniqueConstraint("contrat_version_id", "month", name="unique_summary_per_version_month"),
+        Index("idx_attendance_summary_tenant_month", "tenant_id", "month"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True)
+    contrat_version_id = Column(Integer, ForeignKey("contrats_versions.id"), nullable=False, index=True)
+    month = Column(Date, nullable=False) # First day of the month
+
+    present_count = Column(Integer, nullable=False, default=0)
+    justified_count = Column(Integer, nullable=False, default=0)
+    unjustified_count = Column(Integer, nullable=False, default=0)
+    realized_hours = Column(Numeric(10, 2), nullable=False, default=0)
+
 class Invoice(Base):
     __tablename__ = "invoices"
+    __table_args__ = (
+        Index("idx_invoices_tenant_date_emission", "tenant_id", "date_emission"), # Time series
+        Index("idx_invoices_tenant_statut", "tenant_id", "statut"), # Revenue (EMISE / PAYEE)
+        Index("idx_invoices_contrat_dossier_id", "contrat_dossier_id"), # BPF annex
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True)
@@ -158,10 +253,90 @@ class Invoice(Base):
     tenant = relationship("Tenant")
     dossier = relationship("ContratDossier")
 
+# --- Analytics rollups ---
+
+class AnalyticsDailySnapshot(Base):
+    """
+    KPIs d'un tenant à une date donnée (une ligne par tenant et par jour).
+    Les compteurs du pipeline candidats ne sont connus qu'au jour du snapshot:
+    ils restent NULL pour les jours reconstruits a posteriori (backfill).
+    """
+    __tablename__ = "analytics_daily_snapshots"
+    __table_args__ = (
+        UniqueConstraint("tenant_id", "day", name="unique_snapshot_per_tenant_day"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True)
+    day = Column(Date, nullable=False)
+
+    candidats_nouveau = Column(Integer, nullable=True)
+    candidats_admissible = Column(Integer, nullable=True)
+    candidats_entretien = Column(Integer, nullable=True)
+    candidats_place = Column(Integer, nullable=True)
+    candidats_rejete = Column(Integer, nullable=True)
+
+    contrats_actifs = Column(Integer, nullable=False, default=0)
+    heures_realisees = Column(Numeric(12, 2), nullable=False, default=0)
+    montant_facture = Column(Numeric(12, 2), nullable=False, default=0)
+
+class AnalyticsRollupState(Base):
+    """Premier jour à recalculer pour un tenant (NULL = à jour jusqu'au dernier refresh)."""
+    __tablename__ = "analytics_rollup_state"
+
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), primary_key=True)
+    dirty_from = Column(Date, nullable=True)
+    dirty_version = Column(Integer, nullable=False, default=0, server_default="0") # +1 per mark_dirty
+    last_refreshed_at = Column(DateTime, nullable=True)
+
+class CandidatFunnelMonthly(Base):
+    """
+    Compteurs du funnel candidats par (tenant, mois, transition), maintenus avec
+    chaque CandidatStatusTransition (voir FunnelService). Les colonnes d_* forment
+    l'histogramme du temps passé dans from_status ("CREATION" pour une création).
+    """
+    __tablename__ = "candidat_funnel_monthly"
+    __table_args__ = (
+        UniqueConstraint("tenant_id", "month", "from_status", "to_status", name="unique_funnel_per_tenant_month_transition"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True)
+    month = Column(Date, nullable=False) # First day of the month
+    from_status = Column(String(20), nullable=False)
+    to_status = Column(String(20), nullable=False)
+
+    transitions = Column(Integer, nullable=False, default=0)
+    duration_seconds = Column(BigInteger, nullable=False, default=0)
+    d_1h = Column(Integer, nullable=False, default=0)
+    d_1j = Column(Integer, nullable=False, default=0)
+    d_3j = Column(Integer, nullable=False, default=0)
+    d_7j = Column(Integer, nullable=False, default=0)
+    d_14j = Column(Integer, nullable=False, default=0)
+    d_30j = Column(Integer, nullable=False, default=0)
+    d_60j = Column(Integer, nullable=False, default=0)
+    d_90j = Column(Integer, nullable=False, default=0)
+    d_plus = Column(Integer, nullable=False, default=0)
+
+class ScheduledJob(Base):
+    """État persistant d'un job périodique du scheduler in-process (partagé par tous les workers)."""
+    __tablename__ = "scheduled_jobs"
+
+    name = Column(String(100), primary_key=True)
+    interval_seconds = Column(Integer, nullable=False)
+    next_run_at = Column(DateTime, nullable=True)
+    last_run_at = Column(DateTime, nullable=True)
+    last_status = Column(String(20), nullable=True) # OK / ERROR
+    last_result = Column(Text, nullable=True)
+    last_duration_ms = Column(Integer, nullable=True)
+
 # --- Quality & Compliance Module (Module F) ---
 
 class AuditLog(Base):
     __tablename__ = "audit_logs"
+    __table_args__ = (
+        Index("idx_audit_logs_tenant_timestamp", "tenant_id", "timestamp"), # Latest entries first
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True)
@@ -185,6 +360,12 @@ class TicketCategory(str, enum.Enum):
 
 class Ticket(Base):
     __tablename__ = "tickets"
+    __table_args__ = (
+        # Triage filters + keyset pagination on (created_at, id)
+        Index("idx_tickets_tenant_status_created_at", "tenant_id", "status", "created_at", "id"),
+        Index("idx_tickets_tenant_created_at", "tenant_id", "created_at", "id"),
+        Index("idx_tickets_tenant_author_created_at", "tenant_id", "author_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True)
@@ -206,6 +387,9 @@ class SurveyType(str, enum.Enum):
 
 class Survey(Base):
     __tablename__ = "surveys"
+    __table_args__ = (
+        Index("idx_surveys_tenant_created_at", "tenant_id", "created_at"), # Aggregates rebuild
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True)
@@ -214,10 +398,63 @@ class Survey(Base):
     type = Column(Enum(SurveyType), nullable=False)
     score = Column(Integer, nullable=False) # 1-10
     comment = Column(Text, nullable=True)
+    session_id = Column(Integer, ForeignKey("sessions.id"), nullable=True, index=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
     
     tenant = relationship("Tenant")
     target_user = relationship("User")
 
+class SurveyAggregate(Base):
+    """
+    Compteurs des réponses aux enquêtes par (tenant, type, mois, session),
+    mis à jour à chaque réponse (voir SurveyStatsService). session_id = 0: sans session.
+    """
+    __tablename__ = "survey_aggregates"
+    __table_args__ = (
+        UniqueConstraint("tenant_id", "type", "month", "session_id", name="unique_survey_aggregate"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True)
+    type = Column(String(20), nullable=False)
+    month = Column(Date, nullable=False) # First day of the month
+    session_id = Column(Integer, nullable=False, default=0)
+
+    response_count = Column(Integer, nullable=False, default=0)
+    score_sum = Column(Integer, nullable=False, default=0)
+    score_1 = Column(Integer, nullable=False, default=0)
+    score_2 = Column(Integer, nullable=False, default=0)
+    score_3 = Column(Integer, nullable=False, default=0)
+    score_4 = Column(Integer, nullable=False, default=0)
+    score_5 = Column(Integer, nullable=False, default=0)
+    score_6 = Column(Integer, nullable=False, default=0)
+    score_7 = Column(Integer, nullable=False, default=0)
+    score_8 = Column(Integer, nullable=False, default=0)
+    score_9 = Column(Integer, nullable=False, default=0)
+    score_10 = Column(Integer, nullable=False, default=0)
+
+class SurveyDispatchStatus(str, enum.Enum):
+    PENDING = "PENDING"
+    SENT = "SENT"
+    CANCELLED = "CANCELLED"
+
+class SurveyDispatch(Base):
+    """Enquête à envoyer à un apprenti pour une échéance de son contrat (file alimentée par le scheduler)."""
+    __tablename__ = "survey_dispatches"
+    __table_args__ = (
+        UniqueConstraint("contrat_version_id", "type", name="unique_dispatch_per_version_type"),
+        Index("idx_survey_dispatches_tenant_status_due", "tenant_id", "status", "due_date"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False)
+    contrat_version_id = Column(Integer, ForeignKey("contrats_versions.id"), nullable=False)
+    type = Column(Enum(SurveyType), nullable=False)
+    due_date = Column(Date, nullable=False)
+    status = Column(Enum(SurveyDispatchStatus), nullable=False, default=SurveyDispatchStatus.PENDING)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
 class WatchCategory(str, enum.Enum):
     LOI = "LOI"
     TECH = "TECH"
@@ -226,6 +463,9 @@ class WatchCategory(str, enum.Enum):
 
 class RegulatoryWatch(Base):
     __tablename__ = "regulatory_watch"
+    __table_args__ = (
+        Index("idx_regulatory_watch_tenant_created_at", "tenant_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True)
@@ -1,132 +1,325 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func, case
-from typing import Dict, Any
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select, cast, literal, union_all, String, Numeric
+from typing import Dict, Any, Optional
+from datetime import date, timedelta
 
-from database import get_db
-from models import User, ContratVersion, Invoice, Candidat, CandidatStatus, Session as TrainingSession, Attendance, AttendanceStatus, SessionDay, InvoiceStatus
-from auth import get_current_user
+from database import get_db, get_async_read_db, get_read_db, read_engine, SessionLocal
+from models import User, ContratVersion, ContratDossier, Invoice, Candidat, CandidatStatus, Session as TrainingSession, InvoiceStatus, AttendanceMonthlySummary
+from auth import get_current_user, get_current_user_async
+from services.forecast_service import ForecastService, GROUP_BY_FIELDS
+from services.analytics_cache import analytics_cache, cache_ttl
+from services.rollup_service import RollupService, PIPELINE_COLUMNS
+from services.timeseries_service import TimeseriesService, METRICS
+from services.bpf_service import BpfService
+from services.funnel_service import FunnelService
+from services.aggregates import GRANULARITIES
 
 router = APIRouter(
     prefix="/analytics",
     tags=["Intelligence & Analytics"]
 )
 
+# Single-query endpoints run on the event loop (async session); the CPU-heavy ones
+# (bpf, forecast, daily) stay sync so their Python work runs in the threadpool.
+
 @router.get("/dashboard")
-def get_financial_dashboard(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+async def get_financial_dashboard(
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     tenant_id = current_user.tenant_id
+    return await analytics_cache.get_or_compute_async(
+        tenant_id, "dashboard", {}, lambda: db.run_sync(compute_financial_dashboard, tenant_id), ttl=cache_ttl(db)
+    )
+
+def compute_financial_dashboard(db: Session, tenant_id: int) -> Dict[str, Any]:
+    # Single round trip: one SELECT with scalar subqueries + a CTE of conditional counts
 
     # 1. CA Prévisionnel : Somme (Coût NPEC) des contrats actifs
     # Note: Si cout_npec est null, on considère 0.
-    ca_previsionnel = db.query(func.sum(ContratVersion.cout_npec))\
-        .filter(ContratVersion.tenant_id == tenant_id, ContratVersion.is_active == True)\
-        .scalar() or 0
+    ca_previsionnel = select(func.coalesce(func.sum(ContratVersion.cout_npec), 0))\
+        .where(ContratVersion.tenant_id == tenant_id, ContratVersion.is_active == True)\
+        .scalar_subquery()
 
     # 2. CA Réalisé : Somme (montant_ht) des factures EMISE ou PAYEE
-    ca_realise = db.query(func.sum(Invoice.montant_ht))\
-        .filter(
-            Invoice.tenant_id == tenant_id, 
+    ca_realise = select(func.coalesce(func.sum(Invoice.montant_ht), 0))\
+        .where(
+            Invoice.tenant_id == tenant_id,
             Invoice.statut.in_([InvoiceStatus.EMISE, InvoiceStatus.PAYEE])
-        ).scalar() or 0
+        ).scalar_subquery()
 
     # 3. Taux Transformation : (Statut 'PLACE' / Total) * 100
-    total_candidats = db.query(func.count(Candidat.id))\
-        .filter(Candidat.tenant_id == tenant_id).scalar() or 0
-    
-    places_candidats = db.query(func.count(Candidat.id))\
-        .filter(Candidat.tenant_id == tenant_id, Candidat.statut == CandidatStatus.PLACE)\
-        .scalar() or 0
+    candidat_stats = select(
+        func.count(Candidat.id).label("total"),
+        func.count(Candidat.id).filter(Candidat.statut == CandidatStatus.PLACE).label("places")
+    ).where(Candidat.tenant_id == tenant_id).cte("candidat_stats")
+
+    row = db.execute(select(
+        ca_previsionnel.label("ca_previsionnel"),
+        ca_realise.label("ca_realise"),
+        candidat_stats.c.total,
+        candidat_stats.c.places
+    )).one()
 
     taux_transformation = 0.0
-    if total_candidats > 0:
-        taux_transformation = (places_candidats / total_candidats) * 100
+    if row.total:
+        taux_transformation = (row.places / row.total) * 100
 
     return {
-        "ca_previsionnel": float(ca_previsionnel),
-        "ca_realise": float(ca_realise),
+        "ca_previsionnel": float(row.ca_previsionnel),
+        "ca_realise": float(row.ca_realise),
         "taux_transformation": round(taux_transformation, 2)
     }
 
 @router.get("/bpf-preview")
-def get_bpf_preview(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+async def get_bpf_preview(
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     tenant_id = current_user.tenant_id
+    return await analytics_cache.get_or_compute_async(
+        tenant_id, "bpf-preview", {}, lambda: db.run_sync(compute_bpf_preview, tenant_id), ttl=cache_ttl(db)
+    )
 
-    # 1. Répartition Sexe (Candidats avec un contrat ou juste candidats ? Le prompt dit "basé sur la table Candidats liée aux Contrats actifs")
-    # Interpretation: Join ContratVersion active -> ContratDossier -> Candidat
-    # Ou plus simple: Tous les candidats pour l'instant, ou ceux qui sont 'PLACE'.
-    # Suivons la consigne stricte : "liée aux Contrats actifs"
-    
-    # Query: Group by civilite, Count
+def compute_bpf_preview(db: Session, tenant_id: int) -> Dict[str, Any]:
+    # Single round trip: every section is a branch of one UNION ALL returning
+    # (section, cle, valeur) rows, sharing the CTE of active contracts.
+    active_versions = select(ContratVersion.id, ContratVersion.contrat_dossier_id, ContratVersion.session_id)\
+        .where(ContratVersion.tenant_id == tenant_id, ContratVersion.is_active == True)\
+        .cte("active_versions")
+
+    # 1. Répartition Sexe: Candidats liés aux Contrats actifs
     # Join path: Candidat -> ContratDossier -> ContratVersion(is_active=True)
-    # Fix: Use explicit joins as reverse relationships might not be defined
-    from models import ContratDossier
-    
-    sex_stats = db.query(Candidat.civilite, func.count(Candidat.id))\
-        .join(ContratDossier, ContratDossier.candidat_id == Candidat.id)\
-        .join(ContratVersion, ContratVersion.contrat_dossier_id == ContratDossier.id)\
-        .filter(
-            Candidat.tenant_id == tenant_id,
-            ContratVersion.is_active == True
-        ).group_by(Candidat.civilite).all()
-    
-    repartition_sexe = {
-        "H": 0,
-        "F": 0,
-        "AUTRE": 0
-    }
-    for civ, count in sex_stats:
-        if civ == "M": repartition_sexe["H"] += count
-        elif civ == "MME": repartition_sexe["F"] += count
-        else: repartition_sexe["AUTRE"] += count
+    sexe = select(
+        literal("sexe").label("section"),
+        cast(Candidat.civilite, String).label("cle"),
+        cast(func.count(Candidat.id), Numeric(12, 2)).label("valeur")
+    ).join(ContratDossier, ContratDossier.candidat_id == Candidat.id)\
+     .join(active_versions, active_versions.c.contrat_dossier_id == ContratDossier.id)\
+     .where(Candidat.tenant_id == tenant_id)\
+     .group_by(Candidat.civilite)
 
     # 2. Total Heures Réalisées (Attendance PRESENT)
-    # Join Attendance -> SessionDay
-    # Logic: 3.5h per half day.
-    # We can sum (is_morning + is_afternoon) * 3.5 roughly or be more precise.
-    # Let's count morning presents + afternoon presents if we tracked them separately?
-    # Model Attendance has 'session_day_id'. SessionDay has is_morning/is_afternoon.
-    # BUT Attendance status is global for the day? Or usually Attendance is per half-day?
-    # Schema says: Attendance linked to SessionDay. SessionDay has date.
-    # Usually attendance is granular. Assuming AttendanceStatus.PRESENT means "Present for the required duration of that day".
-    # SessionDay has 'is_morning' (bool) and 'is_afternoon' (bool).
-    # If both are true -> 7h. If one -> 3.5h.
-    
-    # Let's fetch all PRESENT attendances and sum their theoretical hours.
-    # Optimization: perform sum in DB.
-    # CASE WHEN (is_morning AND is_afternoon) THEN 7 ELSE 3.5 END
-    
-    total_hours = db.query(
-        func.sum(
-            case(
-                (SessionDay.is_morning & SessionDay.is_afternoon, 7.0),
-                else_=3.5
-            )
-        )
-    ).select_from(Attendance).join(SessionDay, Attendance.session_day_id == SessionDay.id)\
-     .filter(
-         Attendance.tenant_id == tenant_id,
-         Attendance.status == AttendanceStatus.PRESENT
-     ).scalar() or 0
+    # Logic: 3.5h per half day (7h when is_morning AND is_afternoon).
+    # Read from the monthly summary maintained on each attendance write
+    # (O(contracts x months) rows instead of every Attendance joined to SessionDay).
+    heures = select(
+        literal("heures").label("section"),
+        literal(None, String).label("cle"),
+        cast(func.coalesce(func.sum(AttendanceMonthlySummary.realized_hours), 0), Numeric(12, 2)).label("valeur")
+    ).where(AttendanceMonthlySummary.tenant_id == tenant_id)
 
     # 3. Répartition RNCP
     # Group by Session.formation_rncp_id, Count (Distinct Candidat via Contrat)
-    rncp_stats = db.query(TrainingSession.formation_rncp_id, func.count(ContratVersion.id))\
-        .join(ContratVersion, ContratVersion.session_id == TrainingSession.id)\
-        .filter(
-            TrainingSession.tenant_id == tenant_id,
-            ContratVersion.is_active == True
-        ).group_by(TrainingSession.formation_rncp_id).all()
-    
-    repartition_rncp = {rncp: count for rncp, count in rncp_stats if rncp}
+    rncp = select(
+        literal("rncp").label("section"),
+        TrainingSession.formation_rncp_id.label("cle"),
+        cast(func.count(active_versions.c.id), Numeric(12, 2)).label("valeur")
+    ).join(active_versions, active_versions.c.session_id == TrainingSession.id)\
+     .where(TrainingSession.tenant_id == tenant_id)\
+     .group_by(TrainingSession.formation_rncp_id)
+
+    rows = db.execute(union_all(sexe, heures, rncp)).all()
+
+    repartition_sexe = {
+        "H": 0,
+        "F": 0,
+        "AUTRE": 0
+    }
+    total_hours = 0
+    repartition_rncp = {}
+    for section, cle, valeur in rows:
+        if section == "sexe":
+            if cle == "M": repartition_sexe["H"] += int(valeur)
+            elif cle == "MME": repartition_sexe["F"] += int(valeur)
+            else: repartition_sexe["AUTRE"] += int(valeur)
+        elif section == "heures":
+            total_hours = valeur or 0
+        elif cle:
+            repartition_rncp[cle] = int(valeur)
 
     return {
         "repartition_sexe": repartition_sexe,
-        "total_heures_realisees": total_hours,
+        "total_heures_realisees": float(total_hours),
         "repartition_rncp": repartition_rncp
     }
+
+@router.get("/bpf")
+def get_bpf(
+    year: int = Query(..., ge=2000, le=2100),
+    start_month: int = Query(1, ge=1, le=12),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """
+    BPF complet d'un exercice (stagiaires, heures par RNCP / sexe, absences, produits par financeur).
+    `start_month` pour un exercice décalé (ex: 9 = septembre `year` -> août `year`+1).
+    """
+    params = {"year": year, "start_month": start_month}
+    return analytics_cache.get_or_compute(
+        current_user.tenant_id, "bpf", params,
+        lambda: BpfService().report(db, current_user.tenant_id, **params), ttl=cache_ttl(db)
+    )
+
+@router.get("/bpf/annexe.csv")
+def export_bpf_annex(
+    request: Request,
+    year: int = Query(..., ge=2000, le=2100),
+    start_month: int = Query(1, ge=1, le=12),
+    current_user: User = Depends(get_current_user)
+):
+    """Annexe détaillée par stagiaire, streamée en CSV (pas de pagination)."""
+    tenant_id = current_user.tenant_id
+    bind = read_engine(request)
+
+    def stream():
+        # Own session: the request one may be closed before the body is fully sent
+        db = SessionLocal(bind=bind)
+        try:
+            yield from BpfService().annex_csv(db, tenant_id, year, start_month)
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": f"attachment; filename=bpf_annexe_{year}.csv"}
+    )
+
+@router.get("/forecast")
+def get_revenue_forecast(
+    start: Optional[date] = None,
+    months: int = Query(12, ge=1, le=60),
+    group_by: str = "rncp",
+    absence_rate: Optional[float] = Query(None, ge=0, le=1),
+    slippage_days: int = 0,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Facturation prévisionnelle mois par mois (contrat, session ou RNCP).
+    What-if: `absence_rate` remplace le taux d'absence injustifiée historique,
+    `slippage_days` décale le début/fin de tous les contrats.
+    """
+    if group_by not in GROUP_BY_FIELDS:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of {', '.join(GROUP_BY_FIELDS)}")
+
+    start = start or date.today()
+    params = {
+        "start": start,
+        "months": months,
+        "group_by": group_by,
+        "absence_rate": absence_rate,
+        "slippage_days": slippage_days
+    }
+    service = ForecastService()
+    return analytics_cache.get_or_compute(
+        current_user.tenant_id, "forecast", params,
+        lambda: service.forecast(db, current_user.tenant_id, **params), ttl=cache_ttl(db)
+    )
+
+@router.get("/daily")
+def get_daily_snapshots(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Série quotidienne des KPIs (pipeline candidats, contrats actifs, heures, facturé)
+    lue dans les snapshots, rafraîchis par le job rollup-refresh du scheduler
+    (ou POST /analytics/daily/refresh).
+    """
+    end = end or date.today()
+    start = start or end - timedelta(days=90)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+
+    snapshots = RollupService().time_series(db, current_user.tenant_id, start, end)
+
+    return [
+        {
+            "day": s.day,
+            "pipeline": {
+                status.value: getattr(s, column) for status, column in PIPELINE_COLUMNS.items()
+            } if s.candidats_nouveau is not None else None,
+            "contrats_actifs": s.contrats_actifs,
+            "heures_realisees": float(s.heures_realisees),
+            "montant_facture": float(s.montant_facture),
+        }
+        for s in snapshots
+    ]
+
+@router.post("/daily/refresh")
+def refresh_daily_snapshots(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Recalcule tout de suite les jours modifiés depuis le dernier rafraîchissement."""
+    return {"jours_recalcules": RollupService().refresh(db, current_user.tenant_id)}
+
+@router.get("/timeseries")
+async def get_timeseries(
+    metric: str,
+    granularity: str = "month",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    Série temporelle d'un indicateur (CA facturé, heures réalisées, nouveaux candidats,
+    débuts de contrat), une valeur par période, périodes vides à 0. Par défaut: 12 derniers mois.
+    """
+    if metric not in METRICS:
+        raise HTTPException(status_code=400, detail=f"metric must be one of {', '.join(METRICS)}")
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of {', '.join(GRANULARITIES)}")
+
+    end = end or date.today()
+    start = start or end - timedelta(days=365)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if (end - start).days > 366 * 20:
+        raise HTTPException(status_code=400, detail="Range too large (20 years max)")
+
+    params = {"metric": metric, "granularity": granularity, "start": start, "end": end}
+    points = await analytics_cache.get_or_compute_async(
+        current_user.tenant_id, "timeseries", params,
+        lambda: db.run_sync(lambda session: TimeseriesService().series(session, current_user.tenant_id, **params)),
+        ttl=cache_ttl(db)
+    )
+    return {"metric": metric, "granularity": granularity, "points": points}
+
+@router.get("/funnel")
+async def get_candidate_funnel(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    Funnel candidats par étape: entrées, taux de conversion / d'abandon et durée médiane
+    passée dans l'étape, lus dans les compteurs mensuels. Par défaut: 12 derniers mois.
+    """
+    end = end or date.today()
+    start = start or end - timedelta(days=365)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+
+    params = {"start": start, "end": end}
+    return await analytics_cache.get_or_compute_async(
+        current_user.tenant_id, "funnel", params,
+        lambda: db.run_sync(lambda session: FunnelService().report(session, current_user.tenant_id, **params)),
+        ttl=cache_ttl(db)
+    )
+
+@router.get("/cache-stats")
+async def get_cache_stats(
+    current_user: User = Depends(get_current_user_async)
+):
+    """Taux de succès du cache analytics (process courant)."""
+    return analytics_cache.stats()
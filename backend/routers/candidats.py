@@ -1,12 +1,16 @@
 from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, status
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
 from typing import List, Optional
 
-from database import get_db
+from database import get_db, get_async_read_db
 from models import User, Candidat, CandidatStatus
-from auth import get_current_user
+from auth import get_current_user, get_current_user_async
 from repository import BaseRepository
 from services.cv_parser import CvParserService
+from services.funnel_service import FunnelService
+from schemas import CandidatResponse
 
 router = APIRouter(
     prefix="/candidats",
@@ -51,6 +55,8 @@ def upload_cv(
     )
     
     db.add(new_candidat)
+    db.flush()
+    FunnelService().record_transition(db, new_candidat, None, new_candidat.statut)
     db.commit()
     db.refresh(new_candidat)
     
@@ -61,19 +67,19 @@ def upload_cv(
         "status": new_candidat.statut
     }
 
-@router.get("/")
-def list_candidats(
+@router.get("/", response_model=List[CandidatResponse])
+async def list_candidats(
     page: int = 1,
     size: int = 50,
     status: Optional[CandidatStatus] = None,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     # Tenant Isolation via Repository logic manual here
-    query = db.query(Candidat).filter(Candidat.tenant_id == current_user.tenant_id)
+    query = select(Candidat).where(Candidat.tenant_id == current_user.tenant_id)
     
     if status:
-        query = query.filter(Candidat.statut == status)
+        query = query.where(Candidat.statut == status)
         
     # Validating pagination
     if page < 1: page = 1
@@ -81,7 +87,8 @@ def list_candidats(
     if size > 100: size = 100 # Cap max size
     
     skip = (page - 1) * size
-    return query.offset(skip).limit(size).all()
+    result = await db.execute(query.offset(skip).limit(size))
+    return result.scalars().all()
 
 from schemas import CandidatCreate
 
@@ -97,9 +104,11 @@ def create_candidat(
         last_name=candidat.last_name,
         email=candidat.email,
         civilite=candidat.civilite,
-        statut=candidat.statut
+        statut=candidat.statut or CandidatStatus.NOUVEAU
     )
     db.add(new_candidat)
+    db.flush()
+    FunnelService().record_transition(db, new_candidat, None, new_candidat.statut)
     db.commit()
     db.refresh(new_candidat)
     return new_candidat
@@ -120,6 +129,8 @@ def update_status(
     if not candidat:
         raise HTTPException(status_code=404, detail="Candidat not found")
         
+    # History + funnel counters in the same transaction as the status change
+    FunnelService().record_transition(db, candidat, candidat.statut, status)
     candidat.statut = status
     db.commit()
     db.refresh(candidat)
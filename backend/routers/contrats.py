@@ -1,35 +1,42 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
 from typing import List
 
-from database import get_db
+from database import get_db, get_async_read_db
 from models import User, ContratDossier, ContratVersion, Candidat, Entreprise, SessionDay
-from auth import get_current_user
-from schemas import ContratCreate, ContratAvenant
+from auth import get_current_user, get_current_user_async
+from schemas import (ContratCreate, ContratAvenant, ContratListItem, ContratDetailResponse, ContratVersionResponse,
+                     SessionDayResponse)
+from services.attendance_matrix import invalidate_attendance_matrix
+from services.rollup_service import RollupService
 
 router = APIRouter(
     prefix="/contrats",
     tags=["contrats"]
 )
 
-@router.get("/")
-def get_contrats(
+@router.get("/", response_model=List[ContratListItem])
+async def get_contrats(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """
     List all Contract Dossiers for the tenant.
     Includes Candidat and Entreprise relationships.
     """
-    dossiers = db.query(ContratDossier).options(
+    # Relationships loaded eagerly: no lazy load is possible on an AsyncSession
+    result = await db.execute(select(ContratDossier).options(
         joinedload(ContratDossier.candidat),
         joinedload(ContratDossier.entreprise),
-        joinedload(ContratDossier.versions)
-    ).filter(
+        selectinload(ContratDossier.versions)
+    ).where(
         ContratDossier.tenant_id == current_user.tenant_id
-    ).offset(skip).limit(limit).all()
+    ).offset(skip).limit(limit))
+    dossiers = result.scalars().all()
     
     # We enrich the response with the active version details if needed
     results = []
@@ -81,8 +88,10 @@ def create_contrat(
             is_active=True
         )
         db.add(version_1)
+        RollupService().mark_dirty(db, current_user.tenant_id, contrat_data.date_debut)
         
         db.commit()
+        invalidate_attendance_matrix(contrat_data.session_id)
         db.refresh(dossier)
         return {"dossier_id": dossier.id, "message": "Contrat créé V1"}
         
@@ -137,7 +146,16 @@ def create_avenant(
             is_active=True
         )
         db.add(new_version)
+        # Active contract counts change from the earliest of both versions' start dates
+        dirty_from = avenant_data.date_debut
+        if current_version and current_version.date_debut:
+            dirty_from = min(dirty_from, current_version.date_debut)
+        RollupService().mark_dirty(db, current_user.tenant_id, dirty_from)
         db.commit()
+        invalidate_attendance_matrix(new_session_id)
+        if current_session_id != new_session_id:
+            # The student left the old promo's matrix
+            invalidate_attendance_matrix(current_session_id)
         
         return {"message": f"Avenant créé. Nouvelle version : {new_version_number}"}
 
@@ -146,20 +164,21 @@ def create_avenant(
         print(e)
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/{dossier_id}")
-def get_contrat_active(
+@router.get("/{dossier_id}", response_model=ContratDetailResponse)
+async def get_contrat_active(
     dossier_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: User = Depends(get_current_user_async)
 ):
-    dossier = db.query(ContratDossier).options(
+    result = await db.execute(select(ContratDossier).options(
         joinedload(ContratDossier.candidat),
         joinedload(ContratDossier.entreprise),
-        joinedload(ContratDossier.versions)
-    ).filter(
+        selectinload(ContratDossier.versions)
+    ).where(
         ContratDossier.id == dossier_id, 
         ContratDossier.tenant_id == current_user.tenant_id
-    ).first()
+    ))
+    dossier = result.scalars().first()
     
     if not dossier:
         raise HTTPException(status_code=404, detail="Not found")
@@ -171,31 +190,31 @@ def get_contrat_active(
         "active_version": active_version
     }
 
-@router.get("/{dossier_id}/history")
-def get_contrat_history(
+@router.get("/{dossier_id}/history", response_model=List[ContratVersionResponse])
+async def get_contrat_history(
     dossier_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: User = Depends(get_current_user_async)
 ):
-    versions = db.query(ContratVersion).filter(
+    result = await db.execute(select(ContratVersion).where(
         ContratVersion.contrat_dossier_id == dossier_id,
         ContratVersion.tenant_id == current_user.tenant_id
-    ).order_by(ContratVersion.version_number.asc()).all()
+    ).order_by(ContratVersion.version_number.asc()))
     
-    return versions
+    return result.scalars().all()
 
-@router.get("/{dossier_id}/calendar")
-def get_contrat_calendar(
+@router.get("/{dossier_id}/calendar", response_model=List[SessionDayResponse])
+async def get_contrat_calendar(
     dossier_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     # 1. Get Active Version
-    version = db.query(ContratVersion).join(ContratDossier).filter(
+    version = (await db.execute(select(ContratVersion).join(ContratDossier).where(
         ContratDossier.id == dossier_id,
         ContratDossier.tenant_id == current_user.tenant_id,
         ContratVersion.is_active == True
-    ).first()
+    ).limit(1))).scalars().first()
     
     if not version:
         raise HTTPException(status_code=404, detail="Contrat actif non trouvé")
@@ -204,10 +223,10 @@ def get_contrat_calendar(
         raise HTTPException(status_code=400, detail="Aucune session liée à ce contrat")
 
     # 2. Get Session Days intersecting Contract Dates
-    days = db.query(SessionDay).filter(
+    result = await db.execute(select(SessionDay).where(
         SessionDay.session_id == version.session_id,
         SessionDay.date >= version.date_debut,
         SessionDay.date <= version.date_fin
-    ).order_by(SessionDay.date).all()
+    ).order_by(SessionDay.date))
     
-    return days
+    return result.scalars().all()
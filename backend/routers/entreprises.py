@@ -2,10 +2,10 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
 
-from database import get_db
+from database import get_db, get_read_db
 from models import User, Entreprise
 from auth import get_current_user
-from schemas import EntrepriseCreate
+from schemas import EntrepriseCreate, EntrepriseResponse
 
 router = APIRouter(
     prefix="/entreprises",
@@ -27,9 +27,9 @@ def create_entreprise(
     db.refresh(new_entreprise)
     return new_entreprise
 
-@router.get("/")
+@router.get("/", response_model=List[EntrepriseResponse])
 def list_entreprises(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
     return db.query(Entreprise).filter(Entreprise.tenant_id == current_user.tenant_id).all()
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from database import get_db
+from database import get_read_db
 from models import User, ContratDossier, ContratVersion, Candidat, Entreprise
 from auth import get_current_user
 from services.pdf_service import PdfService
@@ -16,7 +16,7 @@ router = APIRouter(
 @router.get("/{dossier_id}/export-zip")
 def export_contrat_zip(
     dossier_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
     # 1. Fetch Data (Strict Isolation)
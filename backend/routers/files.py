@@ -0,0 +1,61 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import RedirectResponse
+from sqlalchemy.orm import Session
+import os
+
+from database import get_db
+from models import User, Candidat, RegulatoryWatch
+from auth import get_current_user
+from services import cv_parser
+from services.file_response import TenantFileResponse
+
+router = APIRouter(
+    prefix="/files",
+    tags=["files"]
+)
+
+def tenant_file_path(tenant_id: int, relative_path: str) -> str:
+    """Absolute path of a file of the tenant's upload directory, 404 if missing or outside of it."""
+    base = os.path.realpath(os.path.join(cv_parser.UPLOAD_DIR, str(tenant_id)))
+    path = os.path.realpath(os.path.join(base, relative_path))
+    # Path traversal / other tenant's directory (../2/cv.pdf, absolute paths, symlinks)
+    if os.path.commonpath([base, path]) != base or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Fichier introuvable")
+    return path
+
+@router.get("/candidats/{candidat_id}/cv")
+def download_cv(
+    candidat_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """CV du candidat (Range / ETag / If-Modified-Since: aperçu PDF page par page)."""
+    candidat = db.query(Candidat).filter(
+        Candidat.id == candidat_id,
+        Candidat.tenant_id == current_user.tenant_id
+    ).first()
+    if not candidat or not candidat.cv_filename:
+        raise HTTPException(status_code=404, detail="Fichier introuvable")
+
+    path = tenant_file_path(current_user.tenant_id, candidat.cv_filename)
+    return TenantFileResponse(path, filename=os.path.basename(path))
+
+@router.get("/regulatory-watch/{watch_id}")
+def download_watch_attachment(
+    watch_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Pièce jointe d'une veille: fichier du tenant, ou redirection si file_url est un lien externe."""
+    watch = db.query(RegulatoryWatch).filter(
+        RegulatoryWatch.id == watch_id,
+        RegulatoryWatch.tenant_id == current_user.tenant_id
+    ).first()
+    if not watch or not watch.file_url:
+        raise HTTPException(status_code=404, detail="Fichier introuvable")
+
+    if watch.file_url.startswith(("http://", "https://")):
+        return RedirectResponse(watch.file_url, status_code=307)
+
+    path = tenant_file_path(current_user.tenant_id, watch.file_url)
+    return TenantFileResponse(path, filename=os.path.basename(path))
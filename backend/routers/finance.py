@@ -1,10 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from database import get_db
-from models import User, Attendance, Invoice, InvoiceStatus, ContratDossier, ContratVersion, SessionDay
+from models import User, Attendance, Invoice, InvoiceStatus, ContratDossier, ContratVersion, SessionDay, Session as SessionModel
 from auth import get_current_user
 from schemas import AttendanceCreate, InvoiceGenerate
 from services.billing_service import BillingService
+from services.attendance_summary_service import AttendanceSummaryService
+from services.attendance_matrix import invalidate_attendance_matrix
+from services.rollup_service import RollupService
 from datetime import date
 
 router = APIRouter(
@@ -17,6 +20,20 @@ def declare_attendance(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
+    session_day = db.query(SessionDay).join(SessionModel, SessionDay.session_id == SessionModel.id).filter(
+        SessionDay.id == data.session_day_id,
+        SessionModel.tenant_id == current_user.tenant_id
+    ).first()
+    if not session_day:
+        raise HTTPException(status_code=404, detail="Session day not found")
+
+    version = db.query(ContratVersion.id).filter(
+        ContratVersion.id == data.contrat_version_id,
+        ContratVersion.tenant_id == current_user.tenant_id
+    ).first()
+    if not version:
+        raise HTTPException(status_code=404, detail="Contract version not found")
+
     # Idempotency: Update if exists, else Create
     attendance = db.query(Attendance).filter(
         Attendance.contrat_version_id == data.contrat_version_id,
@@ -24,6 +41,7 @@ def declare_attendance(
         Attendance.tenant_id == current_user.tenant_id
     ).first()
     
+    old_status = attendance.status if attendance else None
     if attendance:
         attendance.status = data.status
     else:
@@ -34,8 +52,14 @@ def declare_attendance(
             status=data.status
         )
         db.add(attendance)
-        
+
+    # Monthly counters are updated in the same transaction
+    AttendanceSummaryService().record_change(
+        db, current_user.tenant_id, data.contrat_version_id, session_day, old_status, data.status
+    )
+    RollupService().mark_dirty(db, current_user.tenant_id, session_day.date)
     db.commit()
+    invalidate_attendance_matrix(session_day.session_id)
     db.refresh(attendance)
     return attendance
 
@@ -83,6 +107,7 @@ def generate_invoice(
     )
     
     db.add(invoice)
+    RollupService().mark_dirty(db, current_user.tenant_id, invoice.date_emission)
     db.commit()
     db.refresh(invoice)
     return invoice
@@ -0,0 +1,50 @@
+from fastapi import APIRouter, Depends, HTTPException
+
+from models import User
+from auth import get_current_user
+from services.platform_service import PlatformService, COLUMNS
+
+router = APIRouter(
+    prefix="/operator",
+    tags=["Operator"]
+)
+
+def get_current_operator(current_user: User = Depends(get_current_user)) -> User:
+    if current_user.role != "operator":
+        raise HTTPException(status_code=403, detail="Operator role required")
+    return current_user
+
+@router.get("/tenants/report")
+def get_platform_report(
+    sort: str = "ca_realise",
+    order: str = "desc",
+    details: bool = True,
+    current_user: User = Depends(get_current_operator)
+):
+    """
+    Tableau des KPIs de tous les tenants (une ligne par CFA), trié par `sort`.
+    `details=false` ne renvoie que les KPIs du dashboard (une seule requête).
+    """
+    if sort not in COLUMNS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(COLUMNS)}")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be asc or desc")
+
+    rows = PlatformService().report(details=details)
+
+    # Missing values (failed or skipped metrics) always sort last
+    present = [r for r in rows if r.get(sort) is not None]
+    missing = [r for r in rows if r.get(sort) is None]
+    present.sort(key=lambda r: r[sort], reverse=(order == "desc"))
+
+    totals = {}
+    for column in ("ca_previsionnel", "ca_realise", "candidats", "candidats_places", "contrats_actifs", "ca_prevu_12_mois", "conflits"):
+        values = [r[column] for r in rows if r.get(column) is not None]
+        if values:
+            totals[column] = round(sum(values), 2)
+
+    return {
+        "colonnes": [c for c in COLUMNS if details or c not in ("ca_prevu_12_mois", "conflits")],
+        "lignes": present + missing,
+        "totaux": totals,
+    }
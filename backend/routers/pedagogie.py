@@ -1,12 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from datetime import date
 
-from database import get_db
-from models import User, Session as SessionModel, SessionDay, ContratDossier, ContratVersion
+from database import get_db, get_read_db
+from models import User, Session as SessionModel, SessionDay, ContratDossier, ContratVersion, ClosurePeriod
 from auth import get_current_user
-from schemas import SessionCreate, CalendarGenerate
+from schemas import SessionCreate, SessionResponse, CalendarGenerate, ClosurePeriodCreate, ClosurePeriodResponse
 from services.planning_service import PlanningService
+from services.attendance_matrix import get_attendance_matrix, invalidate_attendance_matrix
+from services.conflict_service import ConflictService
+from services.analytics_cache import analytics_cache
+from services.calendar_service import get_business_calendar, invalidate_business_calendar, french_public_holidays
 
 router = APIRouter(
     prefix="/sessions", # Note: We also handle contract calendar here or separate? Requirement said /contrats/.../calendar.
@@ -14,9 +19,9 @@ router = APIRouter(
 )
 
 # /sessions endpoints
-@router.get("/")
+@router.get("/", response_model=List[SessionResponse])
 def get_sessions(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
     sessions = db.query(SessionModel).filter(
@@ -42,6 +47,91 @@ def create_session(
     db.refresh(new_session)
     return new_session
 
+# --- Calendrier ouvré: jours fériés & fermetures du CFA ---
+
+@router.get("/closures", response_model=List[ClosurePeriodResponse])
+def get_closure_periods(
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    return db.query(ClosurePeriod).filter(
+        ClosurePeriod.tenant_id == current_user.tenant_id
+    ).order_by(ClosurePeriod.date_debut).all()
+
+@router.post("/closures", response_model=ClosurePeriodResponse)
+def create_closure_period(
+    closure: ClosurePeriodCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    if closure.date_fin < closure.date_debut:
+        raise HTTPException(status_code=400, detail="date_fin must be after date_debut")
+
+    new_closure = ClosurePeriod(
+        tenant_id=current_user.tenant_id,
+        label=closure.label,
+        date_debut=closure.date_debut,
+        date_fin=closure.date_fin
+    )
+    db.add(new_closure)
+    db.commit()
+    invalidate_business_calendar(current_user.tenant_id)
+    db.refresh(new_closure)
+    return new_closure
+
+@router.delete("/closures/{closure_id}")
+def delete_closure_period(
+    closure_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    closure = db.query(ClosurePeriod).filter(
+        ClosurePeriod.id == closure_id,
+        ClosurePeriod.tenant_id == current_user.tenant_id
+    ).first()
+    if not closure:
+        raise HTTPException(status_code=404, detail="Closure period not found")
+
+    db.delete(closure)
+    db.commit()
+    invalidate_business_calendar(current_user.tenant_id)
+    return {"message": "Période de fermeture supprimée"}
+
+@router.get("/business-days")
+def get_business_days(
+    start: date,
+    end: date,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Jours ouvrés entre deux dates (hors week-ends, jours fériés et fermetures)."""
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if (end - start).days > 366 * 10:
+        raise HTTPException(status_code=400, detail="Range too large (10 years max)")
+    calendar = get_business_calendar(db, current_user.tenant_id)
+    holidays = {}
+    for year in range(start.year, end.year + 1):
+        holidays.update({d: label for d, label in french_public_holidays(year).items() if start <= d <= end})
+
+    return {
+        "jours_ouvres": calendar.count_business_days(start, end),
+        "jours_feries": [{"date": d, "label": holidays[d]} for d in sorted(holidays)]
+    }
+
+@router.get("/conflicts")
+def get_scheduling_conflicts(
+    contrat_version_id: Optional[int] = None,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Conflits de planning du tenant (ou d'un seul contrat):
+    sessions qui se chevauchent pour un même apprenti et jours hors des dates du contrat.
+    """
+    service = ConflictService()
+    return service.detect(db, current_user.tenant_id, contrat_version_id)
+
 @router.post("/{session_id}/generate-calendar")
 def generate_session_calendar(
     session_id: int,
@@ -58,15 +148,47 @@ def generate_session_calendar(
         raise HTTPException(status_code=404, detail="Session not found")
         
     service = PlanningService()
-    count = service.generate_session_days(
+    result = service.generate_session_days(
         db, 
         session_id, 
         session.date_debut, 
         session.date_fin, 
-        calendar_data.days_of_week
+        calendar_data.days_of_week,
+        calendar=get_business_calendar(db, current_user.tenant_id)
     )
+    invalidate_attendance_matrix(session_id)
+    # Bulk INSERT/DELETE of SessionDay bypasses the ORM write hooks
+    analytics_cache.invalidate(current_user.tenant_id, ("forecast",))
     
-    return {"message": f"{count} jours de formation générés"}
+    message = f"{result['created']} jours de formation générés, {result['deleted']} supprimés"
+    if result["conflicts"]:
+        message += f", {len(result['conflicts'])} conservés car des présences y sont saisies"
+    return {"message": message, **result}
+
+@router.get("/{session_id}/attendance-matrix")
+def get_session_attendance_matrix(
+    session_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Heures réalisées, absences et jours facturables de toute la promo,
+    calculés sur la matrice de présence en bitsets (mise en cache).
+    """
+    session = db.query(SessionModel).filter(
+        SessionModel.id == session_id,
+        SessionModel.tenant_id == current_user.tenant_id
+    ).first()
+
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    matrix = get_attendance_matrix(db, session_id)
+    return {
+        "session_id": session_id,
+        "jours_planifies": len(matrix.dates),
+        "contrats": matrix.summary()
+    }
 
 # Contract Calendar Endpoint 
 # Putting it here or in Contrats router? 
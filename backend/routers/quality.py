@@ -1,13 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
-from typing import List
-from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select, literal
+from typing import List, Optional
+from datetime import date, datetime, timedelta
 
-from database import get_db
-from models import User, Ticket, TicketStatus, TicketCategory, Survey, SurveyType, AuditLog
-from schemas import TicketCreate, TicketResponse, SurveyCreate, AuditLogResponse
-from auth import get_current_user
+from database import get_db, get_async_read_db
+from models import User, Ticket, TicketStatus, TicketCategory, Survey, SurveyType, AuditLog, Session as TrainingSession, SurveyDispatchStatus
+from schemas import TicketCreate, TicketResponse, SurveyCreate, SurveyDispatchResponse, AuditLogResponse
+from auth import get_current_user, get_current_user_async
 from repository import BaseRepository
+from services.pagination import keyset_page_async, order_by_clauses
+from services.survey_stats_service import SurveyStatsService
+from services.survey_dispatch_service import SurveyDispatchService
 
 router = APIRouter(
     prefix="/quality",
@@ -36,19 +41,89 @@ def create_ticket(
     db.refresh(new_ticket)
     return new_ticket
 
+# Stable sort orders, each ending with the primary key (keyset pagination)
+TICKET_SORTS = {
+    "recent": [(Ticket.created_at, True), (Ticket.id, True)],
+    "oldest": [(Ticket.created_at, False), (Ticket.id, False)],
+    "status": [(Ticket.status, False), (Ticket.created_at, False), (Ticket.id, False)],
+}
+
 @router.get("/tickets", response_model=List[TicketResponse])
-def get_tickets(
+async def get_tickets(
+    response: Response,
     page: int = 1,
     size: int = 50,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    status: Optional[TicketStatus] = None,
+    category: Optional[TicketCategory] = None,
+    author_id: Optional[int] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    sort: str = "recent",
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
+    """
+    Tickets filtrés et triés. Pagination par curseur: passer `cursor` = en-tête
+    X-Next-Cursor de la réponse précédente (absent sur la dernière page).
+    `page` reste supporté sans curseur.
+    """
+    if sort not in TICKET_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(TICKET_SORTS)}")
+    if size < 1: size = 50
+    if size > 200: size = 200
+
     # Filter by Tenant
-    query = db.query(Ticket).filter(Ticket.tenant_id == current_user.tenant_id)
-    
-    # Pagination
-    skip = (page - 1) * size
-    return query.offset(skip).limit(size).all()
+    query = select(Ticket).where(Ticket.tenant_id == current_user.tenant_id)
+    if status:
+        query = query.where(Ticket.status == status)
+    if category:
+        query = query.where(Ticket.category == category)
+    if author_id:
+        query = query.where(Ticket.author_id == author_id)
+    if created_from:
+        query = query.where(Ticket.created_at >= created_from)
+    if created_to:
+        query = query.where(Ticket.created_at < created_to)
+
+    order = TICKET_SORTS[sort]
+    if cursor is None and page > 1:
+        # Legacy offset pagination
+        skip = (page - 1) * size
+        result = await db.execute(query.order_by(*order_by_clauses(order)).offset(skip).limit(size))
+        return result.scalars().all()
+
+    tickets, next_cursor = await keyset_page_async(db, query, order, size, cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return tickets
+
+@router.get("/tickets/summary")
+async def get_tickets_summary(
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """Compteurs du tableau de tri: par statut et catégorie, avec le plus ancien ticket (une requête)."""
+    rows = (await db.execute(select(
+        Ticket.status,
+        Ticket.category,
+        func.count(Ticket.id),
+        func.min(Ticket.created_at)
+    ).where(Ticket.tenant_id == current_user.tenant_id)\
+     .group_by(Ticket.status, Ticket.category))).all()
+
+    par_statut = {
+        s.value: {"total": 0, "par_categorie": {c.value: 0 for c in TicketCategory}, "plus_ancien": None}
+        for s in TicketStatus
+    }
+    for ticket_status, ticket_category, count, oldest in rows:
+        entry = par_statut[ticket_status.value]
+        entry["total"] += count
+        entry["par_categorie"][ticket_category.value] = count
+        if oldest and (entry["plus_ancien"] is None or oldest < entry["plus_ancien"]):
+            entry["plus_ancien"] = oldest
+
+    return {"total": sum(e["total"] for e in par_statut.values()), "par_statut": par_statut}
 
 # --- Surveys ---
 
@@ -60,27 +135,72 @@ def create_survey_response(
 ):
     # Verify target if provided? For now, trust input or default to current user
     target_id = survey.target_user_id if survey.target_user_id else current_user.id
+
+    if survey.session_id is not None:
+        session = db.query(TrainingSession.id).filter(
+            TrainingSession.id == survey.session_id,
+            TrainingSession.tenant_id == current_user.tenant_id
+        ).first()
+        if not session:
+            raise HTTPException(status_code=404, detail="Session not found")
     
     new_survey = Survey(
         tenant_id=current_user.tenant_id,
         target_user_id=target_id,
         type=survey.type,
         score=survey.score,
-        comment=survey.comment
+        comment=survey.comment,
+        session_id=survey.session_id,
+        created_at=datetime.utcnow()
     )
     db.add(new_survey)
+    SurveyStatsService().record(db, new_survey)
     db.commit()
     db.refresh(new_survey)
     return {"message": "Survey recorded successfully", "id": new_survey.id}
 
+@router.get("/surveys/stats")
+async def get_survey_stats(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    session_id: Optional[int] = None,
+    by_session: bool = False,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    Satisfaction par type d'enquête (J30, MID_TERM, END), éventuellement par session:
+    moyenne, distribution des notes 1-10, NPS (9-10 promoteurs, 1-6 détracteurs) et
+    taux de réponse (réponses / contrats actifs sur la période). Par défaut: 12 derniers mois.
+    """
+    end = end or date.today()
+    start = start or end - timedelta(days=365)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    return await db.run_sync(
+        SurveyStatsService().stats, current_user.tenant_id, start, end, session_id, by_session
+    )
+
+@router.get("/surveys/dispatches", response_model=List[SurveyDispatchResponse])
+async def get_survey_dispatches(
+    status: Optional[SurveyDispatchStatus] = SurveyDispatchStatus.PENDING,
+    limit: int = 200,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """Enquêtes échues (J30, mi-parcours, fin de contrat) mises en file par le scheduler."""
+    return await db.run_sync(
+        SurveyDispatchService().list, current_user.tenant_id, status, min(max(limit, 1), 1000)
+    )
+
 # --- Audit Logs (Admin Only) ---
 
 @router.get("/audit-logs", response_model=List[AuditLogResponse])
-def get_audit_logs(
+async def get_audit_logs(
     page: int = 1,
     size: int = 50,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     # Check if admin logic could be added here. For now, we return all logs for the tenant.
     # In a real app, maybe only 'admin' role can see this.
@@ -90,15 +210,16 @@ def get_audit_logs(
          pass 
 
     skip = (page - 1) * size
-    logs = db.query(AuditLog).filter(AuditLog.tenant_id == current_user.tenant_id)\
+    result = await db.execute(select(AuditLog).where(AuditLog.tenant_id == current_user.tenant_id)\
         .order_by(AuditLog.timestamp.desc())\
-        .offset(skip).limit(size).all()
-    return logs
+        .offset(skip).limit(size))
+    return result.scalars().all()
 
 # --- Regulatory Watch (Veille) ---
 
-from models import RegulatoryWatch, RegulatoryRead
-from schemas import RegulatoryWatchCreate, RegulatoryWatchResponse
+from models import RegulatoryWatch, RegulatoryRead, WatchCategory
+from schemas import RegulatoryWatchCreate, RegulatoryWatchResponse, RegulatoryWatchListItem, RegulatoryWatchMarkRead
+from services.aggregates import dialect_insert
 
 @router.post("/regulatory-watch", response_model=RegulatoryWatchResponse)
 def create_regulatory_watch(
@@ -122,15 +243,72 @@ def create_regulatory_watch(
     db.refresh(new_watch)
     return new_watch
 
-@router.get("/regulatory-watch", response_model=List[RegulatoryWatchResponse])
-def get_regulatory_watch(
+WATCH_ORDER = [(RegulatoryWatch.created_at, True), (RegulatoryWatch.id, True)]
+
+@router.get("/regulatory-watch", response_model=List[RegulatoryWatchListItem])
+async def get_regulatory_watch(
+    response: Response,
+    size: int = 50,
+    cursor: Optional[str] = None,
+    unread_only: bool = False,
+    category: Optional[WatchCategory] = None,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    Veille du tenant, plus récente d'abord, avec l'état lu/non lu de l'utilisateur.
+    En-têtes: X-Unread-Count (total non lus), X-Next-Cursor (page suivante).
+    """
+    if size < 1: size = 50
+    if size > 200: size = 200
+
+    is_read = select(RegulatoryRead.watch_id).where(
+        RegulatoryRead.watch_id == RegulatoryWatch.id,
+        RegulatoryRead.user_id == current_user.id
+    ).exists()
+    # Anti-join, evaluated once and returned with every row of the page
+    unread_count = select(func.count(RegulatoryWatch.id)).where(
+        RegulatoryWatch.tenant_id == current_user.tenant_id,
+        ~is_read
+    ).scalar_subquery()
+
+    query = select(RegulatoryWatch, is_read.label("read"), unread_count.label("unread_count"))\
+        .where(RegulatoryWatch.tenant_id == current_user.tenant_id)
+    if unread_only:
+        query = query.where(~is_read)
+    if category:
+        query = query.where(RegulatoryWatch.category == category)
+
+    rows, next_cursor = await keyset_page_async(db, query, WATCH_ORDER, size, cursor)
+    unread = rows[0].unread_count if rows else (await db.execute(select(unread_count))).scalar()
+
+    response.headers["X-Unread-Count"] = str(unread)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [
+        RegulatoryWatchListItem.model_validate(watch).model_copy(update={"read": bool(read)})
+        for watch, read, _ in rows
+    ]
+
+@router.post("/regulatory-watch/mark-all-read")
+def mark_all_watch_as_read(
+    payload: Optional[RegulatoryWatchMarkRead] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    # Return all watch items for the tenant
-    items = db.query(RegulatoryWatch).filter(RegulatoryWatch.tenant_id == current_user.tenant_id)\
-        .order_by(RegulatoryWatch.created_at.desc()).all()
-    return items
+    """Marque comme lus tous les éléments de veille du tenant, ou seulement `ids` (une seule requête)."""
+    source = select(RegulatoryWatch.id, literal(current_user.id), literal(datetime.utcnow()))\
+        .where(RegulatoryWatch.tenant_id == current_user.tenant_id)
+    if payload and payload.ids is not None:
+        source = source.where(RegulatoryWatch.id.in_(payload.ids))
+
+    result = db.execute(
+        dialect_insert(db, RegulatoryRead)
+        .from_select(["watch_id", "user_id", "read_at"], source)
+        .on_conflict_do_nothing(index_elements=["watch_id", "user_id"])
+    )
+    db.commit()
+    return {"message": "Marked as read", "marked": result.rowcount}
 
 @router.post("/regulatory-watch/{watch_id}/mark-as-read")
 def mark_watch_as_read(
@@ -138,25 +316,22 @@ def mark_watch_as_read(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    # Verify watch exists and belongs to tenant
-    watch = db.query(RegulatoryWatch).filter(RegulatoryWatch.id == watch_id, RegulatoryWatch.tenant_id == current_user.tenant_id).first()
-    if not watch:
-        raise HTTPException(status_code=404, detail="Watch item not found")
-
-    # Check if already read
-    existing_read = db.query(RegulatoryRead).filter(
-        RegulatoryRead.watch_id == watch_id,
-        RegulatoryRead.user_id == current_user.id
-    ).first()
-
-    if existing_read:
-        return {"message": "Already marked as read"}
-
-    new_read = RegulatoryRead(
-        watch_id=watch_id,
-        user_id=current_user.id,
-        read_at=datetime.utcnow()
+    # Single INSERT ... SELECT: only inserts if the item belongs to the tenant and is not read yet
+    source = select(RegulatoryWatch.id, literal(current_user.id), literal(datetime.utcnow()))\
+        .where(RegulatoryWatch.id == watch_id, RegulatoryWatch.tenant_id == current_user.tenant_id)
+    result = db.execute(
+        dialect_insert(db, RegulatoryRead)
+        .from_select(["watch_id", "user_id", "read_at"], source)
+        .on_conflict_do_nothing(index_elements=["watch_id", "user_id"])
     )
-    db.add(new_read)
     db.commit()
-    return {"message": "Marked as read"}
+    if result.rowcount:
+        return {"message": "Marked as read"}
+
+    # Nothing inserted: already read, or not an item of this tenant
+    exists = db.query(RegulatoryWatch.id).filter(
+        RegulatoryWatch.id == watch_id, RegulatoryWatch.tenant_id == current_user.tenant_id
+    ).first()
+    if not exists:
+        raise HTTPException(status_code=404, detail="Watch item not found")
+    return {"message": "Already marked as read"}
@@ -1,6 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
-from datetime import date
+from datetime import date, datetime
 from decimal import Decimal
 from models import AttendanceStatus
 
@@ -25,9 +25,106 @@ class CandidatCreate(BaseModel):
     civilite: Optional[Civilite] = Civilite.M
     statut: Optional[CandidatStatus] = CandidatStatus.NOUVEAU
 
+# --- Response models (explicit fields: no lazy relationship or raw CV text in list pages) ---
+
+class CandidatResponse(BaseModel):
+    id: int
+    tenant_id: int
+    first_name: str
+    last_name: str
+    civilite: Optional[Civilite] = None
+    email: Optional[str] = None
+    telephone: Optional[str] = None
+    statut: Optional[CandidatStatus] = None
+    cv_filename: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class EntrepriseResponse(EntrepriseCreate):
+    id: int
+    tenant_id: int
+
+    class Config:
+        from_attributes = True
+
+class SessionResponse(BaseModel):
+    id: int
+    tenant_id: int
+    nom: str
+    date_debut: Optional[date] = None
+    date_fin: Optional[date] = None
+    formation_rncp_id: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+class SessionDayResponse(BaseModel):
+    id: int
+    session_id: int
+    date: date
+    is_morning: Optional[bool] = None
+    is_afternoon: Optional[bool] = None
+
+    class Config:
+        from_attributes = True
+
+class ContratVersionResponse(BaseModel):
+    id: int
+    tenant_id: int
+    contrat_dossier_id: int
+    session_id: Optional[int] = None
+    version_number: int
+    # Numbers in the JSON (a Decimal would be dumped as a string)
+    salaire: Optional[float] = None
+    cout_npec: Optional[float] = None
+    heures_formation: Optional[int] = None
+    intitule_poste: Optional[str] = None
+    date_debut: Optional[date] = None
+    date_fin: Optional[date] = None
+    is_active: Optional[bool] = None
+
+    class Config:
+        from_attributes = True
+
+class ContratListItem(BaseModel):
+    id: int
+    candidat: CandidatResponse
+    entreprise: Optional[EntrepriseResponse] = None
+    active_version: Optional[ContratVersionResponse] = None
+
+class ContratDossierResponse(BaseModel):
+    id: int
+    tenant_id: int
+    candidat_id: int
+    entreprise_id: Optional[int] = None
+    candidat: CandidatResponse
+    entreprise: Optional[EntrepriseResponse] = None
+    versions: List[ContratVersionResponse] = []
+
+    class Config:
+        from_attributes = True
+
+class ContratDetailResponse(BaseModel):
+    dossier: ContratDossierResponse
+    active_version: Optional[ContratVersionResponse] = None
+
 class CalendarGenerate(BaseModel):
     days_of_week: List[int] 
 
+class ClosurePeriodCreate(BaseModel):
+    label: str
+    date_debut: date
+    date_fin: date
+
+class ClosurePeriodResponse(ClosurePeriodCreate):
+    id: int
+    tenant_id: int
+
+    class Config:
+        from_attributes = True
+
 class ContratCreate(BaseModel):
     candidat_id: int
     entreprise_id: int
@@ -61,7 +158,7 @@ class InvoiceGenerate(BaseModel):
 
 # --- Quality Schemas ---
 
-from models import TicketStatus, TicketCategory, SurveyType
+from models import TicketStatus, TicketCategory, SurveyType, SurveyDispatchStatus
 from datetime import datetime
 
 class TicketCreate(BaseModel):
@@ -81,9 +178,22 @@ class TicketResponse(TicketCreate):
 
 class SurveyCreate(BaseModel):
     type: SurveyType
-    score: int
+    score: int = Field(..., ge=1, le=10)
     comment: Optional[str] = None
     target_user_id: Optional[int] = None
+    session_id: Optional[int] = None
+
+class SurveyDispatchResponse(BaseModel):
+    id: int
+    contrat_version_id: int
+    type: SurveyType
+    due_date: date
+    status: SurveyDispatchStatus
+    created_at: datetime
+    sent_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
 
 class AuditLogResponse(BaseModel):
     id: int
@@ -114,3 +224,9 @@ class RegulatoryWatchResponse(RegulatoryWatchCreate):
     class Config:
         from_attributes = True
 
+class RegulatoryWatchListItem(RegulatoryWatchResponse):
+    read: bool = False
+
+class RegulatoryWatchMarkRead(BaseModel):
+    ids: Optional[List[int]] = None # None = every item of the tenant
+
@@ -0,0 +1,60 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, cast, literal, Date, Integer, String
+from sqlalchemy.dialects import postgresql, sqlite
+from datetime import date
+from typing import Dict, Any, Optional
+
+def dialect_insert(db: Session, model):
+    """INSERT supporting ON CONFLICT for the current backend (PostgreSQL in prod, SQLite in tests)."""
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+GRANULARITIES = ("day", "week", "month", "quarter", "year")
+
+def date_bucket(db: Session, column, granularity: str):
+    """
+    SQL expression truncating a date/datetime column to the first day of its
+    bucket (ISO weeks start on Monday): date_trunc on PostgreSQL, date() modifiers on SQLite.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        return cast(func.date_trunc(granularity, column), Date)
+    if granularity == "day":
+        return func.date(column)
+    if granularity == "week":
+        return func.date(column, "-6 days", "weekday 1")
+    if granularity == "month":
+        return func.date(column, "start of month")
+    if granularity == "quarter":
+        months_back = (cast(func.strftime("%m", column), Integer) - 1) % 3
+        return func.date(column, "start of month", "-" + cast(months_back, String) + " months")
+    return func.date(column, "start of year")
+
+def month_start(db: Session, column):
+    """SQL expression truncating a date column to the first day of its month."""
+    return date_bucket(db, column, "month")
+
+def days_since(db: Session, column, origin: date):
+    """SQL expression: number of days from `origin` to a date column (date - date on PostgreSQL, julianday on SQLite)."""
+    if db.get_bind().dialect.name == "postgresql":
+        return column - literal(origin, Date)
+    return cast(func.julianday(column) - func.julianday(literal(origin, Date)), Integer)
+
+def increment_counters(
+    db: Session,
+    model,
+    key: Dict[str, Any],
+    deltas: Dict[str, Any],
+    values: Optional[Dict[str, Any]] = None
+):
+    """
+    Atomic upsert of a counter row: inserts `key + values + deltas` or, if the
+    row identified by `key` (a unique constraint) exists, adds `deltas` to it.
+    Single statement, safe under concurrent writers.
+    """
+    stmt = dialect_insert(db, model).values(**key, **(values or {}), **deltas)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(key.keys()),
+        set_={col: getattr(model, col) + getattr(stmt.excluded, col) for col in deltas}
+    )
+    db.execute(stmt)
@@ -0,0 +1,273 @@
+"""
+Cache des résultats analytics, par (tenant_id, endpoint, params).
+
+- Backend in-process (LRU) par défaut, Redis-compatible si ANALYTICS_CACHE_URL est défini
+  (dépendance optionnelle `redis`).
+- Invalidation précise: chaque (tenant, endpoint) a un numéro de génération inclus dans
+  la clé; les hooks SQLAlchemy after_flush / after_commit l'incrémentent quand un modèle
+  dont dépend l'endpoint est écrit. Les anciennes entrées expirent ou sortent du LRU.
+- Protection contre le "stampede": un seul calcul par clé à la fois, les autres attendent.
+- TTL de repli pour les écritures invisibles aux hooks (autres workers, requêtes bulk).
+- Valeurs calculées sur un réplica (get_read_db): TTL court (cache_ttl). Le réplica peut
+  être en retard sur l'écriture qui a changé la génération, et la valeur périmée serait
+  sinon servie à tout le tenant sous la nouvelle génération pendant ANALYTICS_CACHE_TTL.
+"""
+from sqlalchemy import event
+from sqlalchemy.orm import Session as OrmSession
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+import asyncio
+import json
+import os
+import threading
+import time
+
+try:
+    import redis
+except ImportError: # Optional dependency
+    redis = None
+
+from database import replica_of
+from models import (Candidat, CandidatStatusTransition, ContratDossier, ContratVersion, Invoice, Attendance, Entreprise,
+                    Session as TrainingSession, ClosurePeriod)
+
+ANALYTICS_CACHE_URL = os.getenv("ANALYTICS_CACHE_URL")
+ANALYTICS_CACHE_TTL = int(os.getenv("ANALYTICS_CACHE_TTL", "300"))
+ANALYTICS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYTICS_CACHE_MAX_ENTRIES", "1024"))
+ANALYTICS_REPLICA_CACHE_TTL = int(os.getenv("ANALYTICS_REPLICA_CACHE_TTL", "15"))
+
+# Which endpoints depend on which models
+INVALIDATION_MAP = {
+    Candidat: ("dashboard", "bpf-preview", "bpf", "timeseries", "funnel"),
+    CandidatStatusTransition: ("funnel",),
+    ContratDossier: ("dashboard", "bpf-preview", "bpf", "forecast"),
+    ContratVersion: ("dashboard", "bpf-preview", "bpf", "forecast", "timeseries"),
+    Invoice: ("dashboard", "bpf", "timeseries"),
+    Attendance: ("bpf-preview", "bpf", "forecast", "timeseries"),
+    TrainingSession: ("bpf-preview", "bpf", "forecast"),
+    Entreprise: ("bpf",),
+    ClosurePeriod: ("forecast", "calendar"), # "calendar": BusinessCalendar cache (calendar_service)
+}
+
+class LocalBackend:
+    """Thread-safe LRU with per-entry expiry."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._generations: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        # Striped locks: bounded memory, keys sharing a stripe just serialise
+        self._key_locks = [threading.Lock() for _ in range(64)]
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: int):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def generation(self, name: str) -> int:
+        with self._lock:
+            return self._generations[name]
+
+    def bump(self, name: str):
+        with self._lock:
+            self._generations[name] += 1
+
+    @contextmanager
+    def lock(self, key: str, timeout: int):
+        key_lock = self._key_locks[hash(key) % len(self._key_locks)]
+        acquired = key_lock.acquire(timeout=timeout)
+        try:
+            yield
+        finally:
+            if acquired:
+                key_lock.release()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class RedisBackend:
+    """Redis-compatible backend shared by every API worker (values stored as JSON)."""
+
+    def __init__(self, url: str):
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key: str):
+        raw = self.client.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value: Any, ttl: int):
+        self.client.set(key, json.dumps(value, default=str), ex=ttl)
+
+    def generation(self, name: str) -> int:
+        return int(self.client.get(f"gen:{name}") or 0)
+
+    def bump(self, name: str):
+        self.client.incr(f"gen:{name}")
+
+    @contextmanager
+    def lock(self, key: str, timeout: int):
+        lock = self.client.lock(f"lock:{key}", timeout=timeout, blocking_timeout=timeout)
+        acquired = lock.acquire()
+        try:
+            yield
+        finally:
+            if acquired:
+                lock.release()
+
+    def clear(self):
+        for key in self.client.scan_iter("analytics:*"):
+            self.client.delete(key)
+
+class AnalyticsCache:
+    def __init__(self, backend, ttl: int = ANALYTICS_CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self._stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {"hits": 0, "misses": 0, "invalidations": 0})
+        self._stats_lock = threading.Lock()
+        # key -> [asyncio.Lock, callers]: stampede locks of the async path (event loop only)
+        self._async_locks: Dict[str, list] = {}
+
+    def _count(self, endpoint: str, field: str):
+        with self._stats_lock:
+            self._stats[endpoint][field] += 1
+
+    def _key(self, tenant_id: int, endpoint: str, params: Dict[str, Any]) -> str:
+        generation = self.backend.generation(f"{tenant_id}:{endpoint}")
+        return f"analytics:{tenant_id}:{endpoint}:{generation}:{json.dumps(params, sort_keys=True, default=str)}"
+
+    def get_or_compute(
+        self,
+        tenant_id: int,
+        endpoint: str,
+        params: Dict[str, Any],
+        compute: Callable[[], Any],
+        ttl: Optional[int] = None
+    ) -> Any:
+        key = self._key(tenant_id, endpoint, params)
+        value = self.backend.get(key)
+        if value is not None:
+            self._count(endpoint, "hits")
+            return value
+
+        # Stampede protection: only one caller computes a given key, the others
+        # wait for it and then read its result (or compute if it timed out)
+        with self.backend.lock(key, timeout=30):
+            value = self.backend.get(key)
+            if value is not None:
+                self._count(endpoint, "hits")
+                return value
+            self._count(endpoint, "misses")
+            value = compute()
+            self.backend.set(key, value, ttl or self.ttl)
+            return value
+
+    async def get_or_compute_async(
+        self,
+        tenant_id: int,
+        endpoint: str,
+        params: Dict[str, Any],
+        compute: Callable[[], Awaitable[Any]],
+        ttl: Optional[int] = None
+    ) -> Any:
+        """get_or_compute for `async def` routes: waiting for a concurrent computation
+        must not block the event loop, so the stampede lock is an asyncio.Lock (per worker)."""
+        key = self._key(tenant_id, endpoint, params)
+        value = self.backend.get(key)
+        if value is not None:
+            self._count(endpoint, "hits")
+            return value
+
+        entry = self._async_locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                value = self.backend.get(key)
+                if value is not None:
+                    self._count(endpoint, "hits")
+                    return value
+                self._count(endpoint, "misses")
+                value = await compute()
+                self.backend.set(key, value, ttl or self.ttl)
+                return value
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._async_locks[key]
+
+    def invalidate(self, tenant_id: int, endpoints: Iterable[str]):
+        for endpoint in endpoints:
+            self.backend.bump(f"{tenant_id}:{endpoint}")
+            self._count(endpoint, "invalidations")
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            endpoints = {name: dict(values) for name, values in self._stats.items()}
+        for values in endpoints.values():
+            lookups = values["hits"] + values["misses"]
+            values["hit_ratio"] = round(values["hits"] / lookups, 4) if lookups else None
+        hits = sum(v["hits"] for v in endpoints.values())
+        lookups = hits + sum(v["misses"] for v in endpoints.values())
+        return {
+            "backend": type(self.backend).__name__,
+            "ttl": self.ttl,
+            "hit_ratio": round(hits / lookups, 4) if lookups else None,
+            "endpoints": endpoints,
+        }
+
+def _build_cache() -> AnalyticsCache:
+    if ANALYTICS_CACHE_URL and redis is not None:
+        return AnalyticsCache(RedisBackend(ANALYTICS_CACHE_URL))
+    if ANALYTICS_CACHE_URL:
+        print("ANALYTICS_CACHE_URL is set but the 'redis' package is not installed, using the in-process cache")
+    return AnalyticsCache(LocalBackend(ANALYTICS_CACHE_MAX_ENTRIES))
+
+analytics_cache = _build_cache()
+
+def cache_ttl(db) -> Optional[int]:
+    """TTL of a value computed with this session: short on a replica, the cache default otherwise."""
+    return ANALYTICS_REPLICA_CACHE_TTL if replica_of(db.bind) is not None else None
+
+# --- Write hooks ---
+
+@event.listens_for(OrmSession, "after_flush")
+def _collect_dirty_tenants(session, flush_context):
+    dirty = session.info.setdefault("analytics_dirty", set())
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        endpoints = INVALIDATION_MAP.get(type(instance))
+        tenant_id = getattr(instance, "tenant_id", None)
+        if endpoints and tenant_id is not None:
+            dirty.update((tenant_id, endpoint) for endpoint in endpoints)
+
+@event.listens_for(OrmSession, "after_commit")
+def _invalidate_on_commit(session):
+    dirty = session.info.pop("analytics_dirty", None)
+    if dirty:
+        by_tenant = defaultdict(set)
+        for tenant_id, endpoint in dirty:
+            by_tenant[tenant_id].add(endpoint)
+        for tenant_id, endpoints in by_tenant.items():
+            analytics_cache.invalidate(tenant_id, endpoints)
+
+@event.listens_for(OrmSession, "after_rollback")
+def _discard_on_rollback(session):
+    session.info.pop("analytics_dirty", None)
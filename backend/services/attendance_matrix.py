@@ -0,0 +1,165 @@
+from sqlalchemy.orm import Session
+from bisect import bisect_left, bisect_right
+from datetime import date
+from typing import Dict, List, Optional
+import threading
+import time
+
+from models import Session as SessionModel, SessionDay, ContratVersion, Attendance, AttendanceStatus
+from services.attendance_summary_service import HALF_DAY_HOURS
+from services.calendar_service import get_business_calendar, calendar_generation
+
+MATRIX_TTL_SECONDS = 60 # Safety net for other API workers; local writes invalidate explicitly
+
+def _popcount(bits: int) -> int:
+    return bits.bit_count()
+
+def _slot_range(lo: int, hi: int) -> int:
+    """Mask of half-day slots for day indexes [lo, hi)."""
+    return ((1 << (2 * hi)) - 1) ^ ((1 << (2 * lo)) - 1)
+
+class AttendanceMatrix:
+    """
+    Compact attendance of a whole Session.
+
+    Every SessionDay (ordered by date) owns two bits: 2*i for the morning and
+    2*i+1 for the afternoon. Each enrolled contract version gets three Python
+    int bitsets (present / justified / unjustified) over those slots, so class
+    wide hours, billable days and absence streaks are a few popcounts.
+    """
+
+    def __init__(self, session_id: int, dates: List[date], scheduled: int, closed: int = 0):
+        self.session_id = session_id
+        self.dates = dates
+        self.scheduled = scheduled # Slots actually taught (is_morning / is_afternoon)
+        self.closed = closed # Slots of the days on a public holiday / closure period (not billed)
+        self.tenant_id: Optional[int] = None
+        self.calendar_generation: Optional[int] = None
+        self.day_mask = int("01" * len(dates), 2) if dates else 0 # Morning bit of every day
+        self.windows: Dict[int, int] = {} # contrat_version_id -> slots inside date_debut/date_fin
+        self.present: Dict[int, int] = {}
+        self.justified: Dict[int, int] = {}
+        self.unjustified: Dict[int, int] = {}
+        self.built_at = time.monotonic()
+
+    @classmethod
+    def build(cls, db: Session, session_id: int) -> "AttendanceMatrix":
+        days = db.query(SessionDay.id, SessionDay.date, SessionDay.is_morning, SessionDay.is_afternoon)\
+            .filter(SessionDay.session_id == session_id)\
+            .order_by(SessionDay.date).all()
+
+        index = {}
+        dates = []
+        scheduled = 0
+        for i, (day_id, day_date, morning, afternoon) in enumerate(days):
+            index[day_id] = i
+            dates.append(day_date)
+            if morning:
+                scheduled |= 1 << (2 * i)
+            if afternoon:
+                scheduled |= 1 << (2 * i + 1)
+
+        # Days generated before a closure was declared: BillingService does not bill them
+        tenant_id = db.query(SessionModel.tenant_id).filter(SessionModel.id == session_id).scalar()
+        closed = 0
+        generation = None
+        if tenant_id is not None and dates:
+            generation = calendar_generation(tenant_id)
+            closed_days = set(get_business_calendar(db, tenant_id).closed_days(dates[0], dates[-1]))
+            for i, day_date in enumerate(dates):
+                if day_date in closed_days:
+                    closed |= 0b11 << (2 * i)
+
+        matrix = cls(session_id, dates, scheduled, closed)
+        matrix.tenant_id = tenant_id
+        matrix.calendar_generation = generation
+
+        # Active versions only: after an avenant the old version would count the same days again
+        versions = db.query(ContratVersion.id, ContratVersion.date_debut, ContratVersion.date_fin)\
+            .filter(ContratVersion.session_id == session_id, ContratVersion.is_active == True).all()
+        for version_id, debut, fin in versions:
+            lo = bisect_left(dates, debut) if debut else 0
+            hi = bisect_right(dates, fin) if fin else len(dates)
+            matrix.windows[version_id] = _slot_range(lo, hi) if lo < hi else 0
+
+        # A status covers the whole day: both half-day slots that are scheduled
+        targets = {
+            AttendanceStatus.PRESENT: matrix.present,
+            AttendanceStatus.ABSENT_JUSTIFIE: matrix.justified,
+            AttendanceStatus.ABSENT_INJUSTIFIE: matrix.unjustified,
+        }
+        rows = db.query(Attendance.contrat_version_id, Attendance.session_day_id, Attendance.status)\
+            .join(SessionDay, Attendance.session_day_id == SessionDay.id)\
+            .filter(SessionDay.session_id == session_id).all()
+        for version_id, day_id, status in rows:
+            slots = (0b11 << (2 * index[day_id])) & scheduled
+            bitset = targets[status]
+            bitset[version_id] = bitset.get(version_id, 0) | slots
+            matrix.windows.setdefault(version_id, 0)
+
+        return matrix
+
+    # --- Per contract computations ---
+
+    def _days(self, slots: int) -> int:
+        # A day counts once if any of its two slots is set
+        return _popcount((slots | (slots >> 1)) & self.day_mask)
+
+    def realized_hours(self, version_id: int) -> float:
+        return float(_popcount(self.present.get(version_id, 0)) * HALF_DAY_HOURS)
+
+    def billable_days(self, version_id: int) -> int:
+        """
+        Same rule as BillingService: scheduled days in the contract window that are not
+        public holidays / closures, minus the unjustified absences of those days.
+        """
+        window = self.windows.get(version_id, 0) & self.scheduled & ~self.closed
+        return self._days(window) - self._days(self.unjustified.get(version_id, 0) & window)
+
+    def longest_absence_streak(self, version_id: int) -> int:
+        """Longest run of consecutive session days with an absence (justified or not)."""
+        absent = self.justified.get(version_id, 0) | self.unjustified.get(version_id, 0)
+        # One bit per day (even positions): consecutive session days are 2 bits apart
+        days = (absent | (absent >> 1)) & self.day_mask
+        streak = 0
+        while days:
+            days &= days >> 2
+            streak += 1
+        return streak
+
+    def summary(self) -> List[dict]:
+        return [
+            {
+                "contrat_version_id": version_id,
+                "heures_realisees": self.realized_hours(version_id),
+                "demi_journees_presentes": _popcount(self.present.get(version_id, 0)),
+                "demi_journees_absences_justifiees": _popcount(self.justified.get(version_id, 0)),
+                "demi_journees_absences_injustifiees": _popcount(self.unjustified.get(version_id, 0)),
+                "jours_facturables": self.billable_days(version_id),
+                "plus_longue_absence_jours": self.longest_absence_streak(version_id),
+            }
+            for version_id in sorted(self.windows)
+        ]
+
+# --- Process-level cache ---
+
+_cache: Dict[int, AttendanceMatrix] = {}
+_cache_lock = threading.Lock()
+
+def get_attendance_matrix(db: Session, session_id: int) -> AttendanceMatrix:
+    with _cache_lock:
+        matrix = _cache.get(session_id)
+    # A closure write changes the billable days: it bumps the tenant's calendar generation
+    if (matrix and time.monotonic() - matrix.built_at < MATRIX_TTL_SECONDS
+            and (matrix.tenant_id is None or matrix.calendar_generation == calendar_generation(matrix.tenant_id))):
+        return matrix
+    matrix = AttendanceMatrix.build(db, session_id)
+    with _cache_lock:
+        _cache[session_id] = matrix
+    return matrix
+
+def invalidate_attendance_matrix(session_id: Optional[int]):
+    if session_id is None:
+        return
+    with _cache_lock:
+        _cache.pop(session_id, None)
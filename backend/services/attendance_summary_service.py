@@ -0,0 +1,150 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, case, select, insert, exists
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Optional
+from models import Attendance, AttendanceStatus, AttendanceMonthlySummary, SessionDay
+from services.aggregates import increment_counters, month_start
+
+HALF_DAY_HOURS = Decimal("3.5")
+BACKFILL_LOCK_KEY = 270027 # pg advisory lock shared by the workers starting together
+
+STATUS_COLUMNS = {
+    AttendanceStatus.PRESENT: "present_count",
+    AttendanceStatus.ABSENT_JUSTIFIE: "justified_count",
+    AttendanceStatus.ABSENT_INJUSTIFIE: "unjustified_count",
+}
+
+def day_hours(day: SessionDay) -> Decimal:
+    # Same rule as the BPF: 7h for a full day, 3.5h for a half day
+    return HALF_DAY_HOURS * 2 if (day.is_morning and day.is_afternoon) else HALF_DAY_HOURS
+
+def _first_of_month(d: date) -> date:
+    return d.replace(day=1)
+
+def _next_month(d: date) -> date:
+    return (d.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+class AttendanceSummaryService:
+    """
+    Maintains AttendanceMonthlySummary so billing and analytics read O(months)
+    rows instead of scanning Attendance joined to SessionDay.
+    """
+
+    def record_change(
+        self,
+        db: Session,
+        tenant_id: int,
+        contrat_version_id: int,
+        day: SessionDay,
+        old_status: Optional[AttendanceStatus],
+        new_status: Optional[AttendanceStatus]
+    ):
+        """
+        Applies the delta of one attendance write. Must be called in the same
+        transaction as the Attendance insert/update (no commit here).
+        """
+        if old_status == new_status:
+            return
+
+        hours = day_hours(day)
+        deltas = {col: 0 for col in STATUS_COLUMNS.values()}
+        deltas["realized_hours"] = Decimal("0")
+
+        if old_status is not None:
+            deltas[STATUS_COLUMNS[old_status]] -= 1
+            if old_status == AttendanceStatus.PRESENT:
+                deltas["realized_hours"] -= hours
+        if new_status is not None:
+            deltas[STATUS_COLUMNS[new_status]] += 1
+            if new_status == AttendanceStatus.PRESENT:
+                deltas["realized_hours"] += hours
+
+        increment_counters(
+            db,
+            AttendanceMonthlySummary,
+            key={"contrat_version_id": contrat_version_id, "month": _first_of_month(day.date)},
+            deltas=deltas,
+            values={"tenant_id": tenant_id}
+        )
+
+    def rebuild(self, db: Session, tenant_id: Optional[int] = None) -> int:
+        """Backfill: recomputes every summary row (optionally for one tenant) with one INSERT ... SELECT."""
+        count = self._rebuild(db, tenant_id)
+        db.commit()
+        return count
+
+    def backfill_missing(self, db: Session) -> int:
+        """
+        Startup hook: rebuilds the tenants having attendances but no summary row
+        (database upgraded from before the summary table, which would otherwise
+        read as zero realized hours in the BPF). No-op once the counters exist.
+        """
+        if db.get_bind().dialect.name == "postgresql":
+            # Workers start together: the first one rebuilds, the others then find the rows
+            db.execute(select(func.pg_advisory_xact_lock(BACKFILL_LOCK_KEY)))
+        missing = [t for (t,) in db.query(Attendance.tenant_id).distinct().filter(
+            ~exists().where(AttendanceMonthlySummary.tenant_id == Attendance.tenant_id)
+        )]
+        count = sum(self._rebuild(db, tenant_id) for tenant_id in missing)
+        db.commit()
+        return count
+
+    def _rebuild(self, db: Session, tenant_id: Optional[int]) -> int:
+        delete_query = db.query(AttendanceMonthlySummary)
+        if tenant_id is not None:
+            delete_query = delete_query.filter(AttendanceMonthlySummary.tenant_id == tenant_id)
+        delete_query.delete(synchronize_session=False)
+
+        month = month_start(db, SessionDay.date)
+        hours = case((SessionDay.is_morning & SessionDay.is_afternoon, 7.0), else_=3.5)
+        source = select(
+            Attendance.tenant_id,
+            Attendance.contrat_version_id,
+            month,
+            func.sum(case((Attendance.status == AttendanceStatus.PRESENT, 1), else_=0)),
+            func.sum(case((Attendance.status == AttendanceStatus.ABSENT_JUSTIFIE, 1), else_=0)),
+            func.sum(case((Attendance.status == AttendanceStatus.ABSENT_INJUSTIFIE, 1), else_=0)),
+            func.coalesce(func.sum(case((Attendance.status == AttendanceStatus.PRESENT, hours), else_=0)), 0),
+        ).join(SessionDay, Attendance.session_day_id == SessionDay.id)\
+         .group_by(Attendance.tenant_id, Attendance.contrat_version_id, month)
+        if tenant_id is not None:
+            source = source.where(Attendance.tenant_id == tenant_id)
+
+        result = db.execute(insert(AttendanceMonthlySummary).from_select(
+            ["tenant_id", "contrat_version_id", "month", "present_count",
+             "justified_count", "unjustified_count", "realized_hours"],
+            source
+        ))
+        return result.rowcount
+
+    def count_unjustified(self, db: Session, contrat_version_id: int, start_date: date, end_date: date) -> int:
+        """
+        Unjustified absences in [start_date, end_date]: whole months are read from
+        the summary, only the partial months at both ends hit the Attendance rows.
+        """
+        first_full = start_date if start_date.day == 1 else _next_month(start_date)
+        after_last_full = _first_of_month(end_date + timedelta(days=1))
+
+        if first_full >= after_last_full:
+            return self._count_rows(db, contrat_version_id, start_date, end_date)
+
+        total = db.query(func.coalesce(func.sum(AttendanceMonthlySummary.unjustified_count), 0)).filter(
+            AttendanceMonthlySummary.contrat_version_id == contrat_version_id,
+            AttendanceMonthlySummary.month >= first_full,
+            AttendanceMonthlySummary.month < after_last_full
+        ).scalar()
+
+        if start_date < first_full:
+            total += self._count_rows(db, contrat_version_id, start_date, first_full - timedelta(days=1))
+        if after_last_full <= end_date:
+            total += self._count_rows(db, contrat_version_id, after_last_full, end_date)
+        return total
+
+    def _count_rows(self, db: Session, contrat_version_id: int, start_date: date, end_date: date) -> int:
+        return db.query(Attendance).join(SessionDay).filter(
+            Attendance.contrat_version_id == contrat_version_id,
+            Attendance.status == AttendanceStatus.ABSENT_INJUSTIFIE,
+            SessionDay.date >= start_date,
+            SessionDay.date <= end_date
+        ).count()
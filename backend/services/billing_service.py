@@ -2,6 +2,8 @@ from sqlalchemy.orm import Session
 from datetime import date
 from decimal import Decimal
 from models import ContratVersion, SessionDay, Attendance, AttendanceStatus
+from services.attendance_summary_service import AttendanceSummaryService
+from services.calendar_service import get_business_calendar
 
 HOURS_PER_DAY = 7
 
@@ -27,15 +29,31 @@ class BillingService:
             SessionDay.date >= contract.date_debut,
             SessionDay.date <= contract.date_fin
         ).count()
+
+        # Days generated on public holidays / closure periods are not billable
+        calendar = get_business_calendar(db, contract.tenant_id)
+        closed_days = calendar.closed_days(
+            max(start_date, contract.date_debut), min(end_date, contract.date_fin)
+        )
+        if closed_days:
+            scheduled_days -= db.query(SessionDay).filter(
+                SessionDay.session_id == contract.session_id,
+                SessionDay.date.in_(closed_days)
+            ).count()
         
         # 2. Count Unjustified Absences
-        # Join with SessionDay to ensure we check dates in period
-        unjustified_count = db.query(Attendance).join(SessionDay).filter(
-            Attendance.contrat_version_id == contract.id,
-            Attendance.status == AttendanceStatus.ABSENT_INJUSTIFIE,
-            SessionDay.date >= start_date,
-            SessionDay.date <= end_date
-        ).count()
+        # Whole months come from the monthly summary, partial months from Attendance rows
+        unjustified_count = AttendanceSummaryService().count_unjustified(
+            db, contract.id, start_date, end_date
+        )
+        # Absences recorded on closed days: the day is already not billed
+        closed_in_period = calendar.closed_days(start_date, end_date)
+        if closed_in_period:
+            unjustified_count -= db.query(Attendance).join(SessionDay).filter(
+                Attendance.contrat_version_id == contract.id,
+                Attendance.status == AttendanceStatus.ABSENT_INJUSTIFIE,
+                SessionDay.date.in_(closed_in_period)
+            ).count()
         
         billable_days = scheduled_days - unjustified_count
         billable_hours = billable_days * HOURS_PER_DAY
@@ -0,0 +1,206 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, select, and_, or_
+from collections import defaultdict
+from datetime import date
+from typing import Any, Dict, Iterator, Tuple
+import csv
+import io
+
+from models import (AttendanceMonthlySummary, Candidat, ContratDossier, ContratVersion, Entreprise,
+                    Invoice, InvoiceStatus, Session as TrainingSession)
+
+SEXE_LABELS = {"M": "H", "MME": "F"}
+NOT_SET = "NON_RENSEIGNE"
+
+ANNEX_COLUMNS = (
+    "contrat_version_id", "version", "nom", "prenom", "sexe", "session", "rncp",
+    "entreprise", "siret", "idcc", "date_debut", "date_fin",
+    "heures_realisees", "absences_justifiees", "absences_injustifiees", "montant_facture"
+)
+
+def fiscal_year_bounds(year: int, start_month: int = 1) -> Tuple[date, date]:
+    """[start, end) of the fiscal year `year` (the year it starts in)."""
+    start = date(year, start_month, 1)
+    end = date(year + 1, start_month, 1)
+    return start, end
+
+class BpfService:
+    """
+    Bilan Pédagogique et Financier d'un exercice.
+
+    Trainee, hours and contract sections are derived from one row per contract
+    version of the exercise: hours and absences come from the monthly attendance
+    summary. The rows are streamed (yield_per) and folded in a single pass, and the
+    same rows feed the per-trainee CSV annex. Produits are selected separately from
+    the invoices emitted during the exercise, whatever the dates of their contract.
+    """
+
+    def _rows(self, tenant_id: int, start: date, end: date):
+        hours = select(
+            AttendanceMonthlySummary.contrat_version_id.label("contrat_version_id"),
+            func.sum(AttendanceMonthlySummary.realized_hours).label("heures"),
+            func.sum(AttendanceMonthlySummary.justified_count).label("justifiees"),
+            func.sum(AttendanceMonthlySummary.unjustified_count).label("injustifiees"),
+        ).where(
+            AttendanceMonthlySummary.tenant_id == tenant_id,
+            AttendanceMonthlySummary.month >= start,
+            AttendanceMonthlySummary.month < end
+        ).group_by(AttendanceMonthlySummary.contrat_version_id).subquery("hours")
+
+        invoiced = select(
+            Invoice.contrat_dossier_id.label("contrat_dossier_id"),
+            func.sum(Invoice.montant_ht).label("montant"),
+        ).where(
+            Invoice.tenant_id == tenant_id,
+            Invoice.statut.in_([InvoiceStatus.EMISE, InvoiceStatus.PAYEE]),
+            Invoice.date_emission >= start,
+            Invoice.date_emission < end
+        ).group_by(Invoice.contrat_dossier_id).subquery("invoiced")
+
+        # Versions overlapping the exercise, or carrying hours in it
+        in_exercise = or_(
+            and_(
+                or_(ContratVersion.date_debut.is_(None), ContratVersion.date_debut < end),
+                or_(ContratVersion.date_fin.is_(None), ContratVersion.date_fin >= start)
+            ),
+            hours.c.contrat_version_id.isnot(None)
+        )
+
+        return select(
+            ContratVersion.id,
+            ContratVersion.version_number,
+            ContratVersion.contrat_dossier_id,
+            ContratVersion.date_debut,
+            ContratVersion.date_fin,
+            ContratVersion.is_active,
+            Candidat.id.label("candidat_id"),
+            Candidat.last_name,
+            Candidat.first_name,
+            Candidat.civilite,
+            TrainingSession.nom.label("session_nom"),
+            TrainingSession.formation_rncp_id,
+            Entreprise.raison_sociale,
+            Entreprise.siret,
+            Entreprise.code_idcc,
+            func.coalesce(hours.c.heures, 0).label("heures"),
+            func.coalesce(hours.c.justifiees, 0).label("justifiees"),
+            func.coalesce(hours.c.injustifiees, 0).label("injustifiees"),
+            func.coalesce(invoiced.c.montant, 0).label("montant"),
+        ).select_from(ContratVersion)\
+         .join(ContratDossier, ContratDossier.id == ContratVersion.contrat_dossier_id)\
+         .join(Candidat, Candidat.id == ContratDossier.candidat_id)\
+         .outerjoin(Entreprise, Entreprise.id == ContratDossier.entreprise_id)\
+         .outerjoin(TrainingSession, TrainingSession.id == ContratVersion.session_id)\
+         .outerjoin(hours, hours.c.contrat_version_id == ContratVersion.id)\
+         .outerjoin(invoiced, invoiced.c.contrat_dossier_id == ContratVersion.contrat_dossier_id)\
+         .where(ContratVersion.tenant_id == tenant_id, in_exercise)\
+         .order_by(Candidat.last_name, Candidat.first_name, ContratVersion.id)
+
+    def report(self, db: Session, tenant_id: int, year: int, start_month: int = 1) -> Dict[str, Any]:
+        start, end = fiscal_year_bounds(year, start_month)
+
+        candidats = {}
+        dossiers_by_rncp = defaultdict(set)
+        heures_par_rncp = defaultdict(float)
+        heures_par_sexe = defaultdict(float)
+        dossiers = set()
+        debuts = fins = 0
+        total_heures = justifiees = injustifiees = 0
+
+        rows = db.execute(self._rows(tenant_id, start, end).execution_options(yield_per=1000))
+        for row in rows:
+            sexe = SEXE_LABELS.get(row.civilite.value if row.civilite else None, "AUTRE")
+            rncp = row.formation_rncp_id or NOT_SET
+            heures = float(row.heures)
+
+            candidats[row.candidat_id] = sexe
+            dossiers_by_rncp[rncp].add(row.contrat_dossier_id)
+            heures_par_rncp[rncp] += heures
+            heures_par_sexe[sexe] += heures
+            total_heures += heures
+            justifiees += int(row.justifiees)
+            injustifiees += int(row.injustifiees)
+
+            if row.version_number == 1 and row.date_debut and start <= row.date_debut < end:
+                debuts += 1
+            if row.is_active and row.date_fin and start <= row.date_fin < end:
+                fins += 1
+            dossiers.add(row.contrat_dossier_id)
+
+        produits_par_financeur = self._produits(db, tenant_id, start, end)
+
+        par_sexe = {"H": 0, "F": 0, "AUTRE": 0}
+        for sexe in candidats.values():
+            par_sexe[sexe] += 1
+
+        return {
+            "exercice": {"annee": year, "debut": start, "fin": end},
+            "stagiaires": {
+                "total": len(candidats),
+                "par_sexe": par_sexe,
+                "par_rncp": {rncp: len(dossiers) for rncp, dossiers in dossiers_by_rncp.items()},
+            },
+            "heures": {
+                "total": round(total_heures, 2),
+                "par_rncp": {rncp: round(h, 2) for rncp, h in heures_par_rncp.items()},
+                "par_sexe": {sexe: round(h, 2) for sexe, h in heures_par_sexe.items()},
+            },
+            "absences": {"justifiees": justifiees, "injustifiees": injustifiees},
+            "contrats": {"debuts": debuts, "fins": fins, "dossiers": len(dossiers)},
+            "produits": {
+                "total": round(sum(produits_par_financeur.values()), 2),
+                "par_financeur": {k: round(v, 2) for k, v in produits_par_financeur.items()},
+            },
+        }
+
+    def _produits(self, db: Session, tenant_id: int, start: date, end: date) -> Dict[str, float]:
+        """Invoiced amount of the exercise (by emission date) per funder (IDCC of the employer)."""
+        rows = db.execute(select(
+            Entreprise.code_idcc,
+            func.sum(Invoice.montant_ht)
+        ).select_from(Invoice)
+         .join(ContratDossier, ContratDossier.id == Invoice.contrat_dossier_id)
+         .outerjoin(Entreprise, Entreprise.id == ContratDossier.entreprise_id)
+         .where(
+            Invoice.tenant_id == tenant_id,
+            Invoice.statut.in_([InvoiceStatus.EMISE, InvoiceStatus.PAYEE]),
+            Invoice.date_emission >= start,
+            Invoice.date_emission < end
+        ).group_by(Entreprise.code_idcc)).all()
+
+        produits = defaultdict(float)
+        for code_idcc, montant in rows:
+            produits[code_idcc or NOT_SET] += float(montant or 0)
+        return produits
+
+    def annex_csv(self, db: Session, tenant_id: int, year: int, start_month: int = 1) -> Iterator[str]:
+        """Per-trainee annex, one CSV line per contract version, generated while rows stream in."""
+        start, end = fiscal_year_bounds(year, start_month)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter=";")
+
+        def flush() -> str:
+            chunk = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            return chunk
+
+        writer.writerow(ANNEX_COLUMNS)
+        yield flush()
+
+        invoiced = set()
+        rows = db.execute(self._rows(tenant_id, start, end).execution_options(yield_per=1000))
+        for i, row in enumerate(rows, 1):
+            montant = row.montant if row.contrat_dossier_id not in invoiced else 0
+            invoiced.add(row.contrat_dossier_id)
+            writer.writerow((
+                row.id, row.version_number, row.last_name, row.first_name,
+                SEXE_LABELS.get(row.civilite.value if row.civilite else None, "AUTRE"),
+                row.session_nom or "", row.formation_rncp_id or "",
+                row.raison_sociale or "", row.siret or "", row.code_idcc or "",
+                row.date_debut or "", row.date_fin or "",
+                row.heures, row.justifiees, row.injustifiees, montant,
+            ))
+            if i % 500 == 0:
+                yield flush()
+        yield flush()
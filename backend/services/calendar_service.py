@@ -0,0 +1,146 @@
+from sqlalchemy.orm import Session
+from datetime import date, timedelta
+from array import array
+from typing import Dict, List, Tuple
+import threading
+import time
+
+from models import ClosurePeriod
+from services.analytics_cache import analytics_cache
+
+def easter_sunday(year: int) -> date:
+    """Gregorian Easter (Meeus/Jones/Butcher algorithm), no external data needed."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+def french_public_holidays(year: int) -> Dict[date, str]:
+    """Jours fériés légaux en métropole (Code du travail, art. L3133-1)."""
+    easter = easter_sunday(year)
+    return {
+        date(year, 1, 1): "Jour de l'an",
+        easter + timedelta(days=1): "Lundi de Pâques",
+        date(year, 5, 1): "Fête du Travail",
+        date(year, 5, 8): "Victoire 1945",
+        easter + timedelta(days=39): "Ascension",
+        easter + timedelta(days=50): "Lundi de Pentecôte",
+        date(year, 7, 14): "Fête nationale",
+        date(year, 8, 15): "Assomption",
+        date(year, 11, 1): "Toussaint",
+        date(year, 11, 11): "Armistice 1918",
+        date(year, 12, 25): "Noël",
+    }
+
+class _YearIndex:
+    """
+    Precomputed index of one year:
+    - open[i]: 1 if day i (0 = Jan 1st) is neither a public holiday nor a closure day
+    - cumulative[i]: number of working days (open AND Mon-Fri) strictly before day i
+    """
+
+    def __init__(self, year: int, closures: List[Tuple[date, date]]):
+        self.first = date(year, 1, 1)
+        length = (date(year + 1, 1, 1) - self.first).days
+        self.open = bytearray(b"\x01" * length)
+
+        for holiday in french_public_holidays(year):
+            self.open[(holiday - self.first).days] = 0
+        for debut, fin in closures:
+            lo = max((debut - self.first).days, 0)
+            hi = min((fin - self.first).days, length - 1)
+            for i in range(lo, hi + 1):
+                self.open[i] = 0
+
+        first_weekday = self.first.weekday()
+        self.cumulative = array("i", [0] * (length + 1))
+        for i in range(length):
+            working = self.open[i] and (first_weekday + i) % 7 < 5
+            self.cumulative[i + 1] = self.cumulative[i] + (1 if working else 0)
+
+class BusinessCalendar:
+    """
+    Calendrier ouvré d'un tenant: jours fériés français + périodes de fermeture du CFA.
+    Index per year built lazily, then O(1) lookups and business-day counts.
+    """
+
+    def __init__(self, closures: List[Tuple[date, date]]):
+        self.closures = closures
+        self._years: Dict[int, _YearIndex] = {}
+
+    def _year(self, year: int) -> _YearIndex:
+        index = self._years.get(year)
+        if index is None:
+            index = _YearIndex(year, self.closures)
+            self._years[year] = index
+        return index
+
+    def is_open(self, d: date) -> bool:
+        """Neither a public holiday nor inside a closure period (weekends allowed)."""
+        index = self._year(d.year)
+        return bool(index.open[(d - index.first).days])
+
+    def is_working_day(self, d: date) -> bool:
+        return d.weekday() < 5 and self.is_open(d)
+
+    def count_business_days(self, start: date, end: date) -> int:
+        """Working days in [start, end], O(number of years spanned)."""
+        if end < start:
+            return 0
+        total = 0
+        for year in range(start.year, end.year + 1):
+            index = self._year(year)
+            lo = (max(start, index.first) - index.first).days
+            hi = (min(end, date(year, 12, 31)) - index.first).days
+            total += index.cumulative[hi + 1] - index.cumulative[lo]
+        return total
+
+    def closed_days(self, start: date, end: date) -> List[date]:
+        """Public holidays and closure days in [start, end]."""
+        days = []
+        for year in range(start.year, end.year + 1):
+            index = self._year(year)
+            lo = (max(start, index.first) - index.first).days
+            hi = (min(end, date(year, 12, 31)) - index.first).days
+            days.extend(index.first + timedelta(days=i) for i in range(lo, hi + 1) if not index.open[i])
+        return days
+
+# --- Per tenant cache ---
+# Closure writes bump the tenant's "calendar" generation in the analytics cache
+# backend (shared by every worker with Redis); the TTL covers the in-process
+# backend, where other workers only see their own bumps.
+
+CALENDAR_TTL_SECONDS = 60
+
+_calendars: Dict[int, Tuple[BusinessCalendar, int, float]] = {}
+_calendars_lock = threading.Lock()
+
+def calendar_generation(tenant_id: int) -> int:
+    return analytics_cache.backend.generation(f"{tenant_id}:calendar")
+
+def get_business_calendar(db: Session, tenant_id: int) -> BusinessCalendar:
+    generation = calendar_generation(tenant_id)
+    with _calendars_lock:
+        entry = _calendars.get(tenant_id)
+    if entry is not None:
+        calendar, built_generation, built_at = entry
+        if built_generation == generation and time.monotonic() - built_at < CALENDAR_TTL_SECONDS:
+            return calendar
+    closures = db.query(ClosurePeriod.date_debut, ClosurePeriod.date_fin)\
+        .filter(ClosurePeriod.tenant_id == tenant_id).all()
+    calendar = BusinessCalendar([(debut, fin) for debut, fin in closures])
+    with _calendars_lock:
+        _calendars[tenant_id] = (calendar, generation, time.monotonic())
+    return calendar
+
+def invalidate_business_calendar(tenant_id: int):
+    analytics_cache.invalidate(tenant_id, ("calendar",))
+    with _calendars_lock:
+        _calendars.pop(tenant_id, None)
@@ -0,0 +1,170 @@
+from sqlalchemy.orm import Session
+from collections import defaultdict
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from models import ContratDossier, ContratVersion, SessionDay
+
+# Intervals are expressed in half-day slots: ordinal * 2 (morning) / ordinal * 2 + 1 (afternoon),
+# so a morning-only session and an afternoon-only session on the same date do not conflict.
+
+def _slot_to_date(slot: int) -> date:
+    return date.fromordinal(slot // 2)
+
+class IntervalTree:
+    """
+    Static interval tree over closed intervals [start, end] with a payload.
+    Intervals are sorted by start and laid out as an implicit balanced BST
+    (node = middle of the range) augmented with the max end of each subtree.
+    Build O(n log n), query O(log n + k).
+    """
+
+    def __init__(self, intervals: List[Tuple[int, int, Any]]):
+        self.intervals = sorted(intervals, key=lambda i: (i[0], i[1]))
+        self.max_end = [0] * len(self.intervals)
+        self.end = self._build(0, len(self.intervals)) if self.intervals else -1
+
+    def _build(self, lo: int, hi: int) -> int:
+        mid = (lo + hi) // 2
+        best = self.intervals[mid][1]
+        if lo < mid:
+            best = max(best, self._build(lo, mid))
+        if mid + 1 < hi:
+            best = max(best, self._build(mid + 1, hi))
+        self.max_end[mid] = best
+        return best
+
+    def overlaps(self, start: int, end: int) -> List[Tuple[int, int, Any]]:
+        found = []
+        stack = [(0, len(self.intervals))]
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if self.max_end[mid] < start:
+                continue # Nothing in this subtree ends after the query starts
+            interval = self.intervals[mid]
+            if interval[0] <= end and interval[1] >= start:
+                found.append(interval)
+            stack.append((lo, mid))
+            if interval[0] <= end:
+                stack.append((mid + 1, hi))
+        return found
+
+def _session_runs(rows) -> Dict[int, List[Tuple[int, int]]]:
+    """Compresses SessionDays (ordered by session, date) into runs of consecutive half-day slots."""
+    runs: Dict[int, List[Tuple[int, int]]] = defaultdict(list)
+    for session_id, day_date, morning, afternoon in rows:
+        ordinal = day_date.toordinal()
+        slots = [s for s, taught in ((ordinal * 2, morning), (ordinal * 2 + 1, afternoon)) if taught]
+        for slot in slots:
+            session_runs = runs[session_id]
+            if session_runs and session_runs[-1][1] + 1 >= slot:
+                session_runs[-1] = (session_runs[-1][0], max(session_runs[-1][1], slot))
+            else:
+                session_runs.append((slot, slot))
+    return runs
+
+class ConflictService:
+    """
+    Détection des conflits de planning:
+    - chevauchements entre sessions suivies par un même apprenti (contrats actifs)
+    - jours de session hors des dates du contrat (date_debut / date_fin)
+    """
+
+    def detect(self, db: Session, tenant_id: int, contrat_version_id: Optional[int] = None) -> Dict[str, Any]:
+        query = db.query(
+            ContratVersion.id,
+            ContratDossier.candidat_id,
+            ContratVersion.session_id,
+            ContratVersion.date_debut,
+            ContratVersion.date_fin
+        ).join(ContratDossier, ContratDossier.id == ContratVersion.contrat_dossier_id)\
+         .filter(
+            ContratVersion.tenant_id == tenant_id,
+            ContratVersion.is_active == True,
+            ContratVersion.session_id.isnot(None)
+        )
+
+        if contrat_version_id is not None:
+            # Only the versions of the same apprentice are relevant
+            candidat_id = db.query(ContratDossier.candidat_id)\
+                .join(ContratVersion, ContratVersion.contrat_dossier_id == ContratDossier.id)\
+                .filter(ContratVersion.id == contrat_version_id, ContratVersion.tenant_id == tenant_id)\
+                .scalar()
+            if candidat_id is None:
+                return {"chevauchements": [], "hors_contrat": []}
+            query = query.filter(ContratDossier.candidat_id == candidat_id)
+
+        versions = query.all()
+        session_ids = {v[2] for v in versions}
+        day_rows = db.query(SessionDay.session_id, SessionDay.date, SessionDay.is_morning, SessionDay.is_afternoon)\
+            .filter(SessionDay.session_id.in_(session_ids))\
+            .order_by(SessionDay.session_id, SessionDay.date).all() if session_ids else []
+        runs = _session_runs(day_rows)
+        session_trees = {session_id: IntervalTree([(s, e, None) for s, e in r]) for session_id, r in runs.items()}
+
+        by_candidat = defaultdict(list)
+        out_of_contract = []
+        for version_id, candidat_id, session_id, debut, fin in versions:
+            window = (debut.toordinal() * 2 if debut else None, fin.toordinal() * 2 + 1 if fin else None)
+            by_candidat[candidat_id].append((version_id, session_id, window))
+
+            if contrat_version_id is not None and version_id != contrat_version_id:
+                continue
+            tree = session_trees.get(session_id)
+            if tree is None:
+                continue
+            # Session days before date_debut / after date_fin of the contract
+            ranges = []
+            if window[0] is not None:
+                ranges.append((0, window[0] - 1))
+            if window[1] is not None:
+                ranges.append((window[1] + 1, tree.end))
+            days = set()
+            for q_lo, q_hi in ranges:
+                for s, e, _ in tree.overlaps(q_lo, q_hi):
+                    days.update(range(max(s, q_lo) // 2, min(e, q_hi) // 2 + 1))
+            if days:
+                out_of_contract.append({
+                    "contrat_version_id": version_id,
+                    "session_id": session_id,
+                    "jours": len(days),
+                    "premier_jour": date.fromordinal(min(days)),
+                    "dernier_jour": date.fromordinal(max(days)),
+                })
+
+        overlaps = []
+        for candidat_id, enrolled in by_candidat.items():
+            if len(enrolled) < 2:
+                continue
+            # Tree of every run (clipped to its contract window) of this apprentice's sessions
+            intervals = []
+            for version_id, session_id, (lo, hi) in enrolled:
+                for s, e in runs.get(session_id, []):
+                    s, e = max(s, lo) if lo is not None else s, min(e, hi) if hi is not None else e
+                    if s <= e:
+                        intervals.append((s, e, (version_id, session_id)))
+            tree = IntervalTree(intervals)
+
+            pairs: Dict[Tuple[int, int, int, int], List[Tuple[int, int]]] = defaultdict(list)
+            for s, e, (version_id, session_id) in tree.intervals:
+                for os_, oe, (other_version, other_session) in tree.overlaps(s, e):
+                    if other_version <= version_id:
+                        continue # Each pair once, and not against itself
+                    if contrat_version_id is not None and contrat_version_id not in (version_id, other_version):
+                        continue
+                    pairs[(version_id, other_version, session_id, other_session)].append((max(s, os_), min(e, oe)))
+
+            for (version_a, version_b, session_a, session_b), spans in pairs.items():
+                overlaps.append({
+                    "candidat_id": candidat_id,
+                    "contrat_version_ids": [version_a, version_b],
+                    "session_ids": [session_a, session_b],
+                    "demi_journees": sum(e - s + 1 for s, e in spans),
+                    "premier_jour": _slot_to_date(min(s for s, _ in spans)),
+                    "dernier_jour": _slot_to_date(max(e for _, e in spans)),
+                })
+
+        return {"chevauchements": overlaps, "hors_contrat": out_of_contract}
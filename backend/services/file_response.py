@@ -0,0 +1,105 @@
+"""
+File responses for tenant uploads.
+
+Built on Starlette's FileResponse (HTTP Range / If-Range, chunked reads: a file is
+never loaded in memory) and adds:
+- conditional requests: If-None-Match / If-Modified-Since -> 304 Not Modified
+- zero-copy: full bodies use the ASGI "http.response.pathsend" extension (handled by
+  FileResponse); when the server offers "http.response.zerocopy", single-range
+  bodies are handed over as (fd, offset, count) too, so the server can sendfile()
+  the pages a PDF viewer asks for. Uvicorn and Hypercorn do not offer it: there,
+  ranges go through FileResponse's chunked reads.
+"""
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.types import Receive, Scope, Send
+from email.utils import parsedate_to_datetime
+from typing import Optional, Tuple
+import os
+
+ZEROCOPY_EXTENSION = "http.response.zerocopy"
+
+class TenantFileResponse(FileResponse):
+    chunk_size = 256 * 1024
+
+    def __init__(self, path: str, filename: Optional[str] = None, media_type: Optional[str] = None):
+        stat_result = os.stat(path)
+        super().__init__(
+            path,
+            filename=filename,
+            media_type=media_type,
+            stat_result=stat_result,
+            content_disposition_type="inline", # Preview in the browser (PDF viewer uses Range)
+            headers={"Cache-Control": "private, no-cache"} # Always revalidated with the ETag
+        )
+        self.headers.setdefault("accept-ranges", "bytes")
+
+    def _not_modified(self, scope: Scope) -> bool:
+        headers = Headers(scope=scope)
+        if_none_match = headers.get("if-none-match")
+        if if_none_match is not None:
+            # If-None-Match wins over If-Modified-Since (RFC 9110 13.2.2)
+            etag = self.headers["etag"]
+            tags = [t.strip() for t in if_none_match.split(",")]
+            return "*" in tags or etag in tags or f"W/{etag}" in tags
+        if_modified_since = headers.get("if-modified-since")
+        if if_modified_since is not None:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(self.stat_result.st_mtime) <= since
+        return False
+
+    def _single_range(self, scope: Scope) -> Optional[Tuple[int, int]]:
+        """(start, end) of a satisfiable single "bytes=" range, None for anything else (left to FileResponse)."""
+        headers = Headers(scope=scope)
+        http_range = headers.get("range")
+        if_range = headers.get("if-range")
+        if not http_range or (if_range is not None and if_range != self.headers["etag"]):
+            return None
+        unit, _, spec = http_range.partition("=")
+        if unit.strip() != "bytes" or "," in spec:
+            return None
+        first, _, last = spec.strip().partition("-")
+        size = self.stat_result.st_size
+        try:
+            if first == "":
+                start, end = max(size - int(last), 0), size - 1 # Suffix: last N bytes
+            else:
+                start, end = int(first), min(int(last), size - 1) if last else size - 1
+        except ValueError:
+            return None
+        if start > end or start >= size:
+            return None
+        return start, end
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope.get("method", "GET") in ("GET", "HEAD") and self._not_modified(scope):
+            response = Response(status_code=304, headers={
+                "etag": self.headers["etag"],
+                "last-modified": self.headers["last-modified"],
+                "cache-control": self.headers["cache-control"],
+            })
+            await response(scope, receive, send)
+            return
+
+        byte_range = self._single_range(scope)
+        if ZEROCOPY_EXTENSION in scope.get("extensions", {}) and byte_range and scope.get("method") != "HEAD":
+            start, end = byte_range
+            headers = [(k, v) for k, v in self.raw_headers if k != b"content-length"] + [
+                (b"content-length", str(end - start + 1).encode()),
+                (b"content-range", f"bytes {start}-{end}/{self.stat_result.st_size}".encode()),
+            ]
+            await send({"type": "http.response.start", "status": 206, "headers": headers})
+            with open(self.path, "rb") as file:
+                await send({
+                    "type": ZEROCOPY_EXTENSION,
+                    "file": file.fileno(),
+                    "offset": start,
+                    "count": end - start + 1,
+                    "more_body": False,
+                })
+            return
+
+        await super().__call__(scope, receive, send)
@@ -0,0 +1,193 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, case, cast, select, insert, String
+from datetime import date, datetime
+from typing import Any, Dict, Optional
+
+from models import Candidat, CandidatStatus, CandidatStatusTransition, CandidatFunnelMonthly
+from services.aggregates import increment_counters, month_start
+
+CREATION = "CREATION"
+PIPELINE = (CandidatStatus.NOUVEAU, CandidatStatus.ADMISSIBLE, CandidatStatus.ENTRETIEN, CandidatStatus.PLACE)
+
+# Upper bound (seconds) of each histogram column of CandidatFunnelMonthly, None = unbounded
+DURATION_BUCKETS = (
+    (3600, "d_1h"),
+    (86400, "d_1j"),
+    (3 * 86400, "d_3j"),
+    (7 * 86400, "d_7j"),
+    (14 * 86400, "d_14j"),
+    (30 * 86400, "d_30j"),
+    (60 * 86400, "d_60j"),
+    (90 * 86400, "d_90j"),
+    (None, "d_plus"),
+)
+HISTOGRAM_COLUMNS = tuple(column for _, column in DURATION_BUCKETS)
+
+def duration_bucket(seconds: int) -> str:
+    for bound, column in DURATION_BUCKETS:
+        if bound is None or seconds < bound:
+            return column
+
+def histogram_median(counts: Dict[str, int]) -> Optional[float]:
+    """Median (seconds) estimated from the histogram, interpolated inside its bucket."""
+    total = sum(counts.get(column, 0) for column in HISTOGRAM_COLUMNS)
+    if not total:
+        return None
+    target = total / 2
+    seen = 0
+    lower = 0
+    for bound, column in DURATION_BUCKETS:
+        count = counts.get(column, 0)
+        if count and seen + count >= target:
+            if bound is None:
+                return float(lower)
+            return lower + (bound - lower) * (target - seen) / count
+        seen += count
+        lower = bound or lower
+    return float(lower)
+
+class FunnelService:
+    """
+    Funnel candidats: chaque changement de statut est ajouté à CandidatStatusTransition
+    et compté dans CandidatFunnelMonthly dans la même transaction, le rapport ne lit
+    que les compteurs mensuels.
+    """
+
+    def record_transition(
+        self,
+        db: Session,
+        candidat: Candidat,
+        old_status: Optional[CandidatStatus],
+        new_status: CandidatStatus,
+        at: Optional[datetime] = None
+    ):
+        """
+        Records one status change (old_status=None for a creation). Must be called in
+        the same transaction as the Candidat write, after it was flushed (no commit here).
+        """
+        if old_status == new_status:
+            return
+        at = at or datetime.utcnow()
+
+        duration = None
+        if old_status is not None:
+            since = db.query(func.max(CandidatStatusTransition.occurred_at))\
+                .filter(CandidatStatusTransition.candidat_id == candidat.id).scalar() or candidat.created_at
+            if since is not None:
+                duration = max(int((at - since).total_seconds()), 0)
+
+        db.add(CandidatStatusTransition(
+            tenant_id=candidat.tenant_id,
+            candidat_id=candidat.id,
+            from_status=old_status,
+            to_status=new_status,
+            occurred_at=at,
+            duration_seconds=duration
+        ))
+
+        deltas = {"transitions": 1, "duration_seconds": duration or 0}
+        if duration is not None:
+            deltas[duration_bucket(duration)] = 1
+        increment_counters(
+            db,
+            CandidatFunnelMonthly,
+            key={
+                "tenant_id": candidat.tenant_id,
+                "month": at.date().replace(day=1),
+                "from_status": old_status.value if old_status else CREATION,
+                "to_status": new_status.value,
+            },
+            deltas=deltas
+        )
+
+    def rebuild(self, db: Session, tenant_id: Optional[int] = None) -> int:
+        """Backfill: recomputes the counters from the transition history with one INSERT ... SELECT."""
+        delete_query = db.query(CandidatFunnelMonthly)
+        if tenant_id is not None:
+            delete_query = delete_query.filter(CandidatFunnelMonthly.tenant_id == tenant_id)
+        delete_query.delete(synchronize_session=False)
+
+        T = CandidatStatusTransition
+        month = month_start(db, T.occurred_at)
+        from_status = func.coalesce(cast(T.from_status, String), CREATION)
+        to_status = cast(T.to_status, String)
+
+        buckets = []
+        lower = None
+        for bound, column in DURATION_BUCKETS:
+            condition = T.duration_seconds.isnot(None)
+            if lower is not None:
+                condition = condition & (T.duration_seconds >= lower)
+            if bound is not None:
+                condition = condition & (T.duration_seconds < bound)
+            buckets.append(func.sum(case((condition, 1), else_=0)))
+            lower = bound
+
+        source = select(
+            T.tenant_id, month, from_status, to_status,
+            func.count(T.id),
+            func.coalesce(func.sum(T.duration_seconds), 0),
+            *buckets
+        ).group_by(T.tenant_id, month, from_status, to_status)
+        if tenant_id is not None:
+            source = source.where(T.tenant_id == tenant_id)
+
+        result = db.execute(insert(CandidatFunnelMonthly).from_select(
+            ["tenant_id", "month", "from_status", "to_status", "transitions", "duration_seconds", *HISTOGRAM_COLUMNS],
+            source
+        ))
+        db.commit()
+        return result.rowcount
+
+    def report(self, db: Session, tenant_id: int, start: date, end: date) -> Dict[str, Any]:
+        """Conversion and drop-off per pipeline stage, transitions in the months [start, end]."""
+        rows = db.query(
+            CandidatFunnelMonthly.from_status,
+            CandidatFunnelMonthly.to_status,
+            func.sum(CandidatFunnelMonthly.transitions),
+            *[func.sum(getattr(CandidatFunnelMonthly, column)) for column in HISTOGRAM_COLUMNS]
+        ).filter(
+            CandidatFunnelMonthly.tenant_id == tenant_id,
+            CandidatFunnelMonthly.month >= start.replace(day=1),
+            CandidatFunnelMonthly.month <= end
+        ).group_by(CandidatFunnelMonthly.from_status, CandidatFunnelMonthly.to_status).all()
+
+        entered: Dict[str, int] = {}
+        advanced: Dict[str, int] = {}
+        rejected: Dict[str, int] = {}
+        time_in_stage: Dict[str, Dict[str, int]] = {}
+        rank = {status.value: i for i, status in enumerate(PIPELINE)}
+
+        for from_status, to_status, transitions, *histogram in rows:
+            entered[to_status] = entered.get(to_status, 0) + transitions
+            if from_status == CREATION:
+                continue
+            if to_status == CandidatStatus.REJETE.value:
+                rejected[from_status] = rejected.get(from_status, 0) + transitions
+            elif rank.get(to_status, -1) > rank.get(from_status, len(PIPELINE)):
+                advanced[from_status] = advanced.get(from_status, 0) + transitions
+            counts = time_in_stage.setdefault(from_status, {})
+            for column, value in zip(HISTOGRAM_COLUMNS, histogram):
+                counts[column] = counts.get(column, 0) + (value or 0)
+
+        stages = []
+        for status in PIPELINE:
+            n = entered.get(status.value, 0)
+            median = histogram_median(time_in_stage.get(status.value, {}))
+            stages.append({
+                "statut": status.value,
+                "entrees": n,
+                "avancees": advanced.get(status.value, 0),
+                "rejets": rejected.get(status.value, 0),
+                "taux_conversion": round(advanced.get(status.value, 0) / n * 100, 2) if n else None,
+                "taux_abandon": round(rejected.get(status.value, 0) / n * 100, 2) if n else None,
+                "duree_mediane_jours": round(median / 86400, 2) if median is not None else None,
+            })
+
+        first = entered.get(CandidatStatus.NOUVEAU.value, 0)
+        return {
+            "debut": start.replace(day=1),
+            "fin": end,
+            "etapes": stages,
+            "taux_conversion_global": round(entered.get(CandidatStatus.PLACE.value, 0) / first * 100, 2) if first else None,
+        }
@@ -0,0 +1,262 @@
+from sqlalchemy import select, insert, func, desc, text
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import ClauseElement, Executable
+from sqlalchemy.ext.compiler import compiles
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Tuple
+import json
+import random
+
+import migrations
+from database import Base
+from models import (
+    Tenant, User, Candidat, CandidatStatus, CandidatStatusTransition, Session as TrainingSession, SessionDay,
+    ClosurePeriod, ContratDossier, ContratVersion, Attendance, AttendanceStatus, Invoice, InvoiceStatus,
+    AuditLog, Ticket, TicketStatus, TicketCategory, Survey, SurveyType, SurveyDispatch, SurveyDispatchStatus
+)
+
+ADVISOR_TENANT_SLUG = "index-advisor"
+ADVISOR_EMAIL = "index-advisor@example.invalid"
+
+class Explain(Executable, ClauseElement):
+    """EXPLAIN of a statement, binds processed like the statement itself (enums, dates)."""
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+@compiles(Explain)
+def _explain(element, compiler, **kw):
+    return "EXPLAIN QUERY PLAN " + compiler.process(element.statement, **kw)
+
+@compiles(Explain, "postgresql")
+def _explain_postgresql(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+class IndexAdvisorService:
+    """
+    Rejoue les requêtes de l'application avec EXPLAIN et signale les scans séquentiels.
+    By default with the data already there (largest_tenant). On a scratch copy of the
+    database, seed() adds large synthetic tenants so the planner picks its real plans
+    (on small tables a sequential scan is the right call).
+    """
+
+    def largest_tenant(self, db: Session) -> int:
+        """Tenant with the most candidats (the first tenant on an empty database)."""
+        tenant_id = db.scalar(select(Candidat.tenant_id).group_by(Candidat.tenant_id)
+                              .order_by(desc(func.count(Candidat.id))).limit(1))
+        return tenant_id if tenant_id is not None else db.scalar(select(func.min(Tenant.id)))
+
+    def seed(self, db: Session, candidats: int = 50000, tenants: int = 5, seed: int = 42) -> int:
+        """
+        Bulk-inserts `tenants` synthetic tenants sharing `candidats` candidats (idempotent:
+        reuses them if present) so tenant_id is as selective as in production. Returns the first id.
+        """
+        rng = random.Random(seed)
+        tenant_ids = []
+        for n in range(tenants):
+            slug = ADVISOR_TENANT_SLUG if n == 0 else f"{ADVISOR_TENANT_SLUG}-{n}"
+            tenant_id = db.scalar(select(Tenant.id).where(Tenant.slug == slug))
+            if tenant_id is None:
+                tenant_id = self._seed_tenant(db, slug, max(candidats // tenants, 1), rng)
+            tenant_ids.append(tenant_id)
+        db.commit()
+        db.execute(text("ANALYZE"))
+        db.commit()
+        return tenant_ids[0]
+
+    def _seed_tenant(self, db: Session, slug: str, candidats: int, rng: random.Random) -> int:
+        now = datetime.utcnow()
+        tenant_id = db.execute(insert(Tenant).values(name=f"Index advisor ({slug})", slug=slug).returning(Tenant.id)).scalar()
+        email = ADVISOR_EMAIL if slug == ADVISOR_TENANT_SLUG else f"{slug}@example.invalid"
+        user_id = db.execute(insert(User).values(
+            tenant_id=tenant_id, email=email, password_hash="!", role="admin"
+        ).returning(User.id)).scalar()
+        db.execute(insert(User), [
+            {"tenant_id": tenant_id, "email": f"user{i}@{slug}.invalid", "password_hash": "!", "role": "admin"}
+            for i in range(candidats // 100)
+        ])
+
+        statuses = list(CandidatStatus)
+        db.execute(insert(Candidat), [
+            {"tenant_id": tenant_id, "first_name": f"Prenom{i}", "last_name": f"Nom{i}", "email": f"c{i}@advisor.invalid",
+             "statut": rng.choice(statuses), "created_at": now - timedelta(minutes=i * 7)}
+            for i in range(candidats)
+        ])
+        candidat_ids = db.scalars(select(Candidat.id).where(Candidat.tenant_id == tenant_id)).all()
+        db.execute(insert(CandidatStatusTransition), [
+            {"tenant_id": tenant_id, "candidat_id": candidat_id, "from_status": None, "to_status": CandidatStatus.NOUVEAU,
+             "occurred_at": now - timedelta(minutes=i * 7)}
+            for i, candidat_id in enumerate(candidat_ids)
+        ])
+
+        sessions = max(candidats // 500, 1)
+        db.execute(insert(TrainingSession), [
+            {"tenant_id": tenant_id, "nom": f"Session {i}", "date_debut": date(2024, 9, 1), "date_fin": date(2026, 6, 30)}
+            for i in range(sessions)
+        ])
+        session_ids = db.scalars(select(TrainingSession.id).where(TrainingSession.tenant_id == tenant_id)).all()
+        db.execute(insert(SessionDay), [
+            {"session_id": session_id, "date": date(2024, 9, 2) + timedelta(days=7 * week + day)}
+            for session_id in session_ids for week in range(60) for day in range(2)
+        ])
+        db.execute(insert(ClosurePeriod), [
+            {"tenant_id": tenant_id, "label": f"Fermeture {i}", "date_debut": date(2024, 1, 1) + timedelta(days=30 * i),
+             "date_fin": date(2024, 1, 5) + timedelta(days=30 * i)}
+            for i in range(24)
+        ])
+
+        placed = candidat_ids[:candidats // 2]
+        db.execute(insert(ContratDossier), [{"tenant_id": tenant_id, "candidat_id": candidat_id} for candidat_id in placed])
+        dossier_ids = db.scalars(select(ContratDossier.id).where(ContratDossier.tenant_id == tenant_id)).all()
+        versions = []
+        for dossier_id in dossier_ids:
+            count = rng.randint(1, 3)
+            for number in range(1, count + 1):
+                debut = date(2024, 9, 1) + timedelta(days=rng.randint(0, 365))
+                versions.append({
+                    "tenant_id": tenant_id, "contrat_dossier_id": dossier_id, "session_id": rng.choice(session_ids),
+                    "version_number": number, "cout_npec": 8000, "heures_formation": 600,
+                    "date_debut": debut, "date_fin": debut + timedelta(days=730), "is_active": number == count
+                })
+        db.execute(insert(ContratVersion), versions)
+        db.execute(insert(Invoice), [
+            {"tenant_id": tenant_id, "contrat_dossier_id": dossier_id, "numero_facture": f"ADV-{dossier_id}-{n}",
+             "montant_ht": 2000, "statut": rng.choice(list(InvoiceStatus)), "date_emission": date(2024, 10, 1) + timedelta(days=90 * n)}
+            for dossier_id in dossier_ids for n in range(2)
+        ])
+
+        active = db.execute(select(ContratVersion.id, ContratVersion.session_id).where(
+            ContratVersion.tenant_id == tenant_id, ContratVersion.is_active == True
+        )).all()
+        days_by_session: Dict[int, List[int]] = {}
+        for day_id, session_id in db.execute(select(SessionDay.id, SessionDay.session_id).where(SessionDay.session_id.in_(session_ids))):
+            days_by_session.setdefault(session_id, []).append(day_id)
+        attendance_statuses = list(AttendanceStatus)
+        db.execute(insert(Attendance), [
+            {"tenant_id": tenant_id, "session_day_id": day_id, "contrat_version_id": version_id, "status": rng.choice(attendance_statuses)}
+            for version_id, session_id in active[:2000] for day_id in days_by_session[session_id][:20]
+        ])
+
+        db.execute(insert(AuditLog), [
+            {"tenant_id": tenant_id, "user_id": user_id, "action": "POST /candidats/", "endpoint": "/candidats/",
+             "method": "POST", "payload": "{}", "timestamp": now - timedelta(minutes=i)}
+            for i in range(candidats)
+        ])
+        db.execute(insert(Ticket), [
+            {"tenant_id": tenant_id, "author_id": user_id, "subject": f"Ticket {i}", "description": "-",
+             "status": rng.choice(list(TicketStatus)), "category": rng.choice(list(TicketCategory)),
+             "created_at": now - timedelta(hours=i)}
+            for i in range(candidats // 10)
+        ])
+        db.execute(insert(Survey), [
+            {"tenant_id": tenant_id, "type": rng.choice(list(SurveyType)), "score": rng.randint(1, 10),
+             "session_id": rng.choice(session_ids), "created_at": now - timedelta(hours=i)}
+            for i in range(candidats // 10)
+        ])
+        db.execute(insert(SurveyDispatch), [
+            {"tenant_id": tenant_id, "contrat_version_id": version_id, "type": SurveyType.J30,
+             "due_date": date(2025, 1, 1) + timedelta(days=i % 365), "status": rng.choice(list(SurveyDispatchStatus))}
+            for i, (version_id, _) in enumerate(active)
+        ])
+        return tenant_id
+
+    def query_shapes(self, db: Session, tenant_id: int) -> List[Tuple[str, Any]]:
+        """The hot statements of the routers / services, with parameters taken from the tenant's data."""
+        dossier_id = db.scalar(select(func.max(ContratDossier.id)).where(ContratDossier.tenant_id == tenant_id)) or 0
+        session_id = db.scalar(select(func.max(TrainingSession.id)).where(TrainingSession.tenant_id == tenant_id)) or 0
+        version_id = db.scalar(select(func.max(ContratVersion.id)).where(ContratVersion.tenant_id == tenant_id)) or 0
+        day_id = db.scalar(select(func.max(SessionDay.id)).where(SessionDay.session_id == session_id)) or 0
+        email = db.scalar(select(User.email).where(User.tenant_id == tenant_id).limit(1)) or ADVISOR_EMAIL
+        since = datetime.utcnow() - timedelta(days=90)
+
+        return [
+            ("login: user by email",
+             select(User).where(User.email == email).limit(1)),
+            ("candidats: list by status",
+             select(Candidat).where(Candidat.tenant_id == tenant_id, Candidat.statut == CandidatStatus.PLACE).limit(50)),
+            ("candidats: created per period",
+             select(func.count(Candidat.id)).where(Candidat.tenant_id == tenant_id, Candidat.created_at >= since)),
+            ("funnel: transitions since",
+             select(func.count(CandidatStatusTransition.id)).where(
+                 CandidatStatusTransition.tenant_id == tenant_id, CandidatStatusTransition.occurred_at >= since)),
+            ("contrats: active version of a dossier",
+             select(ContratVersion).where(ContratVersion.contrat_dossier_id == dossier_id, ContratVersion.is_active == True).limit(1)),
+            ("contrats: version history",
+             select(ContratVersion).where(ContratVersion.contrat_dossier_id == dossier_id).order_by(ContratVersion.version_number)),
+            ("dashboard: active contracts",
+             select(func.sum(ContratVersion.cout_npec), func.count(ContratVersion.id)).where(
+                 ContratVersion.tenant_id == tenant_id, ContratVersion.is_active == True)),
+            ("dashboard: revenue",
+             select(func.sum(Invoice.montant_ht)).where(
+                 Invoice.tenant_id == tenant_id, Invoice.statut.in_([InvoiceStatus.EMISE, InvoiceStatus.PAYEE]))),
+            ("bpf: invoices of a dossier",
+             select(Invoice).where(Invoice.contrat_dossier_id == dossier_id)),
+            ("attendance: student day (idempotent declare)",
+             select(Attendance).where(Attendance.contrat_version_id == version_id, Attendance.session_day_id == day_id,
+                                      Attendance.tenant_id == tenant_id)),
+            ("attendance: present days",
+             select(func.count(Attendance.id)).where(Attendance.tenant_id == tenant_id, Attendance.status == AttendanceStatus.PRESENT)),
+            ("pedagogie: days of a session",
+             select(SessionDay).where(SessionDay.session_id == session_id).order_by(SessionDay.date)),
+            ("pedagogie: closures",
+             select(ClosurePeriod).where(ClosurePeriod.tenant_id == tenant_id).order_by(ClosurePeriod.date_debut)),
+            ("quality: latest audit logs",
+             select(AuditLog).where(AuditLog.tenant_id == tenant_id).order_by(desc(AuditLog.timestamp)).limit(100)),
+            ("quality: tickets by status",
+             select(Ticket).where(Ticket.tenant_id == tenant_id, Ticket.status == TicketStatus.OPEN)
+             .order_by(desc(Ticket.created_at), desc(Ticket.id)).limit(50)),
+            ("quality: surveys since",
+             select(func.count(Survey.id)).where(Survey.tenant_id == tenant_id, Survey.created_at >= since)),
+            ("quality: pending survey dispatches",
+             select(SurveyDispatch).where(SurveyDispatch.tenant_id == tenant_id, SurveyDispatch.status == SurveyDispatchStatus.PENDING)
+             .order_by(SurveyDispatch.due_date, SurveyDispatch.id).limit(100)),
+        ]
+
+    def explain(self, db: Session, statement) -> Dict[str, Any]:
+        """{"plan": [...], "seq_scans": [table, ...], "sorts": n} for one statement."""
+        rows = db.execute(Explain(statement)).all()
+        if db.get_bind().dialect.name == "postgresql":
+            plan = rows[0][0]
+            plan = json.loads(plan) if isinstance(plan, str) else plan
+            lines, seq_scans, sorts = [], [], 0
+
+            def walk(node, depth=0):
+                nonlocal sorts
+                relation = f" on {node['Relation Name']}" if "Relation Name" in node else ""
+                index = f" using {node['Index Name']}" if "Index Name" in node else ""
+                lines.append(f"{'  ' * depth}{node['Node Type']}{relation}{index} (~{node.get('Plan Rows', 0)} rows)")
+                if node["Node Type"] == "Seq Scan":
+                    seq_scans.append(node["Relation Name"])
+                if node["Node Type"] in ("Sort", "Incremental Sort"):
+                    sorts += 1
+                for child in node.get("Plans", []):
+                    walk(child, depth + 1)
+
+            walk(plan[0]["Plan"])
+            return {"plan": lines, "seq_scans": seq_scans, "sorts": sorts}
+
+        # SQLite: "SCAN t" is a full scan, "SCAN t USING [COVERING] INDEX" walks a whole index,
+        # "SEARCH t USING INDEX" is a lookup
+        details = [row[-1] for row in rows]
+        seq_scans = [d.split()[1] for d in details if d.startswith("SCAN ") and " USING " not in d]
+        sorts = sum(1 for d in details if d.startswith("USE TEMP B-TREE"))
+        return {"plan": details, "seq_scans": seq_scans, "sorts": sorts}
+
+    def missing_indexes(self, db: Session) -> List[str]:
+        """
+        DDL of the indexes declared in models.py that the database does not have, matched
+        on columns like migrations.create_indexes (`manage.py migrate` applies them).
+        """
+        connection = db.connection()
+        statements = []
+        for table in Base.metadata.sorted_tables:
+            statements += [ddl + ";" for _, ddl in migrations.missing_indexes(connection, table)]
+        return statements
+
+    def run(self, db: Session, tenant_id: int) -> List[Dict[str, Any]]:
+        report = []
+        for name, statement in self.query_shapes(db, tenant_id):
+            result = self.explain(db, statement)
+            report.append({"query": name, **result})
+        return report
@@ -0,0 +1,82 @@
+"""
+Keyset (cursor) pagination helpers.
+
+A sort order is a list of (column, descending) pairs ending with a unique column
+(usually the primary key) so the order is total. The cursor is the opaque
+base64 encoding of the last row's sort values; the next page is the rows
+strictly after it, which an index on the sort columns serves without OFFSET.
+"""
+from sqlalchemy import and_, or_, Date, DateTime, Enum, Select
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date, datetime
+from typing import Any, List, Optional, Sequence, Tuple
+import base64
+import json
+
+from fastapi import HTTPException
+
+SortOrder = Sequence[Tuple[Any, bool]]
+
+def order_by_clauses(order: SortOrder) -> List[Any]:
+    return [column.desc() if descending else column.asc() for column, descending in order]
+
+def encode_cursor(row: Any, order: SortOrder) -> str:
+    # Rows of multi-entity queries (entity, extra columns...): the sorted entity comes first
+    entity = row if hasattr(row, order[0][0].key) else row[0]
+    values = [getattr(entity, column.key) for column, _ in order]
+    raw = json.dumps([v.value if hasattr(v, "value") else v for v in values], default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _load(column, raw):
+    if raw is None:
+        return None
+    column_type = column.type
+    if isinstance(column_type, DateTime):
+        return datetime.fromisoformat(raw)
+    if isinstance(column_type, Date):
+        return date.fromisoformat(raw)
+    if isinstance(column_type, Enum) and column_type.enum_class is not None:
+        return column_type.enum_class(raw)
+    return raw
+
+def decode_cursor(cursor: str, order: SortOrder) -> List[Any]:
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        if not isinstance(raw, list) or len(raw) != len(order):
+            raise ValueError
+        return [_load(column, value) for (column, _), value in zip(order, raw)]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def after_cursor(order: SortOrder, values: List[Any]):
+    """
+    Rows strictly after `values` in `order`:
+    (a > x) OR (a = x AND b > y) OR ... with > / < following each column's direction.
+    """
+    clauses = []
+    for i, (column, descending) in enumerate(order):
+        equal = [c == v for (c, _), v in zip(order[:i], values[:i])]
+        beyond = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*equal, beyond))
+    return or_(*clauses)
+
+def _split_page(rows, order: SortOrder, size: int):
+    if len(rows) <= size:
+        return rows, None
+    rows = rows[:size]
+    return rows, encode_cursor(rows[-1], order)
+
+def keyset_page(query, order: SortOrder, size: int, cursor: Optional[str] = None):
+    """Returns (rows, next_cursor); next_cursor is None on the last page."""
+    if cursor:
+        query = query.filter(after_cursor(order, decode_cursor(cursor, order)))
+    rows = query.order_by(*order_by_clauses(order)).limit(size + 1).all()
+    return _split_page(rows, order, size)
+
+async def keyset_page_async(db: AsyncSession, stmt: Select, order: SortOrder, size: int, cursor: Optional[str] = None):
+    """keyset_page for a select() run on an AsyncSession (single entity: ORM objects, else rows)."""
+    if cursor:
+        stmt = stmt.where(after_cursor(order, decode_cursor(cursor, order)))
+    result = await db.execute(stmt.order_by(*order_by_clauses(order)).limit(size + 1))
+    rows = result.scalars().all() if len(stmt.column_descriptions) == 1 else result.all()
+    return _split_page(rows, order, size)
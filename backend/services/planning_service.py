@@ -1,42 +1,65 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import insert, delete, exists
 from datetime import date, timedelta
-from typing import List
-from models import SessionDay
+from typing import List, Dict, Any, Optional
+from models import SessionDay, Attendance
+from services.calendar_service import BusinessCalendar
 
 class PlanningService:
     def generate_session_days(
-        self, 
-        db: Session, 
-        session_id: int, 
-        start_date: date, 
-        end_date: date, 
-        days_of_week: List[int]
-    ):
+        self,
+        db: Session,
+        session_id: int,
+        start_date: date,
+        end_date: date,
+        days_of_week: List[int],
+        calendar: Optional[BusinessCalendar] = None
+    ) -> Dict[str, Any]:
         """
-        Generates SessionDay entries for each date in [start_date, end_date] 
-        where date.weekday() is in days_of_week.
+        Synchronises SessionDay entries with every date in [start_date, end_date]
+        where date.weekday() is in days_of_week, skipping public holidays and
+        closure periods when a BusinessCalendar is given.
+
+        Incremental: existing days are kept untouched, missing days are added with
+        a single bulk INSERT and obsolete days are deleted only if no Attendance
+        references them (those are reported as conflicts instead).
         """
-        # Clear existing days? Maybe. For now, we assume fresh generation or manual delete.
-        # Strict update: delete overlapping? Let's just append and handle uniqueness via DB constraint or ignore.
-        # To be safe: "DELETE FROM session_days WHERE session_id=..." is drastic but simplest for this "Generate" feature.
-        db.query(SessionDay).filter(SessionDay.session_id == session_id).delete()
-        
+        desired = set()
         current = start_date
-        days_to_add = []
-        
         while current <= end_date:
-            if current.weekday() in days_of_week:
-                day = SessionDay(
-                    session_id=session_id,
-                    date=current,
-                    is_morning=True, 
-                    is_afternoon=True
-                )
-                days_to_add.append(day)
+            if current.weekday() in days_of_week and (calendar is None or calendar.is_open(current)):
+                desired.add(current)
             current += timedelta(days=1)
-            
-        if days_to_add:
-            db.add_all(days_to_add)
-            db.commit()
-            
-        return len(days_to_add)
+
+        existing = dict(
+            db.query(SessionDay.date, SessionDay.id).filter(SessionDay.session_id == session_id).all()
+        )
+
+        to_insert = sorted(desired - existing.keys())
+        obsolete_ids = {day_id for day_date, day_id in existing.items() if day_date not in desired}
+
+        if to_insert:
+            db.execute(insert(SessionDay), [
+                {"session_id": session_id, "date": d, "is_morning": True, "is_afternoon": True}
+                for d in to_insert
+            ])
+
+        deleted_ids = set()
+        if obsolete_ids:
+            # Days with attendance are kept: deleting them would orphan Attendance rows
+            deleted_ids = set(db.execute(
+                delete(SessionDay).where(
+                    SessionDay.id.in_(obsolete_ids),
+                    ~exists().where(Attendance.session_day_id == SessionDay.id)
+                ).returning(SessionDay.id)
+            ).scalars())
+
+        db.commit()
+
+        conflicts = sorted(d for d, day_id in existing.items() if day_id in obsolete_ids and day_id not in deleted_ids)
+        return {
+            "created": len(to_insert),
+            "deleted": len(deleted_ids),
+            "unchanged": len(existing) - len(obsolete_ids),
+            "conflicts": conflicts
+        }
@@ -0,0 +1,114 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Any, Dict, List
+import os
+
+from sharding import shard_router
+from models import Candidat, CandidatStatus, ContratVersion, Invoice, InvoiceStatus, Tenant
+from services.analytics_cache import analytics_cache
+from services.conflict_service import ConflictService
+from services.forecast_service import ForecastService
+
+OPERATOR_MAX_WORKERS = int(os.getenv("OPERATOR_MAX_WORKERS", "4"))
+
+# Shared by every request: bounds the per-tenant work running at once on the database
+_executor = ThreadPoolExecutor(max_workers=OPERATOR_MAX_WORKERS, thread_name_prefix="operator")
+
+COLUMNS = (
+    "tenant_id", "tenant", "ca_previsionnel", "ca_realise", "candidats", "candidats_places",
+    "taux_transformation", "contrats_actifs", "ca_prevu_12_mois", "conflits"
+)
+
+class PlatformService:
+    """
+    KPIs de tous les tenants (rôle opérateur).
+    Dashboard KPIs come from one statement grouped by tenant_id, run on every
+    shard at once; the heavier per-tenant metrics (forecast, planning conflicts)
+    run on a bounded thread pool, each task with a session on the tenant's shard.
+    """
+
+    def dashboard_by_tenant(self, db: Session) -> List[Dict[str, Any]]:
+        contrats = select(
+            ContratVersion.tenant_id,
+            func.sum(ContratVersion.cout_npec).label("ca_previsionnel"),
+            func.count(ContratVersion.id).label("contrats_actifs")
+        ).where(ContratVersion.is_active == True).group_by(ContratVersion.tenant_id).subquery()
+
+        factures = select(
+            Invoice.tenant_id,
+            func.sum(Invoice.montant_ht).label("ca_realise")
+        ).where(Invoice.statut.in_([InvoiceStatus.EMISE, InvoiceStatus.PAYEE]))\
+         .group_by(Invoice.tenant_id).subquery()
+
+        candidats = select(
+            Candidat.tenant_id,
+            func.count(Candidat.id).label("total"),
+            func.count(Candidat.id).filter(Candidat.statut == CandidatStatus.PLACE).label("places")
+        ).group_by(Candidat.tenant_id).subquery()
+
+        rows = db.execute(select(
+            Tenant.id,
+            Tenant.name,
+            func.coalesce(contrats.c.ca_previsionnel, 0),
+            func.coalesce(contrats.c.contrats_actifs, 0),
+            func.coalesce(factures.c.ca_realise, 0),
+            func.coalesce(candidats.c.total, 0),
+            func.coalesce(candidats.c.places, 0)
+        ).outerjoin(contrats, contrats.c.tenant_id == Tenant.id)
+         .outerjoin(factures, factures.c.tenant_id == Tenant.id)
+         .outerjoin(candidats, candidats.c.tenant_id == Tenant.id)
+         .order_by(Tenant.id)).all()
+
+        return [
+            {
+                "tenant_id": tenant_id,
+                "tenant": name,
+                "ca_previsionnel": float(ca_previsionnel),
+                "ca_realise": float(ca_realise),
+                "candidats": total,
+                "candidats_places": places,
+                "taux_transformation": round(places / total * 100, 2) if total else 0.0,
+                "contrats_actifs": contrats_actifs,
+            }
+            for tenant_id, name, ca_previsionnel, contrats_actifs, ca_realise, total, places in rows
+        ]
+
+    def heavy_metrics(self, tenant_id: int, start: date) -> Dict[str, Any]:
+        db = shard_router.shard_for(tenant_id).session()
+        try:
+            # Same cache entry as GET /analytics/forecast with the default parameters
+            params = {"start": start, "months": 12, "group_by": "rncp", "absence_rate": None, "slippage_days": 0}
+            forecast = analytics_cache.get_or_compute(
+                tenant_id, "forecast", params, lambda: ForecastService().forecast(db, tenant_id, **params)
+            )
+            conflicts = ConflictService().detect(db, tenant_id)
+            return {
+                "ca_prevu_12_mois": forecast["total"],
+                "conflits": len(conflicts["chevauchements"]) + len(conflicts["hors_contrat"]),
+            }
+        finally:
+            db.close()
+
+    def dashboard_all_shards(self) -> List[Dict[str, Any]]:
+        def owned_rows(db: Session):
+            # Every shard lists all the tenants it ever held: keep the ones living there
+            return [row for row in self.dashboard_by_tenant(db) if shard_router.owns(db.get_bind(), row["tenant_id"])]
+
+        rows = [row for shard_rows in shard_router.fan_out(owned_rows).values() for row in shard_rows]
+        return sorted(rows, key=lambda row: row["tenant_id"])
+
+    def report(self, details: bool = True, start: date = None) -> List[Dict[str, Any]]:
+        rows = self.dashboard_all_shards()
+        if details:
+            start = start or date.today()
+            futures = {row["tenant_id"]: _executor.submit(self.heavy_metrics, row["tenant_id"], start) for row in rows}
+            for row in rows:
+                try:
+                    row.update(futures[row["tenant_id"]].result())
+                except Exception as e:
+                    # One failing tenant must not take the platform report down
+                    print(f"Operator report: tenant {row['tenant_id']} failed: {e}")
+                    row.update({"ca_prevu_12_mois": None, "conflits": None})
+        return rows
@@ -0,0 +1,179 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, case, or_, update
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from models import (AnalyticsDailySnapshot, AnalyticsRollupState, Attendance, AttendanceStatus,
+                    Candidat, CandidatStatus, ContratVersion, Invoice, InvoiceStatus, SessionDay)
+from services.aggregates import dialect_insert
+
+PIPELINE_COLUMNS = {
+    CandidatStatus.NOUVEAU: "candidats_nouveau",
+    CandidatStatus.ADMISSIBLE: "candidats_admissible",
+    CandidatStatus.ENTRETIEN: "candidats_entretien",
+    CandidatStatus.PLACE: "candidats_place",
+    CandidatStatus.REJETE: "candidats_rejete",
+}
+METRIC_COLUMNS = ("contrats_actifs", "heures_realisees", "montant_facture")
+
+class RollupService:
+    """
+    Snapshots quotidiens des KPIs (AnalyticsDailySnapshot).
+
+    Writes call mark_dirty(day) in their transaction; refresh() then recomputes
+    only [dirty_from, today] with a handful of grouped queries and one bulk upsert
+    (the scheduler's rollup-refresh job, or POST /analytics/daily/refresh).
+    backfill() rebuilds the whole history the same way.
+    """
+
+    def mark_dirty(self, db: Session, tenant_id: int, day: Optional[date]):
+        """Records that KPIs from `day` onwards must be recomputed (keeps the earliest day)."""
+        if day is None:
+            return
+        stmt = dialect_insert(db, AnalyticsRollupState).values(tenant_id=tenant_id, dirty_from=day, dirty_version=1)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["tenant_id"],
+            set_={
+                "dirty_from": case(
+                    (or_(AnalyticsRollupState.dirty_from.is_(None), stmt.excluded.dirty_from < AnalyticsRollupState.dirty_from),
+                     stmt.excluded.dirty_from),
+                    else_=AnalyticsRollupState.dirty_from
+                ),
+                # Even when dirty_from does not move: tells a running refresh its range is stale
+                "dirty_version": AnalyticsRollupState.dirty_version + 1,
+            }
+        )
+        db.execute(stmt)
+
+    def refresh(self, db: Session, tenant_id: int, today: Optional[date] = None) -> int:
+        """Incremental refresh: recomputes the dirty days (today is always refreshed)."""
+        count = self._refresh(db, tenant_id, today or date.today())
+        db.commit()
+        return count
+
+    def tick(self, db: Session, now: datetime) -> Dict[str, Any]:
+        """Scheduler job: refreshes every tenant of the shard. No commit here, the scheduler owns the transaction."""
+        from sharding import shard_router
+        refreshed = {}
+        for tenant_id in shard_router.writable_tenants(db):
+            refreshed[tenant_id] = self._refresh(db, tenant_id, now.date())
+        return {"tenants": len(refreshed), "jours": sum(refreshed.values())}
+
+    def _refresh(self, db: Session, tenant_id: int, today: date) -> int:
+        state = db.query(AnalyticsRollupState.dirty_from, AnalyticsRollupState.dirty_version)\
+            .filter(AnalyticsRollupState.tenant_id == tenant_id).first()
+        dirty_from, version = state if state else (None, None)
+        start = min(dirty_from, today) if dirty_from else today
+
+        count = self._rebuild_range(db, tenant_id, start, today, today)
+
+        # Compare-and-set on the version read above: a mark_dirty committed during the
+        # recomputation (even on a later day) bumped it, so its marker is kept
+        if state is None:
+            stmt = dialect_insert(db, AnalyticsRollupState).values(
+                tenant_id=tenant_id, dirty_from=None, dirty_version=0, last_refreshed_at=datetime.utcnow()
+            )
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=["tenant_id"], set_={"last_refreshed_at": stmt.excluded.last_refreshed_at}
+            ))
+        else:
+            db.execute(update(AnalyticsRollupState).where(AnalyticsRollupState.tenant_id == tenant_id).values(
+                dirty_from=case((AnalyticsRollupState.dirty_version == version, None), else_=AnalyticsRollupState.dirty_from),
+                last_refreshed_at=datetime.utcnow()
+            ))
+        return count
+
+    def backfill(self, db: Session, tenant_id: int, start: Optional[date] = None, today: Optional[date] = None) -> int:
+        """Bulk rebuild of every day since `start` (default: first contract, session day or invoice)."""
+        today = today or date.today()
+        if start is None:
+            candidates = [
+                db.query(func.min(ContratVersion.date_debut)).filter(ContratVersion.tenant_id == tenant_id).scalar(),
+                db.query(func.min(SessionDay.date)).join(Attendance, Attendance.session_day_id == SessionDay.id)
+                    .filter(Attendance.tenant_id == tenant_id).scalar(),
+                db.query(func.min(Invoice.date_emission)).filter(Invoice.tenant_id == tenant_id).scalar(),
+            ]
+            candidates = [d for d in candidates if d]
+            start = min(candidates) if candidates else today
+
+        count = self._rebuild_range(db, tenant_id, min(start, today), today, today)
+        db.execute(update(AnalyticsRollupState).where(AnalyticsRollupState.tenant_id == tenant_id)
+                   .values(dirty_from=None, last_refreshed_at=datetime.utcnow()))
+        db.commit()
+        return count
+
+    def time_series(self, db: Session, tenant_id: int, start: date, end: date) -> List[AnalyticsDailySnapshot]:
+        return db.query(AnalyticsDailySnapshot).filter(
+            AnalyticsDailySnapshot.tenant_id == tenant_id,
+            AnalyticsDailySnapshot.day >= start,
+            AnalyticsDailySnapshot.day <= end
+        ).order_by(AnalyticsDailySnapshot.day).all()
+
+    def _rebuild_range(self, db: Session, tenant_id: int, start: date, end: date, today: date) -> int:
+        days = (end - start).days + 1
+        if days <= 0:
+            return 0
+
+        # 1. Active contracts per day: difference array over the contract windows
+        delta = [0] * (days + 1)
+        windows = db.query(ContratVersion.date_debut, ContratVersion.date_fin).filter(
+            ContratVersion.tenant_id == tenant_id,
+            ContratVersion.is_active == True,
+            ContratVersion.date_debut <= end,
+            ContratVersion.date_fin >= start
+        ).all()
+        for debut, fin in windows:
+            delta[(max(debut, start) - start).days] += 1
+            delta[(min(fin, end) - start).days + 1] -= 1
+
+        # 2. Realized hours per day (3.5h per half day)
+        hours = dict(db.query(
+            SessionDay.date,
+            func.sum(case((SessionDay.is_morning & SessionDay.is_afternoon, 7.0), else_=3.5))
+        ).join(Attendance, Attendance.session_day_id == SessionDay.id).filter(
+            Attendance.tenant_id == tenant_id,
+            Attendance.status == AttendanceStatus.PRESENT,
+            SessionDay.date >= start,
+            SessionDay.date <= end
+        ).group_by(SessionDay.date).all())
+
+        # 3. Invoiced amount per emission day
+        invoiced = dict(db.query(Invoice.date_emission, func.sum(Invoice.montant_ht)).filter(
+            Invoice.tenant_id == tenant_id,
+            Invoice.statut.in_([InvoiceStatus.EMISE, InvoiceStatus.PAYEE]),
+            Invoice.date_emission >= start,
+            Invoice.date_emission <= end
+        ).group_by(Invoice.date_emission).all())
+
+        # 4. Candidate pipeline: only observable today
+        pipeline = {}
+        if start <= today <= end:
+            counts = dict(db.query(Candidat.statut, func.count(Candidat.id))
+                          .filter(Candidat.tenant_id == tenant_id).group_by(Candidat.statut).all())
+            pipeline = {column: counts.get(status, 0) for status, column in PIPELINE_COLUMNS.items()}
+
+        rows = []
+        active = 0
+        for i in range(days):
+            day = start + timedelta(days=i)
+            active += delta[i]
+            row = {
+                "tenant_id": tenant_id,
+                "day": day,
+                "contrats_actifs": active,
+                "heures_realisees": hours.get(day, 0),
+                "montant_facture": invoiced.get(day, 0),
+            }
+            for column in PIPELINE_COLUMNS.values():
+                row[column] = pipeline.get(column) if day == today else None
+            rows.append(row)
+
+        # Bulk upsert; past pipeline counts are kept (COALESCE) since they cannot be recomputed
+        stmt = dialect_insert(db, AnalyticsDailySnapshot)
+        set_ = {column: stmt.excluded[column] for column in METRIC_COLUMNS}
+        set_.update({
+            column: func.coalesce(stmt.excluded[column], getattr(AnalyticsDailySnapshot, column))
+            for column in PIPELINE_COLUMNS.values()
+        })
+        db.execute(stmt.on_conflict_do_update(index_elements=["tenant_id", "day"], set_=set_), rows)
+        return len(rows)
@@ -0,0 +1,158 @@
+"""
+Scheduler in-process (asyncio), sans broker.
+
+Jobs are registered in code; their schedule lives in the scheduled_jobs table so
+every API worker shares it. Each poll, a worker runs the due jobs one by one:
+  1. PostgreSQL: pg_try_advisory_xact_lock(job) - another worker running it => skip
+  2. claim: UPDATE ... SET next_run_at = now + interval WHERE next_run_at <= now
+     (rowcount 0 => already run by someone else for this period)
+  3. the job runs in the same transaction, then everything commits together.
+Jobs must be idempotent: a crash after the claim simply rolls the claim back.
+With several shards (sharding.py) the job then runs on each other shard, one
+commit per shard. A shard can hold rows of tenants it no longer owns (move-tenant
+--keep-source, or a copy in progress): jobs only write the tenants returned by
+shard_router.writable_tenants(db).
+"""
+from sqlalchemy import update, select, func, or_
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import json
+import os
+import time
+import zlib
+
+from database import SessionLocal
+from sharding import shard_router, DEFAULT_SHARD
+from models import ScheduledJob
+from services.aggregates import dialect_insert
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "0") == "1"
+SCHEDULER_POLL_SECONDS = int(os.getenv("SCHEDULER_POLL_SECONDS", "60"))
+ROLLUP_REFRESH_SECONDS = int(os.getenv("ROLLUP_REFRESH_SECONDS", "600"))
+
+class Job:
+    def __init__(self, name: str, interval_seconds: int, func: Callable[[Session, datetime], Any]):
+        self.name = name
+        self.interval_seconds = interval_seconds
+        self.func = func
+        # Stable across processes (hash() is salted per process)
+        self.lock_key = zlib.crc32(name.encode())
+
+class Scheduler:
+    def __init__(self, poll_seconds: int = SCHEDULER_POLL_SECONDS):
+        self.poll_seconds = poll_seconds
+        self.jobs: Dict[str, Job] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, name: str, interval_seconds: int, func: Callable[[Session, datetime], Any]):
+        self.jobs[name] = Job(name, interval_seconds, func)
+
+    def run_pending(self, now: Optional[datetime] = None) -> List[str]:
+        """Runs every due job once (synchronous). Returns the names of the jobs this worker ran."""
+        now = now or datetime.utcnow()
+        ran = []
+        for job in self.jobs.values():
+            if self._run_job(job, now):
+                ran.append(job.name)
+        return ran
+
+    def _run_job(self, job: Job, now: datetime) -> bool:
+        db = SessionLocal()
+        try:
+            db.execute(dialect_insert(db, ScheduledJob).values(
+                name=job.name, interval_seconds=job.interval_seconds
+            ).on_conflict_do_nothing(index_elements=["name"]))
+
+            if db.get_bind().dialect.name == "postgresql":
+                if not db.execute(select(func.pg_try_advisory_xact_lock(job.lock_key))).scalar():
+                    db.rollback()
+                    return False
+
+            claimed = db.execute(update(ScheduledJob).where(
+                ScheduledJob.name == job.name,
+                or_(ScheduledJob.next_run_at.is_(None), ScheduledJob.next_run_at <= now)
+            ).values(
+                next_run_at=now + timedelta(seconds=job.interval_seconds),
+                interval_seconds=job.interval_seconds
+            )).rowcount
+            if not claimed:
+                db.rollback()
+                return False
+
+            started = time.perf_counter()
+            try:
+                result = job.func(db, now)
+                if len(shard_router.shards) > 1:
+                    result = {DEFAULT_SHARD: result, **self._run_on_other_shards(job, now)}
+            except Exception as e:
+                db.rollback()
+                print(f"Scheduler: job {job.name} failed: {e}")
+                # Failed run: keep the schedule moving, retried at the next interval
+                db.execute(update(ScheduledJob).where(ScheduledJob.name == job.name).values(
+                    next_run_at=now + timedelta(seconds=job.interval_seconds),
+                    last_run_at=now,
+                    last_status="ERROR",
+                    last_result=str(e)[:1000],
+                    last_duration_ms=int((time.perf_counter() - started) * 1000)
+                ))
+                db.commit()
+                return True
+
+            db.execute(update(ScheduledJob).where(ScheduledJob.name == job.name).values(
+                last_run_at=now,
+                last_status="OK",
+                last_result=json.dumps(result, default=str),
+                last_duration_ms=int((time.perf_counter() - started) * 1000)
+            ))
+            db.commit()
+            return True
+        finally:
+            db.close()
+
+    def _run_on_other_shards(self, job: Job, now: datetime) -> Dict[str, Any]:
+        """The claim lives on the default shard; the other shards run the job in their own transaction."""
+        results = {}
+        for shard in shard_router.all():
+            if shard is shard_router.default:
+                continue
+            db = shard.session()
+            try:
+                results[shard.name] = job.func(db, now)
+                db.commit()
+            finally:
+                db.close()
+        return results
+
+    async def run_forever(self):
+        while True:
+            try:
+                # Jobs use the blocking DB driver: keep them off the event loop
+                await asyncio.to_thread(self.run_pending)
+            except Exception as e:
+                print(f"Scheduler: tick failed: {e}")
+            await asyncio.sleep(self.poll_seconds)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+def _build_scheduler() -> Scheduler:
+    from services.survey_dispatch_service import SurveyDispatchService
+    from services.rollup_service import RollupService
+    instance = Scheduler()
+    instance.register("survey-dispatch", 3600, SurveyDispatchService().tick)
+    instance.register("rollup-refresh", ROLLUP_REFRESH_SECONDS, RollupService().tick)
+    return instance
+
+scheduler = _build_scheduler()
@@ -0,0 +1,89 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import or_
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+import os
+
+from models import ContratVersion, SurveyDispatch, SurveyDispatchStatus, SurveyType
+from services.aggregates import dialect_insert, days_since
+
+# Milestones older than this are not enqueued (first deployment, scheduler downtime)
+SURVEY_LOOKBACK_DAYS = int(os.getenv("SURVEY_LOOKBACK_DAYS", "14"))
+DISPATCH_BATCH_SIZE = 500
+
+def survey_milestones(debut: date, fin: date) -> List[Tuple[SurveyType, date]]:
+    """J30 (skipped for contracts shorter than 30 days), mi-parcours, fin de contrat."""
+    milestones = []
+    j30 = debut + timedelta(days=30)
+    if j30 <= fin:
+        milestones.append((SurveyType.J30, j30))
+    milestones.append((SurveyType.MID_TERM, debut + (fin - debut) / 2))
+    milestones.append((SurveyType.END, fin))
+    return milestones
+
+class SurveyDispatchService:
+    """
+    Enqueues the J30 / MID_TERM / END surveys that fell due. Idempotent: the
+    (contrat_version_id, type) unique constraint + ON CONFLICT DO NOTHING make
+    a replayed or concurrent tick a no-op.
+    """
+
+    def tick(self, db: Session, now: datetime) -> Dict[str, Any]:
+        """Scheduler job: no commit here, the scheduler owns the transaction."""
+        from sharding import shard_router
+        tenant_ids = shard_router.writable_tenants(db)
+        today = now.date()
+        since = today - timedelta(days=SURVEY_LOOKBACK_DAYS)
+
+        # Only the contracts with a milestone in [since, today], in one query:
+        # END on date_fin (idx_contrats_versions_active_date_fin), J30 on date_debut,
+        # mid-term debut + (fin - debut) // 2, i.e. (debut - since) + (fin - since) in [0, 2 * window + 1]
+        window = (today - since).days
+        versions = db.query(
+            ContratVersion.id, ContratVersion.tenant_id, ContratVersion.date_debut, ContratVersion.date_fin
+        ).filter(
+            ContratVersion.tenant_id.in_(tenant_ids),
+            ContratVersion.is_active == True,
+            ContratVersion.date_fin >= since,
+            ContratVersion.date_debut <= today,
+            or_(
+                ContratVersion.date_fin <= today,
+                ContratVersion.date_debut.between(since - timedelta(days=30), today - timedelta(days=30)),
+                (days_since(db, ContratVersion.date_debut, since)
+                 + days_since(db, ContratVersion.date_fin, since)).between(0, 2 * window + 1)
+            )
+        ).all()
+
+        due = []
+        for version_id, tenant_id, debut, fin in versions:
+            for survey_type, due_date in survey_milestones(debut, fin):
+                if since <= due_date <= today:
+                    due.append({
+                        "tenant_id": tenant_id,
+                        "contrat_version_id": version_id,
+                        "type": survey_type,
+                        "due_date": due_date,
+                        "status": SurveyDispatchStatus.PENDING,
+                        "created_at": now,
+                    })
+
+        enqueued = 0
+        for i in range(0, len(due), DISPATCH_BATCH_SIZE):
+            # One multi-row INSERT per batch (rowcount = rows actually inserted)
+            stmt = dialect_insert(db, SurveyDispatch).values(due[i:i + DISPATCH_BATCH_SIZE])
+            result = db.execute(stmt.on_conflict_do_nothing(index_elements=["contrat_version_id", "type"]))
+            enqueued += result.rowcount
+
+        return {"contrats": len(versions), "echeances": len(due), "nouvelles": enqueued}
+
+    def list(
+        self,
+        db: Session,
+        tenant_id: int,
+        status: Optional[SurveyDispatchStatus] = None,
+        limit: int = 200
+    ) -> List[SurveyDispatch]:
+        query = db.query(SurveyDispatch).filter(SurveyDispatch.tenant_id == tenant_id)
+        if status:
+            query = query.filter(SurveyDispatch.status == status)
+        return query.order_by(SurveyDispatch.due_date, SurveyDispatch.id).limit(limit).all()
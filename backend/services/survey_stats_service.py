@@ -0,0 +1,124 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, case, cast, select, insert, String
+from datetime import date
+from typing import Any, Dict, Optional
+
+from models import ContratVersion, Survey, SurveyAggregate, SurveyType
+from services.aggregates import increment_counters, month_start
+
+SCORE_COLUMNS = tuple(f"score_{n}" for n in range(1, 11))
+NO_SESSION = 0
+
+class SurveyStatsService:
+    """
+    Statistiques des enquêtes de satisfaction (Qualiopi).
+    Each answer increments SurveyAggregate (count, sum, one histogram column per score)
+    in its own transaction; reads sum a handful of counter rows whatever the volume.
+    """
+
+    def record(self, db: Session, survey: Survey):
+        """Counts one answer. Same transaction as the Survey insert (no commit here)."""
+        increment_counters(
+            db,
+            SurveyAggregate,
+            key={
+                "tenant_id": survey.tenant_id,
+                "type": survey.type.value,
+                "month": survey.created_at.date().replace(day=1),
+                "session_id": survey.session_id or NO_SESSION,
+            },
+            deltas={"response_count": 1, "score_sum": survey.score, f"score_{survey.score}": 1}
+        )
+
+    def rebuild(self, db: Session, tenant_id: Optional[int] = None) -> int:
+        """Backfill: recomputes every aggregate row from the surveys with one INSERT ... SELECT."""
+        delete_query = db.query(SurveyAggregate)
+        if tenant_id is not None:
+            delete_query = delete_query.filter(SurveyAggregate.tenant_id == tenant_id)
+        delete_query.delete(synchronize_session=False)
+
+        month = month_start(db, Survey.created_at)
+        survey_type = cast(Survey.type, String)
+        session_id = func.coalesce(Survey.session_id, NO_SESSION)
+        source = select(
+            Survey.tenant_id, survey_type, month, session_id,
+            func.count(Survey.id),
+            func.sum(Survey.score),
+            *[func.sum(case((Survey.score == n, 1), else_=0)) for n in range(1, 11)]
+        ).where(Survey.score.between(1, 10))\
+         .group_by(Survey.tenant_id, survey_type, month, session_id)
+        if tenant_id is not None:
+            source = source.where(Survey.tenant_id == tenant_id)
+
+        result = db.execute(insert(SurveyAggregate).from_select(
+            ["tenant_id", "type", "month", "session_id", "response_count", "score_sum", *SCORE_COLUMNS],
+            source
+        ))
+        db.commit()
+        return result.rowcount
+
+    def stats(
+        self,
+        db: Session,
+        tenant_id: int,
+        start: date,
+        end: date,
+        session_id: Optional[int] = None,
+        by_session: bool = False
+    ) -> Dict[str, Any]:
+        """Average, distribution, NPS and response rate per survey type (and per session)."""
+        group = [SurveyAggregate.type] + ([SurveyAggregate.session_id] if by_session else [])
+        query = db.query(
+            *group,
+            func.sum(SurveyAggregate.response_count),
+            func.sum(SurveyAggregate.score_sum),
+            *[func.sum(getattr(SurveyAggregate, column)) for column in SCORE_COLUMNS]
+        ).filter(
+            SurveyAggregate.tenant_id == tenant_id,
+            SurveyAggregate.month >= start.replace(day=1),
+            SurveyAggregate.month <= end
+        )
+        if session_id is not None:
+            query = query.filter(SurveyAggregate.session_id == session_id)
+        rows = query.group_by(*group).all()
+
+        # Response rate denominator: contracts active during the period (per session)
+        contracts = db.query(
+            *([ContratVersion.session_id] if by_session else []),
+            func.count(ContratVersion.id)
+        ).filter(
+            ContratVersion.tenant_id == tenant_id,
+            ContratVersion.is_active == True,
+            ContratVersion.date_debut <= end,
+            ContratVersion.date_fin >= start
+        )
+        if session_id is not None:
+            contracts = contracts.filter(ContratVersion.session_id == session_id)
+        if by_session:
+            expected = {sid or NO_SESSION: n for sid, n in contracts.group_by(ContratVersion.session_id).all()}
+        else:
+            expected = {None: contracts.scalar() or 0}
+
+        lines = []
+        for row in rows:
+            survey_type, session = row[0], (row[1] if by_session else None)
+            count, total, *histogram = row[(2 if by_session else 1):]
+            distribution = {n: int(v or 0) for n, v in zip(range(1, 11), histogram)}
+            promoters = distribution[9] + distribution[10]
+            detractors = sum(distribution[n] for n in range(1, 7))
+            respondents = expected.get(session, 0)
+            line = {
+                "type": survey_type,
+                "reponses": int(count),
+                "moyenne": round(total / count, 2) if count else None,
+                "distribution": distribution,
+                "nps": round((promoters - detractors) / count * 100, 1) if count else None,
+                "taux_reponse": round(count / respondents * 100, 1) if respondents else None,
+            }
+            if by_session:
+                line["session_id"] = session or None
+            lines.append(line)
+
+        order = {t.value: i for i, t in enumerate(SurveyType)}
+        lines.sort(key=lambda l: (order.get(l["type"], len(order)), l.get("session_id") or 0))
+        return {"debut": start.replace(day=1), "fin": end, "lignes": lines}
@@ -0,0 +1,102 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, case
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List
+
+from models import (Attendance, AttendanceMonthlySummary, AttendanceStatus, Candidat, ContratVersion,
+                    Invoice, InvoiceStatus, SessionDay)
+from services.aggregates import date_bucket
+
+METRICS = ("ca_facture", "heures_realisees", "nouveaux_candidats", "debuts_contrat")
+
+def bucket_start(day: date, granularity: str) -> date:
+    """Python twin of aggregates.date_bucket (used for the range bounds and gap filling)."""
+    if granularity == "day":
+        return day
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    if granularity == "quarter":
+        return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    return day.replace(month=1, day=1)
+
+def next_bucket(day: date, granularity: str) -> date:
+    if granularity == "day":
+        return day + timedelta(days=1)
+    if granularity == "week":
+        return day + timedelta(days=7)
+    step = {"month": 1, "quarter": 3, "year": 12}[granularity]
+    month = day.month - 1 + step
+    return day.replace(year=day.year + month // 12, month=month % 12 + 1, day=1)
+
+def _as_date(value) -> date:
+    # date_trunc returns a date on PostgreSQL, date() a 'YYYY-MM-DD' string on SQLite
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+class TimeseriesService:
+    """
+    Séries temporelles par période (jour, semaine, mois, trimestre, année).
+    One grouped query per metric on a (tenant_id, date) index, truncated in SQL;
+    empty periods are filled with 0 here so the series is continuous.
+    """
+
+    def series(self, db: Session, tenant_id: int, metric: str, granularity: str, start: date, end: date) -> List[Dict[str, Any]]:
+        first, last = bucket_start(start, granularity), bucket_start(end, granularity)
+        upper = next_bucket(last, granularity) # Exclusive bound, covers the whole last period
+        values = {_as_date(bucket): value for bucket, value in self._grouped(db, tenant_id, metric, granularity, first, upper)}
+
+        points = []
+        bucket = first
+        while bucket <= last:
+            value = values.get(bucket) or 0
+            points.append({"periode": bucket, "valeur": float(value) if metric in ("ca_facture", "heures_realisees") else int(value)})
+            bucket = next_bucket(bucket, granularity)
+        return points
+
+    def _grouped(self, db: Session, tenant_id: int, metric: str, granularity: str, first: date, upper: date):
+        if metric == "ca_facture":
+            bucket = date_bucket(db, Invoice.date_emission, granularity)
+            return db.query(bucket, func.sum(Invoice.montant_ht)).filter(
+                Invoice.tenant_id == tenant_id,
+                Invoice.statut.in_([InvoiceStatus.EMISE, InvoiceStatus.PAYEE]),
+                Invoice.date_emission >= first,
+                Invoice.date_emission < upper
+            ).group_by(bucket).all()
+
+        if metric == "heures_realisees":
+            if granularity in ("month", "quarter", "year"):
+                # Monthly summary: a few rows per contract instead of every attendance
+                bucket = date_bucket(db, AttendanceMonthlySummary.month, granularity)
+                return db.query(bucket, func.sum(AttendanceMonthlySummary.realized_hours)).filter(
+                    AttendanceMonthlySummary.tenant_id == tenant_id,
+                    AttendanceMonthlySummary.month >= first,
+                    AttendanceMonthlySummary.month < upper
+                ).group_by(bucket).all()
+            bucket = date_bucket(db, SessionDay.date, granularity)
+            return db.query(
+                bucket,
+                func.sum(case((SessionDay.is_morning & SessionDay.is_afternoon, 7.0), else_=3.5))
+            ).join(Attendance, Attendance.session_day_id == SessionDay.id).filter(
+                Attendance.tenant_id == tenant_id,
+                Attendance.status == AttendanceStatus.PRESENT,
+                SessionDay.date >= first,
+                SessionDay.date < upper
+            ).group_by(bucket).all()
+
+        if metric == "nouveaux_candidats":
+            bucket = date_bucket(db, Candidat.created_at, granularity)
+            return db.query(bucket, func.count(Candidat.id)).filter(
+                Candidat.tenant_id == tenant_id,
+                Candidat.created_at >= datetime.combine(first, datetime.min.time()),
+                Candidat.created_at < datetime.combine(upper, datetime.min.time())
+            ).group_by(bucket).all()
+
+        # debuts_contrat: first version of each dossier (avenants are not new contracts)
+        bucket = date_bucket(db, ContratVersion.date_debut, granularity)
+        return db.query(bucket, func.count(ContratVersion.id)).filter(
+            ContratVersion.tenant_id == tenant_id,
+            ContratVersion.version_number == 1,
+            ContratVersion.date_debut >= first,
+            ContratVersion.date_debut < upper
+        ).group_by(bucket).all()
@@ -0,0 +1,296 @@
+"""
+Tenant -> database sharding.
+
+Every shard is a full copy of the schema holding a subset of the tenants. The
+DATABASE_URL database is the "default" shard and the directory: tenant_shards maps
+a tenant to its shard, tenants absent from it live on "default". Extra shards come
+from DATABASE_SHARDS, a JSON object {"name": "postgresql://..."}.
+
+- Request sessions (database.get_db & co) use the shard of the token's tenant.
+- Cross-tenant work fans out: login (email lookup), operator report, scheduler jobs.
+- move_tenant() (manage.py move-tenant): the tenant turns read-only, its rows are
+  bulk-copied table by table, the directory switches, then the source rows go.
+
+Primary keys are kept when copying: give every shard its own id range
+(manage.py init-shard --id-start) so moved rows never collide.
+"""
+from sqlalchemy import create_engine, select, insert, delete, exists, func, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import Session
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import json
+import os
+import threading
+import time
+
+from database import (engine, async_engine, async_url, pool_options, Base, SessionLocal, AsyncSessionLocal,
+                      InstrumentedQueuePool, InstrumentedAsyncPool)
+
+DEFAULT_SHARD = "default"
+DATABASE_SHARDS: Dict[str, str] = json.loads(os.getenv("DATABASE_SHARDS") or "{}")
+# Directory cache: a move waits this long between steps so every worker sees it
+SHARD_MAP_TTL = int(os.getenv("SHARD_MAP_TTL", "30"))
+SHARD_FANOUT_WORKERS = int(os.getenv("SHARD_FANOUT_WORKERS", "8"))
+MOVE_BATCH_SIZE = 5000
+
+# Global state, never moved with a tenant
+GLOBAL_TABLES = ("scheduled_jobs", "tenant_shards")
+
+_executor = ThreadPoolExecutor(max_workers=SHARD_FANOUT_WORKERS, thread_name_prefix="shard")
+
+class Shard:
+    def __init__(self, name: str, engine, async_engine):
+        self.name = name
+        self.engine = engine
+        self.async_engine = async_engine
+
+    def session(self) -> Session:
+        return SessionLocal(bind=self.engine)
+
+class ShardRouter:
+    def __init__(self, urls: Dict[str, str]):
+        self.shards: Dict[str, Shard] = {DEFAULT_SHARD: Shard(DEFAULT_SHARD, engine, async_engine)}
+        for name, url in urls.items():
+            self.add_shard(name, url)
+        self._directory: Dict[int, Tuple[str, bool]] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def default(self) -> Shard:
+        return self.shards[DEFAULT_SHARD]
+
+    def add_shard(self, name: str, url: str) -> Shard:
+        shard = Shard(
+            name,
+            create_engine(url, **pool_options(url, InstrumentedQueuePool, f"shard-{name}")),
+            create_async_engine(async_url(url), **pool_options(async_url(url), InstrumentedAsyncPool, f"shard-{name}-async"))
+        )
+        self.shards[name] = shard
+        self.invalidate()
+        return shard
+
+    def all(self) -> List[Shard]:
+        return list(self.shards.values())
+
+    # --- Directory ---
+
+    def _stale(self) -> bool:
+        # Single database: nothing to look up
+        return len(self.shards) > 1 and (self._loaded_at is None or time.monotonic() - self._loaded_at > SHARD_MAP_TTL)
+
+    def _load(self, rows):
+        with self._lock:
+            self._directory = {tenant_id: (shard, bool(moving)) for tenant_id, shard, moving in rows}
+            self._loaded_at = time.monotonic()
+
+    def refresh(self):
+        from models import TenantShard
+        with SessionLocal() as db:
+            self._load(db.execute(select(TenantShard.tenant_id, TenantShard.shard, TenantShard.moving)).all())
+
+    async def refresh_async(self):
+        from models import TenantShard
+        async with AsyncSessionLocal() as db:
+            self._load((await db.execute(select(TenantShard.tenant_id, TenantShard.shard, TenantShard.moving))).all())
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def _lookup(self, tenant_id: int) -> Tuple[Shard, bool]:
+        name, moving = self._directory.get(tenant_id, (DEFAULT_SHARD, False))
+        if name not in self.shards:
+            raise RuntimeError(f"Tenant {tenant_id} is mapped to unknown shard {name!r} (DATABASE_SHARDS)")
+        return self.shards[name], moving
+
+    def route(self, tenant_id: int) -> Tuple[Shard, bool]:
+        """(shard, moving) of a tenant."""
+        if self._stale():
+            self.refresh()
+        return self._lookup(tenant_id)
+
+    async def route_async(self, tenant_id: int) -> Tuple[Shard, bool]:
+        if self._stale():
+            await self.refresh_async()
+        return self._lookup(tenant_id)
+
+    def shard_for(self, tenant_id: int) -> Shard:
+        return self.route(tenant_id)[0]
+
+    def owns(self, bind, tenant_id: int) -> bool:
+        """True if the tenant lives on the database of `bind` (engine of a fan-out session)."""
+        return self.shard_for(tenant_id).engine is bind
+
+    def writable_tenants(self, db: Session) -> List[int]:
+        """
+        Tenants a scheduler job may write on the database of `db`: those it owns (a
+        moved tenant can leave a copy behind, --keep-source) and that are not being
+        moved (rows written during the copy would be lost).
+        """
+        from models import Tenant
+        if len(self.shards) > 1:
+            self.refresh()
+        bind = db.get_bind()
+        tenant_ids = []
+        for (tenant_id,) in db.query(Tenant.id).order_by(Tenant.id):
+            shard, moving = self._lookup(tenant_id)
+            if shard.engine is bind and not moving:
+                tenant_ids.append(tenant_id)
+        return tenant_ids
+
+    # --- Fan-out ---
+
+    def fan_out(self, fn: Callable[[Session], Any]) -> Dict[str, Any]:
+        """Runs fn(session) on every shard concurrently; {shard name: result}."""
+        def run(shard: Shard):
+            db = shard.session()
+            try:
+                return fn(db)
+            finally:
+                db.close()
+
+        if len(self.shards) == 1:
+            return {DEFAULT_SHARD: run(self.default)}
+        futures = {name: _executor.submit(run, shard) for name, shard in self.shards.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+shard_router = ShardRouter(DATABASE_SHARDS)
+
+def create_all_shards():
+    from migrations import upgrade
+    for shard in shard_router.all():
+        Base.metadata.create_all(bind=shard.engine)
+        # Columns / indexes added to tables that already existed
+        upgrade(shard.engine)
+
+# --- Moving a tenant ---
+
+def set_directory(tenant_id: int, shard: str, moving: bool):
+    from models import TenantShard
+    from services.aggregates import dialect_insert
+    with SessionLocal() as db:
+        values = {"shard": shard, "moving": moving, "updated_at": datetime.utcnow()}
+        db.execute(dialect_insert(db, TenantShard).values(tenant_id=tenant_id, **values)
+                   .on_conflict_do_update(index_elements=["tenant_id"], set_=values))
+        db.commit()
+    shard_router.invalidate()
+
+def tenant_tables():
+    """Tables holding tenant rows, parents first."""
+    return [t for t in Base.metadata.sorted_tables if t.name not in GLOBAL_TABLES]
+
+def tenant_filter(table, tenant_id: int):
+    """WHERE clause selecting the rows of a tenant in `table`."""
+    if table.name == "tenants":
+        return table.c.id == tenant_id
+    if "tenant_id" in table.c:
+        return table.c.tenant_id == tenant_id
+    # Child table without tenant_id (session_days, regulatory_reads): through its parent
+    for fk in table.foreign_keys:
+        parent = fk.column.table
+        if "tenant_id" in parent.c:
+            return fk.parent.in_(select(fk.column).where(parent.c.tenant_id == tenant_id))
+    raise ValueError(f"No tenant path for table {table.name}")
+
+def _check_id_ranges(src, dst, tenant_id: int):
+    """Refuses the move if the target already uses ids in the range of the copied rows."""
+    for table in tenant_tables():
+        if table.name == "tenants" or "id" not in table.c or list(table.primary_key) != [table.c.id]:
+            continue
+        low, high = src.execute(
+            select(func.min(table.c.id), func.max(table.c.id)).where(tenant_filter(table, tenant_id))
+        ).one()
+        if low is None:
+            continue
+        if dst.execute(select(exists().where(table.c.id.between(low, high)))).scalar():
+            raise ValueError(
+                f"{table.name}: ids {low}-{high} already used on the target shard "
+                f"(give each shard its own id range: manage.py init-shard --id-start)"
+            )
+
+def _bump_sequences(dst):
+    """PostgreSQL: keep the target sequences above the copied ids."""
+    if dst.dialect.name != "postgresql":
+        return
+    for table in tenant_tables():
+        if "id" not in table.c or list(table.primary_key) != [table.c.id]:
+            continue
+        sequence = dst.execute(text("SELECT pg_get_serial_sequence(:t, 'id')"), {"t": table.name}).scalar()
+        if sequence:
+            dst.execute(text(
+                f"SELECT setval('{sequence}', GREATEST((SELECT COALESCE(MAX(id), 1) FROM {table.name}), "
+                f"(SELECT last_value FROM {sequence})))"
+            ))
+
+def move_tenant(
+    tenant_id: int,
+    target_name: str,
+    batch_size: int = MOVE_BATCH_SIZE,
+    keep_source: bool = False,
+    wait_seconds: Optional[float] = None,
+    log: Callable[[str], None] = print
+) -> Dict[str, int]:
+    """Copies every row of the tenant to `target_name`, switches the directory, deletes the source rows."""
+    wait_seconds = SHARD_MAP_TTL if wait_seconds is None else wait_seconds
+    shard_router.invalidate()
+    source = shard_router.shard_for(tenant_id)
+    if target_name not in shard_router.shards:
+        raise ValueError(f"Unknown shard {target_name!r}")
+    target = shard_router.shards[target_name]
+    if source is target:
+        raise ValueError(f"Tenant {tenant_id} already lives on {target_name}")
+
+    # 1. Read-only: writes get 503 once every worker has reloaded the directory
+    set_directory(tenant_id, source.name, moving=True)
+    log(f"Tenant {tenant_id}: read-only, waiting {wait_seconds}s for the workers")
+    time.sleep(wait_seconds)
+
+    copied = {}
+    try:
+        with source.engine.connect() as src, target.engine.begin() as dst:
+            _check_id_ranges(src, dst, tenant_id)
+            for table in tenant_tables():
+                query = select(table).where(tenant_filter(table, tenant_id))
+                # The default shard keeps every tenants row (tenant_shards foreign key)
+                if table.name == "tenants" and dst.execute(select(exists().where(query.whereclause))).scalar():
+                    continue
+                count = 0
+                result = src.execution_options(yield_per=batch_size).execute(query)
+                for rows in result.partitions():
+                    dst.execute(insert(table), [dict(row._mapping) for row in rows])
+                    count += len(rows)
+                copied[table.name] = count
+                log(f"  {table.name}: {count} rows")
+            _bump_sequences(dst)
+        # 2. Switch: new requests go to the target, writable again
+        set_directory(tenant_id, target.name, moving=False)
+    except Exception:
+        set_directory(tenant_id, source.name, moving=False)
+        raise
+
+    # 3. Workers with the old directory may still read the source for a moment
+    if not keep_source:
+        time.sleep(wait_seconds)
+        with source.engine.begin() as src:
+            for table in reversed(tenant_tables()):
+                if table.name == "tenants" and source is shard_router.default:
+                    continue
+                src.execute(delete(table).where(tenant_filter(table, tenant_id)))
+        log(f"Tenant {tenant_id}: source rows deleted from {source.name}")
+    return copied
+
+def init_shard(name: str, id_start: Optional[int] = None):
+    """Creates the schema on a shard; PostgreSQL: restarts every id sequence at `id_start`."""
+    shard = shard_router.shards[name]
+    Base.metadata.create_all(bind=shard.engine)
+    if id_start is None or shard.engine.dialect.name != "postgresql":
+        return
+    with shard.engine.begin() as connection:
+        for table in tenant_tables():
+            if "id" not in table.c or list(table.primary_key) != [table.c.id]:
+                continue
+            sequence = connection.execute(text("SELECT pg_get_serial_sequence(:t, 'id')"), {"t": table.name}).scalar()
+            if sequence:
+                connection.execute(text(f"ALTER SEQUENCE {sequence} RESTART WITH {int(id_start)}"))
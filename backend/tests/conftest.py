@@ -1,15 +1,25 @@
+import asyncio
+import enum
 import pytest
 import sys
 import os
+import uuid
+from contextlib import contextmanager
+from datetime import date, timedelta
+from decimal import Decimal
 from fastapi.testclient import TestClient
+from sqlalchemy import delete, event
 
 # Add project root to sys.path to allow importing main
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from main import app
-from database import Base, get_db
-from models import User, Tenant
+from database import Base, get_db, SessionLocal, AsyncSessionLocal, engine, async_engine
+from models import (User, Tenant, Candidat, CandidatStatus, Civilite, Entreprise, Session as TrainingSession, SessionDay,
+                    ContratDossier, ContratVersion, Invoice, InvoiceStatus, Attendance, AttendanceStatus)
 from auth import create_access_token, get_password_hash
+from sharding import tenant_tables, tenant_filter
+from services.attendance_summary_service import AttendanceSummaryService
 
 # Use a separate test database or the same one if acceptable for E2E (be careful with data)
 # For E2E on running container, we often modify the DB. 
@@ -40,3 +50,170 @@ def admin_token(client):
 @pytest.fixture(scope="module")
 def auth_header(admin_token):
     return {"Authorization": f"Bearer {admin_token}"}
+
+@pytest.fixture(scope="module")
+def other_tenant_header(client):
+    """Admin of the second seeded tenant (admin@paris.cfa.com / secret_paris), for isolation tests."""
+    response = client.post("/auth/login", data={"username": "admin@paris.cfa.com", "password": "secret_paris"})
+    assert response.status_code == 200
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+@pytest.fixture
+def rebuild_matches():
+    """
+    Checks that the full rebuild of a counter table gives back the rows maintained
+    incrementally: check(model, columns, rebuild, where=None) -> the compared rows.
+    `where` limits the comparison to the test's own rows (other tests' data may predate the counters).
+    """
+    def check(model, columns, rebuild, where=None):
+        db = SessionLocal()
+        try:
+            def value(row, column):
+                value = getattr(row, column)
+                return str(value.value if isinstance(value, enum.Enum) else value)
+
+            def snapshot():
+                query = db.query(model) if where is None else db.query(model).filter(where)
+                return sorted(tuple(value(row, c) for c in columns) for row in query.all())
+
+            incremental = snapshot()
+            rebuild(db)
+            db.expire_all()
+            assert snapshot() == incremental
+            return incremental
+        finally:
+            db.close()
+    return check
+
+@pytest.fixture(scope="module")
+def make_session(client):
+    """make_session(headers, debut, fin, days_of_week=[0]) -> session id, calendar generated."""
+    def create(headers, date_debut, date_fin, days_of_week=(0,), nom="BTS Test"):
+        session = client.post("/sessions/", json={"nom": nom, "date_debut": str(date_debut), "date_fin": str(date_fin)},
+                              headers=headers)
+        assert session.status_code == 200
+        session_id = session.json()["id"]
+        calendar = client.post(f"/sessions/{session_id}/generate-calendar", json={"days_of_week": list(days_of_week)},
+                               headers=headers)
+        assert calendar.status_code == 200
+        return session_id
+    return create
+
+@pytest.fixture(scope="module")
+def make_contrat(client):
+    """make_contrat(headers, session_id, debut, fin) -> {"dossier_id", "version_id"} of a new candidat/entreprise."""
+    def create(headers, session_id, date_debut, date_fin, salaire="1000.00", cout_npec="8000.00", heures_formation=None):
+        candidat = client.post("/candidats/", json={"first_name": "Test", "last_name": "Contrat"}, headers=headers).json()
+        entreprise = client.post("/entreprises/", json={"raison_sociale": "Test SAS", "siret": "12345678900099"},
+                                 headers=headers).json()
+        created = client.post("/contrats/", json={
+            "candidat_id": candidat["id"], "entreprise_id": entreprise["id"], "session_id": session_id,
+            "salaire": salaire, "cout_npec": cout_npec, "heures_formation": heures_formation,
+            "date_debut": str(date_debut), "date_fin": str(date_fin)
+        }, headers=headers)
+        assert created.status_code == 200
+        dossier_id = created.json()["dossier_id"]
+        detail = client.get(f"/contrats/{dossier_id}", headers=headers).json()
+        return {"dossier_id": dossier_id, "version_id": detail["active_version"]["id"]}
+    return create
+
+@pytest.fixture
+def count_queries():
+    """count_queries() -> context manager collecting the SQL statements sent by the sync and async engines."""
+    @contextmanager
+    def collect():
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        engines = (engine, async_engine.sync_engine)
+        for e in engines:
+            event.listen(e, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            for e in engines:
+                event.remove(e, "before_cursor_execute", before_cursor_execute)
+    return collect
+
+@pytest.fixture
+def call_async():
+    """call_async(endpoint, **kwargs): runs an `async def` route with its own AsyncSession."""
+    def call(endpoint, **kwargs):
+        async def run():
+            async with AsyncSessionLocal() as db:
+                return await endpoint(db=db, **kwargs)
+        return asyncio.run(run())
+    return call
+
+@pytest.fixture(scope="module")
+def db_and_user():
+    db = SessionLocal()
+    user = db.query(User).filter(User.email == "admin@lyon.cfa.com").first()
+    yield db, user
+    db.close()
+
+@pytest.fixture(scope="module")
+def seeded_tenant(client):
+    """
+    A tenant of its own, deleted afterwards: candidats of every status / civilité, active and replaced contracts,
+    invoices in every status, full-day and half-day attendances, two RNCP codes.
+    """
+    with SessionLocal() as db:
+        # Own id and slug: the suite also runs against a persistent database
+        tenant = Tenant(name="CFA Analytics", slug=f"cfa-analytics-{uuid.uuid4().hex[:12]}")
+        db.add(tenant)
+        db.flush()
+        tenant_id = tenant.id
+        entreprise = Entreprise(tenant_id=tenant_id, raison_sociale="Analytics SAS")
+        sessions = [TrainingSession(tenant_id=tenant_id, nom=f"Session {i}", date_debut=date(2025, 9, 1),
+                                    date_fin=date(2026, 6, 30), formation_rncp_id=rncp)
+                    for i, rncp in enumerate(["RNCP35001", "RNCP35001", "RNCP36002", None])]
+        db.add(entreprise)
+        db.add_all(sessions)
+        db.flush()
+        days = [SessionDay(session_id=sessions[0].id, date=date(2025, 9, 1) + timedelta(days=i),
+                           is_morning=True, is_afternoon=i % 3 != 0) for i in range(12)]
+        db.add_all(days)
+
+        statuses = [CandidatStatus.PLACE, CandidatStatus.PLACE, CandidatStatus.NOUVEAU, CandidatStatus.REJETE,
+                    CandidatStatus.ENTRETIEN, CandidatStatus.PLACE, CandidatStatus.ADMISSIBLE]
+        civilites = [Civilite.M, Civilite.MME, Civilite.MME, Civilite.M, Civilite.M, Civilite.MME, Civilite.M]
+        candidats = [Candidat(tenant_id=tenant_id, first_name="Kpi", last_name=str(i), statut=s, civilite=c)
+                     for i, (s, c) in enumerate(zip(statuses, civilites))]
+        db.add_all(candidats)
+        db.flush()
+
+        versions = []
+        for i, candidat in enumerate(candidats[:5]):
+            dossier = ContratDossier(tenant_id=tenant_id, candidat_id=candidat.id, entreprise_id=entreprise.id)
+            db.add(dossier)
+            db.flush()
+            # The first dossier had an avenant: its replaced version must not be counted
+            if i == 0:
+                db.add(ContratVersion(tenant_id=tenant_id, contrat_dossier_id=dossier.id, session_id=sessions[1].id,
+                                      version_number=1, salaire=1000, cout_npec=Decimal("9999.00"), is_active=False))
+            version = ContratVersion(tenant_id=tenant_id, contrat_dossier_id=dossier.id, session_id=sessions[i % 4].id,
+                                     version_number=2 if i == 0 else 1, salaire=1000,
+                                     cout_npec=Decimal("7000.50") + i if i != 3 else None, is_active=True)
+            db.add(version)
+            db.flush()
+            versions.append(version)
+            for j, statut in enumerate(InvoiceStatus):
+                db.add(Invoice(tenant_id=tenant_id, contrat_dossier_id=dossier.id, numero_facture=f"KPI-{i}-{j}",
+                               montant_ht=Decimal("100.25") * (i + j + 1), statut=statut, date_emission=date(2025, 10, 1)))
+        db.flush()
+
+        marks = [AttendanceStatus.PRESENT, AttendanceStatus.PRESENT, AttendanceStatus.ABSENT_INJUSTIFIE]
+        for version in versions[:2]:
+            db.add_all([Attendance(tenant_id=tenant_id, contrat_version_id=version.id, session_day_id=day.id,
+                                   status=marks[k % 3]) for k, day in enumerate(days)])
+        db.commit()
+        AttendanceSummaryService().rebuild(db, tenant_id=tenant_id)
+    try:
+        yield tenant_id
+    finally:
+        with engine.begin() as connection:
+            for table in reversed(tenant_tables()):
+                connection.execute(delete(table).where(tenant_filter(table, tenant_id)))
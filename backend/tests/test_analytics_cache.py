@@ -0,0 +1,24 @@
+from models import Candidat
+from routers.analytics import get_financial_dashboard
+from services.analytics_cache import analytics_cache
+
+def test_cached_dashboard_is_invalidated_by_writes(db_and_user, count_queries, call_async):
+    db, user = db_and_user
+    analytics_cache.clear()
+    call_async(get_financial_dashboard, current_user=user)
+    with count_queries() as statements:
+        call_async(get_financial_dashboard, current_user=user)
+    assert statements == []
+
+    # An ORM write on a model the dashboard depends on invalidates the tenant's entry
+    candidat = Candidat(tenant_id=user.tenant_id, first_name="Cache", last_name="Invalidation")
+    db.add(candidat)
+    db.commit()
+    db.refresh(user) # Reload expired attributes outside of the counted block
+    try:
+        with count_queries() as statements:
+            call_async(get_financial_dashboard, current_user=user)
+        assert len(statements) == 1
+    finally:
+        db.delete(candidat)
+        db.commit()
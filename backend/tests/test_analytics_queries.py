@@ -0,0 +1,82 @@
+from sqlalchemy import func, case
+
+from database import SessionLocal
+from models import (Candidat, CandidatStatus, Civilite, Session as TrainingSession, SessionDay, ContratDossier,
+                    ContratVersion, Invoice, InvoiceStatus, Attendance, AttendanceStatus)
+from routers.analytics import get_financial_dashboard, get_bpf_preview, compute_financial_dashboard, compute_bpf_preview
+from services.analytics_cache import analytics_cache
+
+def test_dashboard_is_a_single_round_trip(db_and_user, count_queries, call_async):
+    db, user = db_and_user
+    analytics_cache.clear()
+    with count_queries() as statements:
+        data = call_async(get_financial_dashboard, current_user=user)
+    assert len(statements) == 1
+    assert set(data) == {"ca_previsionnel", "ca_realise", "taux_transformation"}
+
+def test_bpf_preview_is_a_single_round_trip(db_and_user, count_queries, call_async):
+    db, user = db_and_user
+    analytics_cache.clear()
+    with count_queries() as statements:
+        data = call_async(get_bpf_preview, current_user=user)
+    assert len(statements) == 1
+    assert set(data) == {"repartition_sexe", "total_heures_realisees", "repartition_rncp"}
+
+def legacy_dashboard(db, tenant_id):
+    """The dashboard as computed before the single round trip (one query per figure)."""
+    ca_previsionnel = db.query(func.sum(ContratVersion.cout_npec))\
+        .filter(ContratVersion.tenant_id == tenant_id, ContratVersion.is_active == True).scalar() or 0
+    ca_realise = db.query(func.sum(Invoice.montant_ht)).filter(
+        Invoice.tenant_id == tenant_id, Invoice.statut.in_([InvoiceStatus.EMISE, InvoiceStatus.PAYEE])).scalar() or 0
+    total = db.query(func.count(Candidat.id)).filter(Candidat.tenant_id == tenant_id).scalar() or 0
+    places = db.query(func.count(Candidat.id)).filter(Candidat.tenant_id == tenant_id,
+                                                      Candidat.statut == CandidatStatus.PLACE).scalar() or 0
+    return {
+        "ca_previsionnel": float(ca_previsionnel),
+        "ca_realise": float(ca_realise),
+        "taux_transformation": round(places / total * 100, 2) if total else 0.0
+    }
+
+def legacy_bpf_preview(db, tenant_id):
+    """The BPF preview as computed before (three queries, hours from the Attendance rows)."""
+    repartition_sexe = {"H": 0, "F": 0, "AUTRE": 0}
+    sex_stats = db.query(Candidat.civilite, func.count(Candidat.id))\
+        .join(ContratDossier, ContratDossier.candidat_id == Candidat.id)\
+        .join(ContratVersion, ContratVersion.contrat_dossier_id == ContratDossier.id)\
+        .filter(Candidat.tenant_id == tenant_id, ContratVersion.is_active == True).group_by(Candidat.civilite).all()
+    for civilite, count in sex_stats:
+        key = {Civilite.M: "H", Civilite.MME: "F"}.get(civilite, "AUTRE")
+        repartition_sexe[key] += count
+
+    total_hours = db.query(func.sum(case((SessionDay.is_morning & SessionDay.is_afternoon, 7.0), else_=3.5)))\
+        .select_from(Attendance).join(SessionDay, Attendance.session_day_id == SessionDay.id)\
+        .filter(Attendance.tenant_id == tenant_id, Attendance.status == AttendanceStatus.PRESENT).scalar() or 0
+
+    rncp_stats = db.query(TrainingSession.formation_rncp_id, func.count(ContratVersion.id))\
+        .join(ContratVersion, ContratVersion.session_id == TrainingSession.id)\
+        .filter(TrainingSession.tenant_id == tenant_id, ContratVersion.is_active == True)\
+        .group_by(TrainingSession.formation_rncp_id).all()
+    return {
+        "repartition_sexe": repartition_sexe,
+        "total_heures_realisees": float(total_hours),
+        "repartition_rncp": {rncp: count for rncp, count in rncp_stats if rncp}
+    }
+
+def test_dashboard_values_match_the_per_figure_queries(seeded_tenant):
+    with SessionLocal() as db:
+        data = compute_financial_dashboard(db, seeded_tenant)
+        assert data == legacy_dashboard(db, seeded_tenant)
+    # 7000.50 + 7001.50 + 7002.50 + 7004.50 (one active contract without NPEC, the replaced version ignored)
+    assert data["ca_previsionnel"] == 28009.0
+    # EMISE (i + 2) and PAYEE (i + 3) for i in 0..4 -> 100.25 x 45, drafts excluded
+    assert data["ca_realise"] == 4511.25
+    assert data["taux_transformation"] == round(3 / 7 * 100, 2)
+
+def test_bpf_preview_values_match_the_per_section_queries(seeded_tenant):
+    with SessionLocal() as db:
+        data = compute_bpf_preview(db, seeded_tenant)
+        assert data == legacy_bpf_preview(db, seeded_tenant)
+    assert data["repartition_sexe"] == {"H": 3, "F": 2, "AUTRE": 0}
+    assert data["repartition_rncp"] == {"RNCP35001": 3, "RNCP36002": 1}
+    # 12 days (every 3rd a morning only), present 2 days out of 3: 4 full and 4 half days per contract
+    assert data["total_heures_realisees"] == 2 * (4 * 7 + 4 * 3.5)
@@ -0,0 +1,32 @@
+from database import SessionLocal, async_url
+from models import Candidat
+from auth import create_access_token
+
+def test_async_url_maps_sync_drivers():
+    assert async_url("postgresql://u:p@db:5432/cfa") == "postgresql+asyncpg://u:p@db:5432/cfa"
+    assert async_url("postgresql+psycopg2://u:p@db/cfa") == "postgresql+asyncpg://u:p@db/cfa"
+    assert async_url("sqlite:////tmp/test.db") == "sqlite+aiosqlite:////tmp/test.db"
+
+def test_async_list_keeps_tenant_isolation(client, auth_header):
+    db = SessionLocal()
+    other = Candidat(tenant_id=2, first_name="Autre", last_name="Tenant")
+    db.add(other)
+    db.commit()
+    try:
+        created = client.post("/candidats/", json={"first_name": "Async", "last_name": "Route"}, headers=auth_header)
+        assert created.status_code == 201
+
+        response = client.get("/candidats/", params={"size": 100}, headers=auth_header)
+        assert response.status_code == 200
+        ids = {c["id"] for c in response.json()}
+        assert created.json()["id"] in ids
+        assert other.id not in ids
+    finally:
+        db.delete(other)
+        db.commit()
+        db.close()
+
+def test_async_auth_rejects_malformed_subject(client):
+    token = create_access_token({"sub": "not-an-id", "tenant_id": 1})
+    response = client.get("/contrats/", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 401
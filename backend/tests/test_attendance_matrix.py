@@ -0,0 +1,164 @@
+import random
+import pytest
+from datetime import date, timedelta
+from sqlalchemy import insert
+
+from database import SessionLocal
+from models import (Candidat, Entreprise, Session as TrainingSession, SessionDay, ContratDossier, ContratVersion,
+                    Attendance, AttendanceStatus)
+from services.attendance_matrix import AttendanceMatrix, get_attendance_matrix
+from services.attendance_summary_service import AttendanceSummaryService
+from services.billing_service import BillingService
+from services.calendar_service import get_business_calendar
+
+START = date(2025, 9, 1)
+STATUSES = [AttendanceStatus.PRESENT] * 6 + [AttendanceStatus.ABSENT_JUSTIFIE, AttendanceStatus.ABSENT_INJUSTIFIE] * 2
+
+@pytest.fixture(scope="module")
+def seeded(client):
+    """One session of 60 days (every 5th day a morning only, every 7th an afternoon only), 8 contracts."""
+    rng = random.Random(28)
+    with SessionLocal() as db:
+        session = TrainingSession(tenant_id=1, nom="BTS Bitsets", date_debut=START, date_fin=START + timedelta(days=90))
+        entreprise = Entreprise(tenant_id=1, raison_sociale="Bitsets SAS")
+        db.add_all([session, entreprise])
+        db.flush()
+        db.execute(insert(SessionDay), [
+            {"session_id": session.id, "date": START + timedelta(days=i), "is_morning": i % 7 != 6, "is_afternoon": i % 5 != 4}
+            for i in range(60)
+        ])
+        days = db.query(SessionDay).filter(SessionDay.session_id == session.id).order_by(SessionDay.date).all()
+
+        summary = AttendanceSummaryService()
+        versions = []
+        for i in range(8):
+            candidat = Candidat(tenant_id=1, first_name="Matrice", last_name=f"Apprenti {i}")
+            db.add(candidat)
+            db.flush()
+            dossier = ContratDossier(tenant_id=1, candidat_id=candidat.id, entreprise_id=entreprise.id)
+            db.add(dossier)
+            db.flush()
+            # Windows starting / ending inside the session, or covering it
+            debut = START + timedelta(days=rng.choice([-10, 0, 12, 25]))
+            fin = START + timedelta(days=rng.choice([20, 45, 59, 120]))
+            version = ContratVersion(tenant_id=1, contrat_dossier_id=dossier.id, session_id=session.id, version_number=1,
+                                     salaire=1000, date_debut=debut, date_fin=fin, is_active=True)
+            db.add(version)
+            db.flush()
+            versions.append(version)
+            for day in days:
+                if rng.random() < 0.8:
+                    status = rng.choice(STATUSES)
+                    db.add(Attendance(tenant_id=1, contrat_version_id=version.id, session_day_id=day.id, status=status))
+                    # Like POST /attendance: the monthly counters stay in step
+                    summary.record_change(db, 1, version.id, day, None, status)
+
+        # Avenant on the first contract: old version inactive, same session, overlapping window
+        old = versions[0]
+        old.is_active = False
+        avenant = ContratVersion(tenant_id=1, contrat_dossier_id=old.contrat_dossier_id, session_id=session.id,
+                                 version_number=2, salaire=1100, date_debut=START + timedelta(days=30),
+                                 date_fin=old.date_fin, is_active=True)
+        db.add(avenant)
+        db.commit()
+        return {"session_id": session.id, "old": old.id, "avenant": avenant.id}
+
+def expected(db, session_id):
+    """Straightforward per-row computation of AttendanceMatrix.summary()."""
+    days = db.query(SessionDay).filter(SessionDay.session_id == session_id).order_by(SessionDay.date).all()
+    position = {day.id: i for i, day in enumerate(days)}
+    slots = {day.id: int(day.is_morning) + int(day.is_afternoon) for day in days}
+    versions = db.query(ContratVersion).filter(ContratVersion.session_id == session_id).all()
+    rows = db.query(Attendance).filter(Attendance.session_day_id.in_(position)).all()
+
+    closed = set(get_business_calendar(db, 1).closed_days(days[0].date, days[-1].date))
+
+    result = {}
+    for version in versions:
+        marks = {r.session_day_id: r.status for r in rows if r.contrat_version_id == version.id}
+        if not version.is_active and not marks:
+            continue
+        half_days = {status: sum(slots[d] for d, s in marks.items() if s == status) for status in AttendanceStatus}
+        if version.is_active:
+            window = [d for d in days if version.date_debut <= d.date <= version.date_fin and slots[d.id]
+                      and d.date not in closed]
+            billable = sum(1 for d in window if marks.get(d.id) != AttendanceStatus.ABSENT_INJUSTIFIE)
+        else:
+            billable = 0
+
+        streak = longest = 0
+        for day in days:
+            absent = marks.get(day.id) in (AttendanceStatus.ABSENT_JUSTIFIE, AttendanceStatus.ABSENT_INJUSTIFIE)
+            streak = streak + 1 if absent and slots[day.id] else 0
+            longest = max(longest, streak)
+
+        result[version.id] = {
+            "contrat_version_id": version.id,
+            "heures_realisees": half_days[AttendanceStatus.PRESENT] * 3.5,
+            "demi_journees_presentes": half_days[AttendanceStatus.PRESENT],
+            "demi_journees_absences_justifiees": half_days[AttendanceStatus.ABSENT_JUSTIFIE],
+            "demi_journees_absences_injustifiees": half_days[AttendanceStatus.ABSENT_INJUSTIFIE],
+            "jours_facturables": billable,
+            "plus_longue_absence_jours": longest,
+        }
+    return [result[v] for v in sorted(result)]
+
+def test_matrix_matches_per_row_computation(seeded):
+    with SessionLocal() as db:
+        matrix = AttendanceMatrix.build(db, seeded["session_id"])
+        assert len(matrix.dates) == 60
+        assert matrix.summary() == expected(db, seeded["session_id"])
+
+def test_avenant_days_are_counted_once(seeded):
+    with SessionLocal() as db:
+        matrix = AttendanceMatrix.build(db, seeded["session_id"])
+    # The inactive version keeps its history but no longer has a billing window
+    assert matrix.billable_days(seeded["old"]) == 0
+    avenant_days = [d for d in matrix.dates if d >= START + timedelta(days=30)]
+    assert 0 < matrix.billable_days(seeded["avenant"]) <= len(avenant_days)
+
+def test_avenant_to_another_session_invalidates_both_matrices(client, auth_header, make_session, make_contrat):
+    first = make_session(auth_header, date(2025, 9, 1), date(2025, 10, 31), nom="BTS Avant")
+    second = make_session(auth_header, date(2025, 9, 1), date(2025, 10, 31), nom="BTS Après")
+    created = make_contrat(auth_header, first, date(2025, 9, 1), date(2025, 10, 31))
+
+    def enrolled(session_id):
+        matrix = client.get(f"/sessions/{session_id}/attendance-matrix", headers=auth_header).json()
+        return [c["contrat_version_id"] for c in matrix["contrats"]]
+
+    assert enrolled(first) == [created["version_id"]]
+    assert enrolled(second) == []
+    response = client.put(f"/contrats/{created['dossier_id']}/avenant", json={
+        "session_id": second, "salaire": "1100.00", "date_debut": "2025-10-01", "date_fin": "2025-10-31"
+    }, headers=auth_header)
+    assert response.status_code == 200
+    # Served from the cache unless the avenant invalidated the old session too
+    assert enrolled(first) == []
+    assert len(enrolled(second)) == 1
+
+def test_billable_days_skip_closures_like_billing(client, auth_header, make_session, make_contrat):
+    # Mondays and Tuesdays of March 2032; 1 hour per euro so that the amount / 7 is a number of days
+    session_id = make_session(auth_header, date(2032, 3, 1), date(2032, 3, 31), days_of_week=(0, 1), nom="BTS Fermetures")
+    created = make_contrat(auth_header, session_id, date(2032, 3, 1), date(2032, 3, 31), cout_npec="700.00",
+                           heures_formation=700)
+    days = {d["date"]: d for d in client.get(f"/contrats/{created['dossier_id']}/calendar", headers=auth_header).json()}
+    assert len(days) == 9 # Easter Monday (2032-03-29) is not generated
+    for day in ("2032-03-08", "2032-03-22"): # Unjustified: one on the closure, one on an open day
+        assert client.post("/attendance", json={"session_day_id": days[day]["id"], "contrat_version_id": created["version_id"],
+                                                "status": "ABSENT_INJUSTIFIE"}, headers=auth_header).status_code == 200
+
+    # Declared after the calendar was generated: its session days stay, but are not billed
+    closure = client.post("/sessions/closures", json={"label": "Inventaire", "date_debut": "2032-03-08",
+                                                      "date_fin": "2032-03-09"}, headers=auth_header).json()
+    try:
+        matrix = client.get(f"/sessions/{session_id}/attendance-matrix", headers=auth_header).json()
+        billable = next(c for c in matrix["contrats"] if c["contrat_version_id"] == created["version_id"])["jours_facturables"]
+        with SessionLocal() as db:
+            version = db.get(ContratVersion, created["version_id"])
+            amount = BillingService().calculate_billable_amount(db, version, date(2032, 3, 1), date(2032, 3, 31))
+        # 9 days - 2 closed - 1 unjustified absence on an open day
+        assert billable == amount / 7 == 6
+    finally:
+        client.delete(f"/sessions/closures/{closure['id']}", headers=auth_header)
+    matrix = client.get(f"/sessions/{session_id}/attendance-matrix", headers=auth_header).json()
+    assert next(c for c in matrix["contrats"] if c["contrat_version_id"] == created["version_id"])["jours_facturables"] == 7
@@ -0,0 +1,78 @@
+import pytest
+from datetime import date
+from decimal import Decimal
+
+from database import SessionLocal
+from models import AttendanceMonthlySummary
+from services.attendance_summary_service import AttendanceSummaryService
+
+COLUMNS = ("tenant_id", "contrat_version_id", "month", "present_count", "justified_count",
+           "unjustified_count", "realized_hours")
+
+@pytest.fixture(scope="module")
+def contrat(client, auth_header, make_session, make_contrat):
+    session_id = make_session(auth_header, date(2025, 9, 1), date(2025, 10, 31), nom="BTS Compteurs")
+    created = make_contrat(auth_header, session_id, date(2025, 9, 1), date(2025, 10, 31))
+    days = client.get(f"/contrats/{created['dossier_id']}/calendar", headers=auth_header).json()
+    return {**created, "days": days}
+
+def declare(client, headers, contrat, day, status):
+    return client.post("/attendance", json={
+        "session_day_id": day["id"], "contrat_version_id": contrat["version_id"], "status": status
+    }, headers=headers)
+
+def counters(version_id, month):
+    with SessionLocal() as db:
+        row = db.query(AttendanceMonthlySummary).filter(
+            AttendanceMonthlySummary.contrat_version_id == version_id,
+            AttendanceMonthlySummary.month == month
+        ).one()
+        return row.present_count, row.justified_count, row.unjustified_count, Decimal(str(row.realized_hours))
+
+def test_record_change_transitions(client, auth_header, contrat):
+    september = [d for d in contrat["days"] if d["date"].startswith("2025-09")]
+    assert declare(client, auth_header, contrat, september[0], "PRESENT").status_code == 200
+    assert declare(client, auth_header, contrat, september[1], "PRESENT").status_code == 200
+    assert counters(contrat["version_id"], date(2025, 9, 1)) == (2, 0, 0, Decimal("14"))
+
+    # Same status again: idempotent
+    assert declare(client, auth_header, contrat, september[1], "PRESENT").status_code == 200
+    assert counters(contrat["version_id"], date(2025, 9, 1)) == (2, 0, 0, Decimal("14"))
+
+    # Status change moves the day from one counter to the other
+    assert declare(client, auth_header, contrat, september[1], "ABSENT_INJUSTIFIE").status_code == 200
+    assert counters(contrat["version_id"], date(2025, 9, 1)) == (1, 0, 1, Decimal("7"))
+
+    october = next(d for d in contrat["days"] if d["date"].startswith("2025-10"))
+    assert declare(client, auth_header, contrat, october, "ABSENT_JUSTIFIE").status_code == 200
+    assert counters(contrat["version_id"], date(2025, 10, 1)) == (0, 1, 0, Decimal("0"))
+
+def test_attendance_is_checked_against_the_tenant(client, auth_header, other_tenant_header, contrat,
+                                                  make_session, make_contrat):
+    other_session = make_session(other_tenant_header, date(2025, 9, 1), date(2025, 9, 30), nom="BTS Paris")
+    other = make_contrat(other_tenant_header, other_session, date(2025, 9, 1), date(2025, 9, 30))
+    day = contrat["days"][2]
+    # Another tenant's session day, another tenant's contract version
+    assert declare(client, other_tenant_header, other, day, "PRESENT").status_code == 404
+    assert declare(client, auth_header, other, day, "PRESENT").status_code == 404
+    with SessionLocal() as db:
+        assert not db.query(AttendanceMonthlySummary).filter(
+            AttendanceMonthlySummary.contrat_version_id == other["version_id"]
+        ).count()
+
+def test_rebuild_matches_incremental_counters(contrat, rebuild_matches):
+    rows = rebuild_matches(AttendanceMonthlySummary, COLUMNS,
+                           lambda db: AttendanceSummaryService().rebuild(db, tenant_id=1),
+                           where=AttendanceMonthlySummary.contrat_version_id == contrat["version_id"])
+    assert {row[2] for row in rows} == {"2025-09-01", "2025-10-01"}
+
+def test_startup_backfills_tenants_without_summary(contrat, rebuild_matches):
+    def drop_and_backfill(db):
+        # Database upgraded from before the summary table: attendances, no counters
+        db.query(AttendanceMonthlySummary).filter(AttendanceMonthlySummary.tenant_id == 1).delete()
+        db.commit()
+        assert AttendanceSummaryService().backfill_missing(db) > 0
+        assert AttendanceSummaryService().backfill_missing(db) == 0
+
+    rebuild_matches(AttendanceMonthlySummary, COLUMNS, drop_and_backfill,
+                    where=AttendanceMonthlySummary.contrat_version_id == contrat["version_id"])
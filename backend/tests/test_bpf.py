@@ -0,0 +1,46 @@
+from datetime import date
+from decimal import Decimal
+from sqlalchemy import func
+
+from database import SessionLocal
+from models import Candidat, Entreprise, ContratDossier, ContratVersion, Invoice, InvoiceStatus
+from services.bpf_service import BpfService, ANNEX_COLUMNS
+
+def test_bpf_report_and_streamed_annex(client, auth_header):
+    response = client.get("/analytics/bpf?year=2025&start_month=9", headers=auth_header)
+    assert response.status_code == 200
+    report = response.json()
+    assert report["exercice"]["debut"] == "2025-09-01" and report["exercice"]["fin"] == "2026-09-01"
+    assert set(report) == {"exercice", "stagiaires", "heures", "absences", "contrats", "produits"}
+
+    response = client.get("/analytics/bpf/annexe.csv?year=2025&start_month=9", headers=auth_header)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    lines = response.text.splitlines()
+    assert lines[0].split(";") == list(ANNEX_COLUMNS)
+
+def test_bpf_produits_follow_the_invoice_emission_date(seeded_tenant):
+    with SessionLocal() as db:
+        # Contract of a past exercise, invoiced (regularisation) during 2025-2026
+        candidat = Candidat(tenant_id=seeded_tenant, first_name="Kpi", last_name="Ancien")
+        entreprise = Entreprise(tenant_id=seeded_tenant, raison_sociale="Ancien SAS", code_idcc="1486")
+        db.add_all([candidat, entreprise])
+        db.flush()
+        dossier = ContratDossier(tenant_id=seeded_tenant, candidat_id=candidat.id, entreprise_id=entreprise.id)
+        db.add(dossier)
+        db.flush()
+        db.add(ContratVersion(tenant_id=seeded_tenant, contrat_dossier_id=dossier.id, version_number=1, salaire=1000,
+                              date_debut=date(2022, 9, 1), date_fin=date(2024, 8, 31), is_active=True))
+        db.add(Invoice(tenant_id=seeded_tenant, contrat_dossier_id=dossier.id, numero_facture="KPI-ANCIEN",
+                       montant_ht=Decimal("640.00"), statut=InvoiceStatus.EMISE, date_emission=date(2026, 1, 15)))
+        db.commit()
+
+        report = BpfService().report(db, seeded_tenant, 2025, start_month=9)
+        emitted = db.query(func.sum(Invoice.montant_ht)).filter(
+            Invoice.tenant_id == seeded_tenant, Invoice.statut.in_([InvoiceStatus.EMISE, InvoiceStatus.PAYEE]),
+            Invoice.date_emission >= date(2025, 9, 1), Invoice.date_emission < date(2026, 9, 1)
+        ).scalar()
+    assert report["produits"]["par_financeur"]["1486"] == 640.0
+    assert report["produits"]["total"] == float(emitted) == 4511.25 + 640.0
+    # The old contract is not a trainee of the exercise
+    assert report["stagiaires"]["total"] == 5
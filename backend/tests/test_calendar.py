@@ -0,0 +1,75 @@
+from datetime import date
+
+from services.calendar_service import BusinessCalendar, easter_sunday, french_public_holidays
+
+def test_easter_and_movable_feasts():
+    assert easter_sunday(2025) == date(2025, 4, 20)
+    assert easter_sunday(2026) == date(2026, 4, 5)
+    holidays = french_public_holidays(2026)
+    assert holidays[date(2026, 4, 6)] == "Lundi de Pâques"
+    assert holidays[date(2026, 5, 14)] == "Ascension"
+    assert holidays[date(2026, 5, 25)] == "Lundi de Pentecôte"
+    assert len(holidays) == 11
+
+def test_business_days_with_closures():
+    calendar = BusinessCalendar([(date(2026, 12, 21), date(2027, 1, 1))])
+    assert not calendar.is_open(date(2026, 7, 14))
+    assert not calendar.is_working_day(date(2026, 12, 23))
+    assert calendar.is_working_day(date(2027, 1, 4))
+    # May 2026: 21 weekdays - 4 holidays (01, 08, 14, 25)
+    assert calendar.count_business_days(date(2026, 5, 1), date(2026, 5, 31)) == 17
+    # Across years: Dec 2026 (23 weekdays - 9 closed incl. Christmas) + Jan 2027 (21 weekdays - Jan 1st)
+    assert calendar.count_business_days(date(2026, 12, 1), date(2027, 1, 31)) == 14 + 20
+
+def test_calendar_cache_follows_closure_writes(client):
+    from database import SessionLocal
+    from models import ClosurePeriod
+    from services import calendar_service
+
+    with SessionLocal() as db:
+        assert calendar_service.get_business_calendar(db, 1).is_open(date(2031, 3, 3))
+        # Written by "another worker": no explicit invalidation, only the commit hooks
+        closure = ClosurePeriod(tenant_id=1, label="Inventaire", date_debut=date(2031, 3, 3), date_fin=date(2031, 3, 3))
+        db.add(closure)
+        db.commit()
+        try:
+            assert not calendar_service.get_business_calendar(db, 1).is_open(date(2031, 3, 3))
+        finally:
+            db.delete(closure)
+            db.commit()
+        assert calendar_service.get_business_calendar(db, 1).is_open(date(2031, 3, 3))
+
+def test_business_days_endpoint_validates_the_range(client, auth_header):
+    response = client.get("/sessions/business-days", params={"start": "2026-05-01", "end": "2026-05-31"},
+                          headers=auth_header)
+    assert response.status_code == 200
+    assert {"date": "2026-05-01", "label": "Fête du Travail"} in response.json()["jours_feries"]
+
+    inverted = client.get("/sessions/business-days", params={"start": "2026-05-31", "end": "2026-05-01"},
+                          headers=auth_header)
+    assert inverted.status_code == 400
+    too_long = client.get("/sessions/business-days", params={"start": "2000-01-01", "end": "2026-01-01"},
+                          headers=auth_header)
+    assert too_long.status_code == 400
+
+def test_billing_skips_closed_days_and_their_absences(client, auth_header, make_session, make_contrat):
+    # September 2031: Mondays 1, 8, 15, 22, 29, no public holiday
+    session_id = make_session(auth_header, date(2031, 9, 1), date(2031, 9, 30), nom="BTS Facturation")
+    contrat = make_contrat(auth_header, session_id, date(2031, 9, 1), date(2031, 9, 30), cout_npec="8000.00",
+                           heures_formation=800)
+    days = {d["date"]: d["id"] for d in client.get(f"/contrats/{contrat['dossier_id']}/calendar", headers=auth_header).json()}
+    closure = client.post("/sessions/closures", json={"label": "Fermeture", "date_debut": "2031-09-15",
+                                                     "date_fin": "2031-09-15"}, headers=auth_header).json()
+    try:
+        for day in ("2031-09-15", "2031-09-22"):
+            response = client.post("/attendance", json={"session_day_id": days[day], "contrat_version_id": contrat["version_id"],
+                                                        "status": "ABSENT_INJUSTIFIE"}, headers=auth_header)
+            assert response.status_code == 200
+        invoice = client.post("/invoices/generate", json={"contrat_dossier_id": contrat["dossier_id"],
+                                                          "periode_debut": "2031-09-01", "periode_fin": "2031-09-30"},
+                              headers=auth_header)
+        assert invoice.status_code == 200
+        # 5 Mondays - 1 closed - 1 unjustified absence (the one on the closed day is not deducted again): 3 x 7h x 10 EUR
+        assert float(invoice.json()["montant_ht"]) == 210.0
+    finally:
+        client.delete(f"/sessions/closures/{closure['id']}", headers=auth_header)
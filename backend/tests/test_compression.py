@@ -0,0 +1,103 @@
+import gzip
+import brotli
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+from middleware.compression import CompressionMiddleware, negotiate
+
+ROWS = [{"id": i, "nom": f"Candidat {i}", "statut": "PLACE"} for i in range(500)]
+CSV_LINES = [f"{i};Nom {i};Prenom {i};600\n" for i in range(5000)]
+
+def build_app(**options):
+    app = FastAPI()
+
+    @app.get("/rows")
+    def rows():
+        return ROWS
+
+    @app.get("/small")
+    def small():
+        return {"ok": True}
+
+    @app.get("/csv")
+    def csv():
+        return StreamingResponse((line for line in CSV_LINES), media_type="text/csv; charset=utf-8")
+
+    @app.get("/zip")
+    def zip_export():
+        return Response(b"PK\x03\x04" + b"0" * 5000, media_type="application/zip")
+
+    @app.get("/partial")
+    def partial():
+        return Response(b"x" * 5000, status_code=206, media_type="text/plain",
+                        headers={"Content-Range": "bytes 0-4999/10000"})
+
+    app.add_middleware(CompressionMiddleware, **options)
+    return app
+
+@pytest.fixture(scope="module")
+def app_client():
+    return TestClient(build_app(minimum_size=1024, stream_flush=16 * 1024))
+
+def raw_get(client, path, accept_encoding):
+    with client.stream("GET", path, headers={"Accept-Encoding": accept_encoding}) as response:
+        return response, b"".join(response.iter_raw())
+
+def test_negotiation():
+    assert negotiate("gzip, deflate, br") == "br"
+    assert negotiate("gzip;q=1.0, br;q=0.5") == "gzip"
+    assert negotiate("br;q=0, gzip") == "gzip"
+    assert negotiate("*") == "br"
+    assert negotiate("identity") is None
+    assert negotiate("") is None
+
+def test_json_gzip(app_client):
+    response, body = raw_get(app_client, "/rows", "gzip")
+    assert response.headers["content-encoding"] == "gzip"
+    assert int(response.headers["content-length"]) == len(body)
+    assert "Accept-Encoding" in response.headers["vary"]
+    decoded = gzip.decompress(body)
+    assert decoded == app_client.get("/rows", headers={"Accept-Encoding": "identity"}).content
+    assert len(body) < len(decoded) / 5
+
+def test_json_brotli(app_client):
+    response, body = raw_get(app_client, "/rows", "gzip, br")
+    assert response.headers["content-encoding"] == "br"
+    assert brotli.decompress(body).startswith(b'[{"id":0')
+
+def test_identity_and_small_bodies(app_client):
+    response, _ = raw_get(app_client, "/rows", "identity")
+    assert "content-encoding" not in response.headers
+    assert "Accept-Encoding" in response.headers["vary"]
+    response, body = raw_get(app_client, "/small", "gzip")
+    assert "content-encoding" not in response.headers
+    assert body == b'{"ok":true}'
+
+def test_streaming_csv(app_client):
+    response, body = raw_get(app_client, "/csv", "gzip")
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert gzip.decompress(body).decode() == "".join(CSV_LINES)
+
+def test_already_compressed_and_partial_pass_through(app_client):
+    response, body = raw_get(app_client, "/zip", "gzip, br")
+    assert "content-encoding" not in response.headers
+    assert body.startswith(b"PK")
+    response, body = raw_get(app_client, "/partial", "gzip, br")
+    assert response.status_code == 206
+    assert "content-encoding" not in response.headers
+    assert len(body) == 5000
+
+def test_levels_are_configurable():
+    stored = TestClient(build_app(gzip_level=0))
+    best = TestClient(build_app(gzip_level=9))
+    stored_body = raw_get(stored, "/rows", "gzip")[1]
+    assert len(raw_get(best, "/rows", "gzip")[1]) < len(stored_body) / 5
+    assert gzip.decompress(stored_body).startswith(b'[{"id":0')
+
+def test_api_responses_are_compressed(client, auth_header):
+    with client.stream("GET", "/openapi.json", headers={"Accept-Encoding": "br"}) as response:
+        assert response.headers["content-encoding"] == "br"
+        assert brotli.decompress(b"".join(response.iter_raw())).startswith(b"{")
@@ -0,0 +1,131 @@
+import random
+import pytest
+from datetime import date
+
+from database import SessionLocal
+from models import Candidat, Entreprise, Session as TrainingSession, SessionDay, ContratDossier, ContratVersion
+from services.conflict_service import IntervalTree
+
+def test_interval_tree_matches_brute_force():
+    rng = random.Random(7)
+    intervals = []
+    for i in range(500):
+        start = rng.randint(0, 2000)
+        intervals.append((start, start + rng.randint(0, 30), i))
+    tree = IntervalTree(intervals)
+
+    for _ in range(200):
+        lo = rng.randint(0, 2000)
+        hi = lo + rng.randint(0, 40)
+        expected = sorted(i for s, e, i in intervals if s <= hi and e >= lo)
+        assert sorted(i for _, _, i in tree.overlaps(lo, hi)) == expected
+
+def test_interval_tree_empty():
+    tree = IntervalTree([])
+    assert tree.overlaps(0, 10) == []
+    assert tree.end == -1
+
+def _add_session(db, tenant_id, days):
+    """days: {date: (is_morning, is_afternoon)}"""
+    session = TrainingSession(tenant_id=tenant_id, nom="BTS Conflits", date_debut=min(days), date_fin=max(days))
+    db.add(session)
+    db.flush()
+    db.add_all([SessionDay(session_id=session.id, date=d, is_morning=m, is_afternoon=a) for d, (m, a) in days.items()])
+    return session.id
+
+def _add_version(db, tenant_id, candidat_id, session_id, debut, fin, is_active=True):
+    entreprise = Entreprise(tenant_id=tenant_id, raison_sociale="Conflits SAS")
+    db.add(entreprise)
+    db.flush()
+    dossier = ContratDossier(tenant_id=tenant_id, candidat_id=candidat_id, entreprise_id=entreprise.id)
+    db.add(dossier)
+    db.flush()
+    version = ContratVersion(tenant_id=tenant_id, contrat_dossier_id=dossier.id, session_id=session_id, version_number=1,
+                             salaire=1000, date_debut=debut, date_fin=fin, is_active=is_active)
+    db.add(version)
+    db.flush()
+    return version.id
+
+@pytest.fixture(scope="module")
+def schedule(client):
+    """
+    January 2032 (Mondays 5-26, Tuesdays 6-27, Wednesdays 7-28):
+    - apprentice A: S1 (Mon + Tue) from the 8th, S2 (Tue afternoon + Wed) until the 20th, plus an inactive S2 version
+    - apprentice B: S3 (Mon mornings) and S4 (Mon afternoons), which never collide
+    - apprentice C of the other tenant: twice the same session
+    """
+    def jan(*days):
+        return [date(2032, 1, d) for d in days]
+
+    with SessionLocal() as db:
+        a = Candidat(tenant_id=1, first_name="Conflit", last_name="A")
+        b = Candidat(tenant_id=1, first_name="Conflit", last_name="B")
+        c = Candidat(tenant_id=2, first_name="Conflit", last_name="C")
+        db.add_all([a, b, c])
+        db.flush()
+        s1 = _add_session(db, 1, {d: (True, True) for d in jan(5, 6, 12, 13, 19, 20, 26, 27)})
+        s2 = _add_session(db, 1, {**{d: (False, True) for d in jan(6, 13, 20, 27)}, **{d: (True, True) for d in jan(7, 14, 21, 28)}})
+        s3 = _add_session(db, 1, {d: (True, False) for d in jan(5, 12, 19, 26)})
+        s4 = _add_session(db, 1, {d: (False, True) for d in jan(5, 12, 19, 26)})
+        s5 = _add_session(db, 2, {d: (True, True) for d in jan(5, 12)})
+        ids = {
+            "a": a.id, "s1": s1, "s2": s2,
+            "v1": _add_version(db, 1, a.id, s1, date(2032, 1, 8), date(2032, 1, 31)),
+            "v2": _add_version(db, 1, a.id, s2, date(2032, 1, 1), date(2032, 1, 20)),
+            "v0": _add_version(db, 1, a.id, s2, date(2032, 1, 1), date(2032, 1, 31), is_active=False),
+            "v3": _add_version(db, 1, b.id, s3, date(2032, 1, 1), date(2032, 1, 31)),
+            "v4": _add_version(db, 1, b.id, s4, date(2032, 1, 1), date(2032, 1, 31)),
+            "v5": _add_version(db, 2, c.id, s5, date(2032, 1, 1), date(2032, 1, 31)),
+            "v6": _add_version(db, 2, c.id, s5, date(2032, 1, 1), date(2032, 1, 31)),
+        }
+        db.commit()
+        return ids
+
+def _ours(result, schedule):
+    versions = {value for key, value in schedule.items() if key.startswith("v")}
+    return (
+        [o for o in result["chevauchements"] if set(o["contrat_version_ids"]) & versions],
+        sorted((o for o in result["hors_contrat"] if o["contrat_version_id"] in versions), key=lambda o: o["contrat_version_id"]),
+    )
+
+def test_detect_overlaps_and_days_outside_the_contract(client, auth_header, schedule):
+    response = client.get("/sessions/conflicts", headers=auth_header)
+    assert response.status_code == 200
+    overlaps, outside = _ours(response.json(), schedule)
+
+    # Only the Tuesday afternoons inside both windows (13th, 20th); B's half-days never meet
+    assert overlaps == [{
+        "candidat_id": schedule["a"],
+        "contrat_version_ids": [schedule["v1"], schedule["v2"]],
+        "session_ids": [schedule["s1"], schedule["s2"]],
+        "demi_journees": 2,
+        "premier_jour": "2032-01-13",
+        "dernier_jour": "2032-01-20",
+    }]
+    assert outside == [
+        {"contrat_version_id": schedule["v1"], "session_id": schedule["s1"], "jours": 2,
+         "premier_jour": "2032-01-05", "dernier_jour": "2032-01-06"},
+        {"contrat_version_id": schedule["v2"], "session_id": schedule["s2"], "jours": 3,
+         "premier_jour": "2032-01-21", "dernier_jour": "2032-01-28"},
+    ]
+
+def test_detect_filters_on_one_contract(client, auth_header, schedule):
+    overlaps, outside = _ours(client.get("/sessions/conflicts", params={"contrat_version_id": schedule["v2"]},
+                                         headers=auth_header).json(), schedule)
+    assert [o["contrat_version_ids"] for o in overlaps] == [[schedule["v1"], schedule["v2"]]]
+    assert [o["contrat_version_id"] for o in outside] == [schedule["v2"]]
+
+    overlaps, outside = _ours(client.get("/sessions/conflicts", params={"contrat_version_id": schedule["v3"]},
+                                         headers=auth_header).json(), schedule)
+    assert overlaps == [] and outside == []
+
+def test_detect_is_tenant_scoped(client, auth_header, other_tenant_header, schedule):
+    mine = client.get("/sessions/conflicts", headers=auth_header).json()
+    assert not any(schedule["v5"] in o["contrat_version_ids"] for o in mine["chevauchements"])
+    # Another tenant's contract id: nothing, not the other tenant's conflicts
+    assert client.get("/sessions/conflicts", params={"contrat_version_id": schedule["v5"]},
+                      headers=auth_header).json() == {"chevauchements": [], "hors_contrat": []}
+
+    theirs = client.get("/sessions/conflicts", headers=other_tenant_header).json()
+    overlaps, _ = _ours(theirs, schedule)
+    assert [(o["contrat_version_ids"], o["demi_journees"]) for o in overlaps] == [([schedule["v5"], schedule["v6"]], 4)]
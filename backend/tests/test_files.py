@@ -0,0 +1,90 @@
+import asyncio
+import os
+
+from database import SessionLocal
+from models import Candidat, User
+from services import cv_parser
+from services.file_response import TenantFileResponse, ZEROCOPY_EXTENSION
+
+def _write_upload(tenant_id: int, filename: str, content: bytes):
+    directory = os.path.join(cv_parser.UPLOAD_DIR, str(tenant_id))
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, filename), "wb") as f:
+        f.write(content)
+
+def _candidat_with_cv(filename: str) -> int:
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.email == "admin@lyon.cfa.com").first()
+        candidat = Candidat(tenant_id=user.tenant_id, first_name="Range", last_name="Test", cv_filename=filename)
+        db.add(candidat)
+        db.commit()
+        return candidat.id
+    finally:
+        db.close()
+
+def test_cv_range_and_conditional_requests(client, auth_header):
+    content = bytes(range(256)) * 40
+    _write_upload(1, "cv_range.pdf", content)
+    candidat_id = _candidat_with_cv("cv_range.pdf")
+    url = f"/files/candidats/{candidat_id}/cv"
+
+    response = client.get(url, headers=auth_header)
+    assert response.status_code == 200 and response.content == content
+    assert response.headers["accept-ranges"] == "bytes"
+    etag, last_modified = response.headers["etag"], response.headers["last-modified"]
+
+    response = client.get(url, headers={**auth_header, "Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.content == content[100:200]
+    assert response.headers["content-range"] == f"bytes 100-199/{len(content)}"
+
+    assert client.get(url, headers={**auth_header, "If-None-Match": etag}).status_code == 304
+    assert client.get(url, headers={**auth_header, "If-Modified-Since": last_modified}).status_code == 304
+    assert client.get(url, headers={**auth_header, "If-None-Match": '"other"'}).status_code == 200
+
+def test_cv_path_traversal_is_rejected(client, auth_header):
+    # Another tenant's upload, reached through the stored filename
+    _write_upload(2, "secret.pdf", b"tenant 2")
+    candidat_id = _candidat_with_cv("../2/secret.pdf")
+    assert client.get(f"/files/candidats/{candidat_id}/cv", headers=auth_header).status_code == 404
+
+def _run_response(response, scope):
+    """Runs the ASGI response on `scope`; returns the messages sent, the zero-copy body read back from the fd."""
+    messages = []
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == ZEROCOPY_EXTENSION:
+            # The fd is only open during send: read the range like sendfile() would
+            message = {**message, "body": os.pread(message["file"], message["count"], message["offset"])}
+        messages.append(message)
+
+    asyncio.run(response(scope, receive, send))
+    return messages
+
+def test_single_range_uses_zerocopy_when_the_server_offers_it():
+    content = bytes(range(256)) * 40
+    _write_upload(1, "cv_zerocopy.pdf", content)
+    path = os.path.join(cv_parser.UPLOAD_DIR, "1", "cv_zerocopy.pdf")
+
+    def scope(method="GET", range_header=b"bytes=100-199", extensions=None):
+        return {"type": "http", "method": method, "headers": [(b"range", range_header)],
+                "extensions": {ZEROCOPY_EXTENSION: {}} if extensions is None else extensions}
+
+    start, body = _run_response(TenantFileResponse(path), scope())
+    assert start["type"] == "http.response.start" and start["status"] == 206
+    headers = dict(start["headers"])
+    assert headers[b"content-length"] == b"100"
+    assert headers[b"content-range"] == f"bytes 100-199/{len(content)}".encode()
+    assert body["type"] == ZEROCOPY_EXTENSION
+    assert (body["offset"], body["count"], body["more_body"]) == (100, 100, False)
+    assert isinstance(body["file"], int) and body["body"] == content[100:200]
+
+    # HEAD, multi-range requests and servers without the extension go through FileResponse
+    for request in (scope(method="HEAD"), scope(range_header=b"bytes=0-9,20-29"), scope(extensions={})):
+        messages = _run_response(TenantFileResponse(path), request)
+        assert messages[0]["type"] == "http.response.start"
+        assert all(m["type"] != ZEROCOPY_EXTENSION for m in messages[1:])
@@ -0,0 +1,37 @@
+import numpy as np
+from datetime import date
+
+from services.forecast_service import ForecastService
+
+def _data():
+    # 2 contracts on session 1 (Mondays of Sept/Oct 2026), 1 contract without session
+    mondays = [date(2026, 9, d) for d in (7, 14, 21, 28)] + [date(2026, 10, d) for d in (5, 12, 19, 26)]
+    return {
+        "ids": np.array([1, 2, 3]),
+        "session_ids": np.array([1, 1, 0]),
+        "debut": np.array([date(2026, 9, 1), date(2026, 9, 15), date(2026, 9, 1)], dtype="datetime64[D]").astype(np.int64),
+        "fin": np.array([date(2027, 6, 30), date(2026, 10, 10), date(2027, 6, 30)], dtype="datetime64[D]").astype(np.int64),
+        "npec": np.array([7000.0, 7000.0, 7000.0]),
+        "heures": np.array([700.0, 700.0, 700.0]),
+        "rncp": np.array(["RNCP1", "RNCP1", ""], dtype=object),
+        "absence_rate": np.array([0.0, 0.5, 0.0]),
+        "day_session": np.ones(len(mondays), dtype=np.int64),
+        "day_date": np.array(mondays, dtype="datetime64[D]").astype(np.int64),
+    }
+
+def test_forecast_matrix_applies_billing_rules():
+    matrix = ForecastService().project(_data(), date(2026, 9, 1), months=3)
+    # 10€/h * 7h per scheduled day
+    assert matrix[0].tolist() == [280.0, 280.0, 0.0]
+    # 2 days in Sept (from 15/09), 1 day in Oct (contract ends 10/10), 50% absence rate
+    assert matrix[1].tolist() == [70.0, 35.0, 0.0]
+    # No session -> not billable
+    assert matrix[2].tolist() == [0.0, 0.0, 0.0]
+
+def test_forecast_what_if_parameters():
+    service = ForecastService()
+    matrix = service.project(_data(), date(2026, 9, 1), months=2, absence_rate=0.0, slippage_days=14)
+    # Contract 1 starts on 15/09 -> loses the 07/09 and 14/09 Mondays
+    assert matrix[0].tolist() == [140.0, 280.0]
+    # Contract 2 shifted to 29/09 - 24/10: only October Mondays 05, 12, 19
+    assert matrix[1].tolist() == [0.0, 210.0]
@@ -0,0 +1,78 @@
+import argparse
+import os
+import pytest
+from sqlalchemy import create_engine, select, func, text
+from sqlalchemy.orm import Session
+
+import manage
+import migrations
+from database import Base, SessionLocal
+from models import Candidat, Tenant, User
+from services.index_advisor import IndexAdvisorService, ADVISOR_TENANT_SLUG
+
+def test_every_query_shape_explains():
+    with SessionLocal() as db:
+        report = IndexAdvisorService().run(db, tenant_id=1)
+    assert len(report) > 10
+    for entry in report:
+        assert entry["plan"], entry["query"]
+
+def test_flags_sequential_scan():
+    advisor = IndexAdvisorService()
+    with SessionLocal() as db:
+        # telephone has no index
+        assert advisor.explain(db, select(Candidat).where(Candidat.telephone == "0600000000"))["seq_scans"] == ["candidats"]
+        assert advisor.explain(db, select(Candidat).where(Candidat.tenant_id == 1, Candidat.statut == "PLACE"))["seq_scans"] == []
+
+def test_declared_indexes_exist():
+    with SessionLocal() as db:
+        assert IndexAdvisorService().missing_indexes(db) == []
+
+INIT_SQL = os.path.join(os.path.dirname(__file__), "..", "..", "init.sql")
+
+@pytest.mark.skipif(not os.path.exists(INIT_SQL), reason="init.sql is not shipped with the backend image")
+def test_init_sql_schema_is_complete_after_migrate(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'init.db'}")
+    with open(INIT_SQL) as f:
+        schema = f.read().split("-- 3. Seed Data")[0]
+    connection = engine.raw_connection()
+    try:
+        connection.executescript(schema)
+    finally:
+        connection.close()
+
+    advisor = IndexAdvisorService()
+    with Session(engine) as db:
+        missing = advisor.missing_indexes(db)
+    # Same columns as init.sql's idx_candidats_tenant_id: not reported again under the ORM name
+    assert not [ddl for ddl in missing if "ix_candidats_tenant_id" in ddl]
+    assert any("ix_candidats_last_name" in ddl for ddl in missing)
+
+    Base.metadata.create_all(bind=engine)
+    assert "declared indexes" in migrations.upgrade(engine)
+    with Session(engine) as db:
+        assert advisor.missing_indexes(db) == []
+    assert migrations.upgrade(engine) == []
+
+def test_unique_index_violated_by_existing_rows_is_skipped(tmp_path, capsys):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY, tenant_id INTEGER NOT NULL, "
+                                "email VARCHAR NOT NULL, password_hash VARCHAR NOT NULL, role VARCHAR)"))
+        connection.execute(text("INSERT INTO users (tenant_id, email, password_hash) VALUES (1, 'a@b.c', '!'), (1, 'a@b.c', '!')"))
+        created = migrations.create_indexes(connection, User)
+    assert "idx_users_email" in created and "unique_email_per_tenant" not in created
+    assert "unique_email_per_tenant not created" in capsys.readouterr().out
+
+def test_manage_command_does_not_seed_by_default(capsys):
+    with SessionLocal() as db:
+        tenants = db.scalar(select(func.count(Tenant.id)))
+    try:
+        manage.index_advisor(argparse.Namespace(seed=None, tenant=None, plans=False))
+    except SystemExit:
+        pass # Exit code 1 on a sequential scan: not what this test checks
+    out = capsys.readouterr().out
+    assert "Explaining with the data of tenant" in out and "Seeding" not in out
+    with SessionLocal() as db:
+        assert db.scalar(select(func.count(Tenant.id))) == tenants
+        assert db.scalar(select(Tenant.id).where(Tenant.slug == ADVISOR_TENANT_SLUG)) is None
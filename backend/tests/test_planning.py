@@ -0,0 +1,71 @@
+import pytest
+from datetime import date
+
+from database import SessionLocal
+from models import Session as TrainingSession, SessionDay, Attendance, AttendanceStatus
+from services.calendar_service import BusinessCalendar
+from services.planning_service import PlanningService
+
+# September 2025: Mondays 1, 8, 15, 22, 29 / Wednesdays 3, 10, 17, 24
+START, END = date(2025, 9, 1), date(2025, 9, 30)
+
+@pytest.fixture
+def session_id(client):
+    with SessionLocal() as db:
+        session = TrainingSession(tenant_id=1, nom="BTS Planning", date_debut=START, date_fin=END)
+        db.add(session)
+        db.commit()
+        return session.id
+
+def generate(session_id, days_of_week, calendar=None):
+    with SessionLocal() as db:
+        return PlanningService().generate_session_days(db, session_id, START, END, days_of_week, calendar=calendar)
+
+def day_ids(session_id):
+    with SessionLocal() as db:
+        return dict(db.query(SessionDay.date, SessionDay.id).filter(SessionDay.session_id == session_id))
+
+def test_regeneration_keeps_unchanged_days(session_id):
+    first = generate(session_id, [0])
+    assert (first["created"], first["deleted"], first["unchanged"], first["conflicts"]) == (5, 0, 0, [])
+    before = day_ids(session_id)
+
+    again = generate(session_id, [0])
+    assert (again["created"], again["deleted"], again["unchanged"]) == (0, 0, 5)
+    # Same rows, same ids: attendance references stay valid
+    assert day_ids(session_id) == before
+
+def test_added_and_deleted_days(session_id):
+    generate(session_id, [0])
+    mondays = day_ids(session_id)
+
+    result = generate(session_id, [2])
+    assert (result["created"], result["deleted"], result["unchanged"]) == (4, 5, 0)
+    assert sorted(day_ids(session_id)) == [date(2025, 9, d) for d in (3, 10, 17, 24)]
+
+    wednesdays = day_ids(session_id)
+    both = generate(session_id, [0, 2])
+    assert (both["created"], both["deleted"], both["unchanged"]) == (5, 0, 4)
+    after = day_ids(session_id)
+    assert all(after[d] == day_id for d, day_id in wednesdays.items())
+    assert sorted(after) == sorted([*mondays, *wednesdays])
+
+def test_closed_days_are_removed(session_id):
+    generate(session_id, [0])
+    closures = BusinessCalendar([(date(2025, 9, 15), date(2025, 9, 19))])
+    result = generate(session_id, [0], calendar=closures)
+    assert (result["created"], result["deleted"], result["unchanged"]) == (0, 1, 4)
+    assert date(2025, 9, 15) not in day_ids(session_id)
+
+def test_days_with_attendance_are_reported_as_conflicts(session_id, make_contrat, auth_header):
+    generate(session_id, [0])
+    contrat = make_contrat(auth_header, session_id, START, END)
+    with SessionLocal() as db:
+        db.add(Attendance(tenant_id=1, contrat_version_id=contrat["version_id"],
+                          session_day_id=day_ids(session_id)[date(2025, 9, 8)], status=AttendanceStatus.PRESENT))
+        db.commit()
+
+    result = generate(session_id, [2])
+    assert result["conflicts"] == [date(2025, 9, 8)]
+    assert (result["created"], result["deleted"]) == (4, 4)
+    assert date(2025, 9, 8) in day_ids(session_id)
@@ -0,0 +1,15 @@
+from routers.analytics import compute_financial_dashboard
+from services.platform_service import PlatformService
+
+def test_platform_dashboard_is_one_grouped_query(db_and_user, count_queries):
+    db, _ = db_and_user
+    with count_queries() as statements:
+        rows = PlatformService().dashboard_by_tenant(db)
+    assert len(statements) == 1
+    for row in rows:
+        expected = compute_financial_dashboard(db, row["tenant_id"])
+        assert {k: row[k] for k in expected} == expected
+
+def test_operator_report_requires_operator_role(client, auth_header):
+    response = client.get("/operator/tenants/report", headers=auth_header)
+    assert response.status_code == 403
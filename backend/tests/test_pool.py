@@ -0,0 +1,28 @@
+from database import PoolStats, pool_options, InstrumentedQueuePool
+
+def test_readiness_reports_both_pools(client):
+    response = client.get("/health/ready")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["database"] == {"async": "ok", "sync": "ok"}
+    for name in ("sync", "async"):
+        pool = body["pools"][name]
+        assert pool["checked_out"] == 0
+        assert pool["idle"] >= 1
+        assert pool["checkouts"] >= 1 and pool["timeouts"] == 0
+        assert pool["wait_max_ms"] >= pool["wait_avg_ms"] >= 0
+
+def test_pool_stats_snapshot():
+    stats = PoolStats()
+    for ms in range(1, 21):
+        stats.record(ms / 1000)
+    stats.record(5.0, timed_out=True)
+    snapshot = stats.snapshot()
+    assert snapshot["checkouts"] == 20 and snapshot["timeouts"] == 1
+    assert snapshot["wait_avg_ms"] == 10.5
+    assert snapshot["wait_max_ms"] == 5000.0
+
+def test_in_memory_sqlite_keeps_default_pool():
+    assert pool_options("sqlite://", InstrumentedQueuePool, "sync") == {}
+    options = pool_options("postgresql://u:p@db/cfa", InstrumentedQueuePool, "sync")
+    assert options["poolclass"] is InstrumentedQueuePool and options["pool_pre_ping"] is True
@@ -0,0 +1,55 @@
+from sqlalchemy import event
+
+from database import engine
+
+def _publish(client, auth_header, count):
+    ids = []
+    for i in range(count):
+        response = client.post("/quality/regulatory-watch", json={
+            "title": f"Veille {i}", "description": "Read state", "category": "LOI"
+        }, headers=auth_header)
+        assert response.status_code == 200
+        ids.append(response.json()["id"])
+    return ids
+
+def test_read_flags_unread_count_and_bulk_mark(client, auth_header):
+    ids = _publish(client, auth_header, 5)
+
+    response = client.post(f"/quality/regulatory-watch/{ids[0]}/mark-as-read", headers=auth_header)
+    assert response.json() == {"message": "Marked as read"}
+    response = client.post(f"/quality/regulatory-watch/{ids[0]}/mark-as-read", headers=auth_header)
+    assert response.json() == {"message": "Already marked as read"}
+    assert client.post("/quality/regulatory-watch/999999/mark-as-read", headers=auth_header).status_code == 404
+
+    response = client.get("/quality/regulatory-watch", params={"size": 200}, headers=auth_header)
+    items = {item["id"]: item for item in response.json()}
+    assert items[ids[0]]["read"] is True and items[ids[1]]["read"] is False
+    unread = int(response.headers["X-Unread-Count"])
+    assert unread == sum(not item["read"] for item in items.values())
+
+    # Cursor pagination over the unread items only
+    seen, cursor = [], None
+    while True:
+        params = {"size": 2, "unread_only": True, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/quality/regulatory-watch", params=params, headers=auth_header)
+        seen += [item["id"] for item in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert len(seen) == len(set(seen)) == unread
+
+    response = client.post("/quality/regulatory-watch/mark-all-read", json={"ids": ids[1:3]}, headers=auth_header)
+    assert response.json()["marked"] == 2
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        response = client.post("/quality/regulatory-watch/mark-all-read", headers=auth_header)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert response.json()["marked"] == unread - 2
+    assert sum("INSERT INTO regulatory_reads" in s for s in statements) == 1
+
+    response = client.get("/quality/regulatory-watch", headers=auth_header)
+    assert response.headers["X-Unread-Count"] == "0"
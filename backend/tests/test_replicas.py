@@ -0,0 +1,104 @@
+import asyncio
+import time
+import pytest
+from contextlib import contextmanager
+from sqlalchemy import event
+
+from database import DATABASE_URL, Replica, ReplicaRouter, replica_router, async_engine, READ_YOUR_WRITES_COOKIE
+from services.analytics_cache import analytics_cache, ANALYTICS_CACHE_TTL, ANALYTICS_REPLICA_CACHE_TTL
+
+@contextmanager
+def candidat_reads(*engines):
+    """Number of SELECTs on the candidats table per engine."""
+    counts = {e: 0 for e in engines}
+    listeners = []
+    for e in engines:
+        def listener(conn, cursor, statement, parameters, context, executemany, e=e):
+            if statement.lstrip().upper().startswith("SELECT") and "FROM candidats" in statement:
+                counts[e] += 1
+        event.listen(e, "before_cursor_execute", listener)
+        listeners.append((e, listener))
+    try:
+        yield counts
+    finally:
+        for e, listener in listeners:
+            event.remove(e, "before_cursor_execute", listener)
+
+@pytest.fixture
+def replica(client):
+    # Same database file: a "replica" that is always in sync
+    replica = Replica("replica-test", DATABASE_URL)
+    replica_router.replicas = [replica]
+    try:
+        yield replica
+    finally:
+        replica_router.replicas = []
+        replica_router._recent_writes.clear()
+        client.cookies.clear()
+        replica.engine.dispose()
+        asyncio.run(replica.async_engine.dispose())
+
+def test_reads_go_to_the_replica(client, auth_header, replica):
+    primary, secondary = async_engine.sync_engine, replica.async_engine.sync_engine
+    with candidat_reads(primary, secondary) as counts:
+        response = client.get("/candidats/", headers=auth_header)
+    assert response.status_code == 200
+    assert counts == {primary: 0, secondary: 1}
+
+def test_read_your_writes_uses_the_primary(client, auth_header, replica):
+    created = client.post("/candidats/", json={"first_name": "Read", "last_name": "Own Write"}, headers=auth_header)
+    assert created.status_code == 201
+    assert READ_YOUR_WRITES_COOKIE in created.cookies
+
+    primary, secondary = async_engine.sync_engine, replica.async_engine.sync_engine
+    with candidat_reads(primary, secondary) as counts:
+        ids = [c["id"] for c in client.get("/candidats/", params={"size": 100}, headers=auth_header).json()]
+    assert counts == {primary: 1, secondary: 0}
+    assert created.json()["id"] in ids
+
+    # Window over (cookie expired, tenant forgotten): back to the replica
+    client.cookies.clear()
+    replica_router._recent_writes.clear()
+    with candidat_reads(primary, secondary) as counts:
+        client.get("/candidats/", headers=auth_header)
+    assert counts == {primary: 0, secondary: 1}
+
+def test_unhealthy_replica_falls_back_to_primary(client, auth_header, replica):
+    replica.healthy = False
+    primary, secondary = async_engine.sync_engine, replica.async_engine.sync_engine
+    with candidat_reads(primary, secondary) as counts:
+        assert client.get("/candidats/", headers=auth_header).status_code == 200
+    assert counts == {primary: 1, secondary: 0}
+
+    # Health check brings it back
+    asyncio.run(replica.check())
+    assert replica.healthy and replica.lag_seconds == 0
+
+def _dashboard_ttl(client, auth_header):
+    """Remaining lifetime of the cached dashboard entry (in-process backend)."""
+    analytics_cache.clear()
+    assert client.get("/analytics/dashboard", headers=auth_header).status_code == 200
+    (expires_at,) = [expires_at for key, (_, expires_at) in analytics_cache.backend._entries.items() if ":dashboard:" in key]
+    return expires_at - time.monotonic()
+
+def test_values_computed_on_a_replica_are_cached_briefly(client, auth_header, replica):
+    # Computed on a replica that may lag behind the write that bumped the generation
+    assert _dashboard_ttl(client, auth_header) <= ANALYTICS_REPLICA_CACHE_TTL
+
+    replica.healthy = False
+    assert _dashboard_ttl(client, auth_header) > ANALYTICS_REPLICA_CACHE_TTL
+    assert _dashboard_ttl(client, auth_header) <= ANALYTICS_CACHE_TTL
+    analytics_cache.clear()
+
+def test_health_check_and_round_robin(tmp_path):
+    router = ReplicaRouter([DATABASE_URL, DATABASE_URL, f"sqlite:///{tmp_path}/missing/replica.db"])
+    try:
+        asyncio.run(router.check_all())
+        assert [r.healthy for r in router.replicas] == [True, True, False]
+        assert router.replicas[2].error
+        picked = [router.pick().name for _ in range(4)]
+        assert picked == ["replica-1", "replica-2", "replica-1", "replica-2"]
+    finally:
+        for r in router.replicas:
+            r.engine.dispose()
+            asyncio.run(r.async_engine.dispose())
@@ -0,0 +1,112 @@
+import argparse
+from datetime import date, datetime
+from sqlalchemy import create_engine, inspect, text
+
+import manage
+import migrations
+from database import SessionLocal
+from models import AnalyticsDailySnapshot, AnalyticsRollupState
+from services.rollup_service import RollupService, METRIC_COLUMNS
+
+TENANT_ID = 1
+START, TODAY = date(2033, 1, 1), date(2033, 3, 31)
+
+def snapshot(db):
+    rows = db.query(AnalyticsDailySnapshot).filter(
+        AnalyticsDailySnapshot.tenant_id == TENANT_ID,
+        AnalyticsDailySnapshot.day >= START,
+        AnalyticsDailySnapshot.day <= TODAY
+    ).order_by(AnalyticsDailySnapshot.day).all()
+    return [(r.day, *(float(getattr(r, c)) for c in METRIC_COLUMNS)) for r in rows]
+
+def state(db):
+    db.expire_all()
+    return db.query(AnalyticsRollupState).filter(AnalyticsRollupState.tenant_id == TENANT_ID).one()
+
+def test_incremental_refresh_matches_a_full_backfill(client, auth_header, make_session, make_contrat):
+    service = RollupService()
+    with SessionLocal() as db:
+        service.backfill(db, TENANT_ID, start=START, today=TODAY)
+        before = snapshot(db)
+
+    # Writes through the API mark their days dirty
+    session_id = make_session(auth_header, date(2033, 2, 1), date(2033, 3, 15), nom="BTS Rollups")
+    contrat = make_contrat(auth_header, session_id, date(2033, 2, 1), date(2033, 3, 15), heures_formation=600)
+    day = client.get(f"/contrats/{contrat['dossier_id']}/calendar", headers=auth_header).json()[0]
+    assert client.post("/attendance", json={"session_day_id": day["id"], "contrat_version_id": contrat["version_id"],
+                                            "status": "PRESENT"}, headers=auth_header).status_code == 200
+
+    with SessionLocal() as db:
+        assert state(db).dirty_from == date(2033, 2, 1)
+        service.refresh(db, TENANT_ID, today=TODAY)
+        assert state(db).dirty_from is None
+        incremental = snapshot(db)
+        assert incremental != before
+
+        service.backfill(db, TENANT_ID, start=START, today=TODAY)
+        assert snapshot(db) == incremental
+
+def test_mark_dirty_during_a_refresh_is_kept(monkeypatch):
+    service = RollupService()
+    with SessionLocal() as db:
+        service.mark_dirty(db, TENANT_ID, date(2033, 3, 1))
+        db.commit()
+
+    rebuild = RollupService._rebuild_range
+
+    def concurrent_write(self, db, *args):
+        # Committed by another request after the refresh read its range, on a later day
+        with SessionLocal() as other:
+            service.mark_dirty(other, TENANT_ID, date(2033, 3, 20))
+            other.commit()
+        return rebuild(self, db, *args)
+
+    monkeypatch.setattr(RollupService, "_rebuild_range", concurrent_write)
+    with SessionLocal() as db:
+        service.refresh(db, TENANT_ID, today=TODAY)
+        monkeypatch.setattr(RollupService, "_rebuild_range", rebuild)
+        assert state(db).dirty_from == date(2033, 3, 1)
+        service.refresh(db, TENANT_ID, today=TODAY)
+        assert state(db).dirty_from is None
+
+def test_daily_endpoint_is_read_only(client, auth_header):
+    with SessionLocal() as db:
+        RollupService().mark_dirty(db, TENANT_ID, date(2033, 1, 10))
+        db.commit()
+
+        response = client.get("/analytics/daily", params={"start": "2033-01-01", "end": "2033-01-31"}, headers=auth_header)
+        assert response.status_code == 200
+        assert state(db).dirty_from == date(2033, 1, 10)
+
+        response = client.post("/analytics/daily/refresh", headers=auth_header)
+        assert response.status_code == 200
+        assert response.json()["jours_recalcules"] > 0
+        assert state(db).dirty_from is None
+
+def test_scheduler_tick_refreshes_every_tenant():
+    with SessionLocal() as db:
+        RollupService().mark_dirty(db, TENANT_ID, date(2033, 1, 10))
+        db.commit()
+        result = RollupService().tick(db, datetime(2033, 3, 31, 3, 0))
+        db.commit()
+        assert result["tenants"] >= 2
+        assert state(db).dirty_from is None
+
+def test_manage_refresh_and_backfill_commands(capsys):
+    manage.backfill_rollups(argparse.Namespace(tenant=TENANT_ID, start="2033-03-01"))
+    assert f"Tenant {TENANT_ID}: " in capsys.readouterr().out
+    manage.refresh_rollups(argparse.Namespace(tenant=TENANT_ID))
+    assert "1 daily snapshots refreshed" in capsys.readouterr().out
+
+def test_migration_adds_the_dirty_version_column(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE analytics_rollup_state (tenant_id INTEGER PRIMARY KEY, dirty_from DATE, "
+                                "last_refreshed_at DATETIME)"))
+        connection.execute(text("INSERT INTO analytics_rollup_state (tenant_id, dirty_from) VALUES (1, '2033-01-01')"))
+
+    assert "analytics_rollup_state.dirty_version" in migrations.upgrade(engine)
+    assert "dirty_version" in {c["name"] for c in inspect(engine).get_columns("analytics_rollup_state")}
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT dirty_version FROM analytics_rollup_state")).scalar() == 0
+    assert migrations.upgrade(engine) == []
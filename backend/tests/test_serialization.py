@@ -0,0 +1,51 @@
+import pytest
+
+@pytest.fixture(scope="module")
+def dossier_id(client, auth_header):
+    candidat = client.post("/candidats/", json={"first_name": "Json", "last_name": "Serial"}, headers=auth_header).json()
+    entreprise = client.post("/entreprises/", json={"raison_sociale": "ORJSON SARL", "siret": "12345678900011"}, headers=auth_header).json()
+    session = client.post("/sessions/", json={"nom": "BTS Serialisation", "date_debut": "2025-09-01", "date_fin": "2026-06-30"},
+                          headers=auth_header).json()
+    calendar = client.post(f"/sessions/{session['id']}/generate-calendar", json={"days_of_week": [0]}, headers=auth_header)
+    assert calendar.status_code == 200
+    created = client.post("/contrats/", json={
+        "candidat_id": candidat["id"], "entreprise_id": entreprise["id"], "session_id": session["id"],
+        "salaire": "1234.56", "cout_npec": "8000.00", "date_debut": "2025-09-01", "date_fin": "2026-06-30"
+    }, headers=auth_header)
+    assert created.status_code == 200
+    return created.json()["dossier_id"]
+
+def test_list_pages_use_response_models(client, auth_header, dossier_id):
+    candidats = client.get("/candidats/", params={"size": 100}, headers=auth_header)
+    assert candidats.headers["content-type"] == "application/json"
+    candidat = next(c for c in candidats.json() if c["last_name"] == "Serial")
+    # Raw CV text stays out of list pages
+    assert "cv_raw_text" not in candidat
+    assert candidat["statut"] == "NOUVEAU"
+
+    entreprises = client.get("/entreprises/", headers=auth_header).json()
+    assert {"id", "tenant_id", "raison_sociale", "siret", "adresse", "code_idcc"} == set(entreprises[0])
+
+    sessions = client.get("/sessions/", headers=auth_header).json()
+    assert any(s["nom"] == "BTS Serialisation" and s["date_debut"] == "2025-09-01" for s in sessions)
+
+def test_contrat_endpoints(client, auth_header, dossier_id):
+    contrats = client.get("/contrats/", headers=auth_header).json()
+    item = next(c for c in contrats if c["id"] == dossier_id)
+    assert item["candidat"]["last_name"] == "Serial"
+    assert item["entreprise"]["raison_sociale"] == "ORJSON SARL"
+    # Money as JSON numbers, like before
+    assert item["active_version"]["salaire"] == 1234.56
+    assert item["active_version"]["version_number"] == 1
+
+    detail = client.get(f"/contrats/{dossier_id}", headers=auth_header).json()
+    assert detail["dossier"]["candidat"]["first_name"] == "Json"
+    assert [v["version_number"] for v in detail["dossier"]["versions"]] == [1]
+    assert detail["active_version"]["cout_npec"] == 8000.0
+
+    history = client.get(f"/contrats/{dossier_id}/history", headers=auth_header).json()
+    assert [v["is_active"] for v in history] == [True]
+
+    days = client.get(f"/contrats/{dossier_id}/calendar", headers=auth_header).json()
+    assert days and set(days[0]) == {"id", "session_id", "date", "is_morning", "is_afternoon"}
+    assert days == sorted(days, key=lambda d: d["date"])
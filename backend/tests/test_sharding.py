@@ -0,0 +1,150 @@
+import asyncio
+import pytest
+from datetime import date, datetime
+from sqlalchemy import delete, select, func
+
+from database import SessionLocal
+from models import (Tenant, TenantShard, User, Candidat, Session as FormationSession, SessionDay, ContratDossier,
+                    ContratVersion, SurveyDispatch)
+from services.survey_dispatch_service import SurveyDispatchService
+from sharding import shard_router, move_tenant, set_directory, tenant_tables, tenant_filter, create_all_shards
+
+TENANT_ID = 3
+# Plain-text password, like the seed data (auth.verify_password)
+EMAIL = "admin@marseille.cfa.com"
+PASSWORD = "secret_marseille"
+
+def count_rows(shard, model):
+    with shard.session() as db:
+        return db.scalar(select(func.count()).select_from(model).where(tenant_filter(model.__table__, TENANT_ID)))
+
+@pytest.fixture(scope="module")
+def shard(client, tmp_path_factory):
+    shard = shard_router.add_shard("shard-test", f"sqlite:///{tmp_path_factory.mktemp('shards') / 'shard.db'}")
+    create_all_shards()
+    with SessionLocal() as db:
+        db.add(Tenant(id=TENANT_ID, name="CFA Marseille", slug="marseille"))
+        db.flush()
+        db.add(User(tenant_id=TENANT_ID, email=EMAIL, password_hash=PASSWORD, role="admin"))
+        db.add(User(tenant_id=TENANT_ID, email="operator@marseille.cfa.com", password_hash=PASSWORD, role="operator"))
+        db.add(Candidat(tenant_id=TENANT_ID, first_name="Shard", last_name="Moved"))
+        session = FormationSession(tenant_id=TENANT_ID, nom="BTS Sharding", date_debut=date(2025, 9, 1), date_fin=date(2026, 6, 30))
+        db.add(session)
+        db.flush()
+        db.add(SessionDay(session_id=session.id, date=date(2025, 9, 1)))
+        db.commit()
+    try:
+        yield shard
+    finally:
+        for target in shard_router.all():
+            with target.engine.begin() as connection:
+                for table in reversed(tenant_tables()):
+                    connection.execute(delete(table).where(tenant_filter(table, TENANT_ID)))
+        with SessionLocal() as db:
+            db.execute(delete(TenantShard).where(TenantShard.tenant_id == TENANT_ID))
+            db.execute(delete(Tenant).where(Tenant.id == TENANT_ID))
+            db.commit()
+        del shard_router.shards["shard-test"]
+        shard_router.invalidate()
+        shard.engine.dispose()
+        asyncio.run(shard.async_engine.dispose())
+
+def login(client, email=EMAIL):
+    response = client.post("/auth/login", data={"username": email, "password": PASSWORD})
+    assert response.status_code == 200
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+def test_move_tenant_copies_then_deletes(shard):
+    copied = move_tenant(TENANT_ID, "shard-test", batch_size=1, wait_seconds=0, log=lambda message: None)
+    assert copied["users"] == 2
+    assert copied["session_days"] == 1
+    assert shard_router.shard_for(TENANT_ID) is shard
+
+    assert count_rows(shard, Candidat) == 1
+    assert count_rows(shard, SessionDay) == 1
+    assert count_rows(shard_router.default, Candidat) == 0
+    assert count_rows(shard_router.default, SessionDay) == 0
+    # The directory's foreign key keeps the tenants row on the default shard
+    assert count_rows(shard_router.default, Tenant) == 1
+
+def test_requests_use_the_tenant_shard(client, shard):
+    headers = login(client)
+    names = [c["last_name"] for c in client.get("/candidats/", headers=headers).json()]
+    assert names == ["Moved"]
+
+    created = client.post("/candidats/", json={"first_name": "Written", "last_name": "On Shard"}, headers=headers)
+    assert created.status_code == 201
+    assert count_rows(shard, Candidat) == 2
+    assert count_rows(shard_router.default, Candidat) == 0
+
+def test_other_tenants_stay_on_default(client, auth_header, shard):
+    names = [c["last_name"] for c in client.get("/candidats/", params={"size": 100}, headers=auth_header).json()]
+    assert "Moved" not in names
+
+def test_operator_report_fans_out(client, shard):
+    response = client.get("/operator/tenants/report", params={"details": False}, headers=login(client, "operator@marseille.cfa.com"))
+    assert response.status_code == 200
+    rows = response.json()["lignes"]
+    tenant_ids = [row["tenant_id"] for row in rows]
+    # Each tenant once, from the shard it lives on
+    assert sorted(tenant_ids) == sorted(set(tenant_ids))
+    assert {1, 2, TENANT_ID} <= set(tenant_ids)
+    assert next(row for row in rows if row["tenant_id"] == TENANT_ID)["candidats"] == 2
+
+def test_moving_tenant_is_read_only(client, shard):
+    headers = login(client)
+    set_directory(TENANT_ID, "shard-test", moving=True)
+    try:
+        assert client.get("/candidats/", headers=headers).status_code == 200
+        refused = client.post("/candidats/", json={"first_name": "Lost", "last_name": "Write"}, headers=headers)
+        assert refused.status_code == 503
+        assert "Retry-After" in refused.headers
+    finally:
+        set_directory(TENANT_ID, "shard-test", moving=False)
+
+def test_move_refuses_overlapping_ids(client, shard):
+    # Rows created on the shard reuse ids of the default database (no init-shard --id-start on SQLite)
+    with pytest.raises(ValueError, match="init-shard"):
+        move_tenant(TENANT_ID, "default", wait_seconds=0, log=lambda message: None)
+    # Rolled back: still on the shard, writable
+    assert shard_router.route(TENANT_ID) == (shard, False)
+    assert count_rows(shard, Candidat) == 2
+    assert count_rows(shard_router.default, Candidat) == 0
+    assert len(client.get("/candidats/", headers=login(client)).json()) == 2
+
+def test_scheduler_jobs_skip_tenants_the_shard_does_not_own(shard):
+    def add_contract(target):
+        # END milestone due on 2035-01-05
+        with target.session() as db:
+            candidat = Candidat(tenant_id=TENANT_ID, first_name="Enquête", last_name="Shard")
+            db.add(candidat)
+            db.flush()
+            dossier = ContratDossier(tenant_id=TENANT_ID, candidat_id=candidat.id)
+            db.add(dossier)
+            db.flush()
+            version = ContratVersion(tenant_id=TENANT_ID, contrat_dossier_id=dossier.id, version_number=1,
+                                     date_debut=date(2034, 6, 1), date_fin=date(2035, 1, 5), is_active=True)
+            db.add(version)
+            db.commit()
+            return version.id
+
+    def tick(target, version_id):
+        with target.session() as db:
+            SurveyDispatchService().tick(db, datetime(2035, 1, 10, 8, 0))
+            db.commit()
+            return db.query(SurveyDispatch.type).filter(SurveyDispatch.contrat_version_id == version_id).all()
+
+    # Leftover of the move on the default database (--keep-source): not surveyed twice
+    stale = add_contract(shard_router.default)
+    with shard_router.default.session() as db:
+        assert TENANT_ID not in shard_router.writable_tenants(db)
+    assert tick(shard_router.default, stale) == []
+
+    current = add_contract(shard)
+    set_directory(TENANT_ID, "shard-test", moving=True)
+    try:
+        # Being copied: the dispatch rows would not reach the target
+        assert tick(shard, current) == []
+    finally:
+        set_directory(TENANT_ID, "shard-test", moving=False)
+    assert len(tick(shard, current)) == 1
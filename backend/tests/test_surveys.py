@@ -0,0 +1,50 @@
+from datetime import date
+from sqlalchemy import create_engine, inspect, text
+
+import migrations
+from database import Base
+from models import SurveyAggregate
+from services.survey_stats_service import SurveyStatsService, SCORE_COLUMNS
+
+def _end_line(client, auth_header):
+    stats = client.get("/quality/surveys/stats", headers=auth_header).json()
+    return next((l for l in stats["lignes"] if l["type"] == "END"), {"reponses": 0, "distribution": {}})
+
+def test_answers_update_the_aggregates(client, auth_header):
+    before = _end_line(client, auth_header)
+    for score in (10, 9, 7, 3):
+        response = client.post("/quality/surveys", json={"type": "END", "score": score}, headers=auth_header)
+        assert response.status_code == 200
+
+    after = _end_line(client, auth_header)
+    assert after["reponses"] == before["reponses"] + 4
+    assert after["distribution"]["10"] == before["distribution"].get("10", 0) + 1
+    assert client.post("/quality/surveys", json={"type": "END", "score": 11}, headers=auth_header).status_code == 422
+    assert client.post("/quality/surveys", json={"type": "END", "score": 5, "session_id": 999999},
+                       headers=auth_header).status_code == 404
+
+def test_rebuild_matches_incremental_aggregates(rebuild_matches):
+    columns = ("tenant_id", "type", "month", "session_id", "response_count", "score_sum", *SCORE_COLUMNS)
+    rows = rebuild_matches(SurveyAggregate, columns, SurveyStatsService().rebuild)
+    # The END answers posted above are part of what the rebuild has to give back
+    assert any(row[1] == "END" and row[3] == "0" for row in rows)
+
+def test_migration_adds_session_id_and_created_at(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE surveys (id INTEGER PRIMARY KEY, tenant_id INTEGER NOT NULL, "
+                                "target_user_id INTEGER, type VARCHAR(8) NOT NULL, score INTEGER NOT NULL, comment TEXT)"))
+        connection.execute(text("INSERT INTO surveys (tenant_id, type, score) VALUES (1, 'END', 9), (1, 'END', 4)"))
+    Base.metadata.create_all(bind=engine) # Startup: the new tables only
+
+    assert "surveys.session_id, surveys.created_at" in migrations.upgrade(engine)
+    inspector = inspect(engine)
+    assert {"session_id", "created_at"} <= {c["name"] for c in inspector.get_columns("surveys")}
+    assert "idx_surveys_tenant_created_at" in {i["name"] for i in inspector.get_indexes("surveys")}
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT COUNT(*) FROM surveys WHERE created_at IS NULL")).scalar() == 0
+        # The existing answers are counted in the month of the migration
+        month, count, total = connection.execute(text(
+            "SELECT month, response_count, score_sum FROM survey_aggregates")).one()
+        assert (str(month), count, total) == (str(date.today().replace(day=1)), 2, 13)
+    assert migrations.upgrade(engine) == []
@@ -0,0 +1,47 @@
+def _create_tickets(client, auth_header, count):
+    ids = []
+    for i in range(count):
+        response = client.post("/quality/tickets", json={
+            "subject": f"Ticket {i}",
+            "description": "Keyset pagination",
+            "category": ("PEDAGOGY", "ADMIN", "TECHNICAL")[i % 3]
+        }, headers=auth_header)
+        assert response.status_code == 200
+        ids.append(response.json()["id"])
+    return ids
+
+def _walk(client, auth_header, params):
+    ids, cursor = [], None
+    while True:
+        query = dict(params, size=2, **({"cursor": cursor} if cursor else {}))
+        response = client.get("/quality/tickets", params=query, headers=auth_header)
+        assert response.status_code == 200
+        ids += [t["id"] for t in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return ids
+
+def test_cursor_pagination_walks_every_ticket_once(client, auth_header):
+    _create_tickets(client, auth_header, 7)
+    for sort in ("recent", "oldest", "status"):
+        everything = client.get("/quality/tickets", params={"sort": sort, "size": 200}, headers=auth_header).json()
+        assert _walk(client, auth_header, {"sort": sort}) == [t["id"] for t in everything]
+
+def test_ticket_filters_and_summary(client, auth_header):
+    before = client.get("/quality/tickets/summary", headers=auth_header).json()
+    created = _create_tickets(client, auth_header, 6) # 2 of each category, all OPEN
+
+    response = client.get("/quality/tickets", params={"category": "ADMIN", "status": "OPEN", "size": 200}, headers=auth_header)
+    assert response.status_code == 200
+    admin_open = response.json()
+    assert all(t["category"] == "ADMIN" and t["status"] == "OPEN" for t in admin_open)
+    assert {t["id"] for t in admin_open} & set(created) == set(created[1::3])
+    assert not {t["id"] for t in admin_open} & (set(created) - set(created[1::3]))
+
+    summary = client.get("/quality/tickets/summary", headers=auth_header).json()
+    assert summary["par_statut"]["OPEN"]["par_categorie"]["ADMIN"] == len(admin_open)
+    admin_before = before.get("par_statut", {}).get("OPEN", {}).get("par_categorie", {}).get("ADMIN", 0)
+    assert summary["par_statut"]["OPEN"]["par_categorie"]["ADMIN"] == admin_before + 2
+
+    response = client.get("/quality/tickets", params={"cursor": "not-a-cursor"}, headers=auth_header)
+    assert response.status_code == 400
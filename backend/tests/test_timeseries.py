@@ -0,0 +1,28 @@
+import pytest
+from datetime import date, timedelta
+from sqlalchemy import select, literal
+
+from routers.analytics import get_timeseries
+from services.analytics_cache import analytics_cache
+from services.aggregates import GRANULARITIES, date_bucket
+from services.timeseries_service import bucket_start
+
+def test_timeseries_is_gap_filled_in_one_query(db_and_user, count_queries, call_async):
+    db, user = db_and_user
+    analytics_cache.clear()
+    db.refresh(user)
+    with count_queries() as statements:
+        data = call_async(get_timeseries, metric="ca_facture", granularity="month", start=date(2020, 1, 15),
+                          end=date(2024, 12, 31), current_user=user)
+    assert len(statements) == 1
+    periods = [p["periode"] for p in data["points"]]
+    assert len(periods) == 60
+    assert periods[0] == date(2020, 1, 1) and periods[-1] == date(2024, 12, 1)
+
+@pytest.mark.parametrize("granularity", GRANULARITIES)
+def test_sql_date_bucket_matches_python(db_and_user, granularity):
+    db, _ = db_and_user
+    days = [date(2024, 1, 1) + timedelta(days=i) for i in range(0, 400, 13)]
+    for day in days:
+        value = db.execute(select(date_bucket(db, literal(day), granularity))).scalar()
+        assert str(value)[:10] == bucket_start(day, granularity).isoformat(), day
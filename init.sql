@@ -133,6 +133,22 @@ CREATE INDEX idx_contrats_versions_session_id ON contrats_versions(session_id);
 CREATE INDEX idx_attendance_tenant_id ON attendance(tenant_id);
 CREATE INDEX idx_invoices_tenant_id ON invoices(tenant_id);
 
+-- Analytics time series (date bucketing)
+CREATE INDEX idx_candidats_tenant_created_at ON candidats(tenant_id, created_at);
+CREATE INDEX idx_session_days_date ON session_days(date);
+CREATE INDEX idx_contrats_versions_tenant_date_debut ON contrats_versions(tenant_id, date_debut);
+CREATE INDEX idx_invoices_tenant_date_emission ON invoices(tenant_id, date_emission);
+
+-- Tenant-leading access paths (same names as models.py)
+CREATE INDEX idx_users_email ON users(email);
+CREATE INDEX idx_candidats_tenant_statut ON candidats(tenant_id, statut);
+CREATE INDEX idx_contrats_versions_dossier_active ON contrats_versions(contrat_dossier_id, is_active);
+CREATE INDEX idx_contrats_versions_tenant_active ON contrats_versions(tenant_id, is_active);
+CREATE INDEX idx_contrats_versions_active_date_fin ON contrats_versions(is_active, date_fin);
+CREATE INDEX idx_attendance_tenant_status ON attendance(tenant_id, status);
+CREATE INDEX idx_invoices_tenant_statut ON invoices(tenant_id, statut);
+CREATE INDEX idx_invoices_contrat_dossier_id ON invoices(contrat_dossier_id);
+
 
 -- 3. Seed Data
 